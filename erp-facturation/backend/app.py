@@ -1,21 +1,72 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 import logging
+import time
+
+_import_started = time.perf_counter()
 
 # Import routers
 from facture_api import facture_router
-from db import test_connection
+import db
+from facture_jobs import job_manager
+from email_outbox import email_outbox
+from po_lookup import po_cache, start_po_cache_watcher
+from upload_spool import MAX_BATCH_UPLOAD_BYTES, MAX_UPLOAD_BYTES, UploadSizeLimit
 import os
 os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE'
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+READINESS_DB_TIMEOUT = float(os.getenv("READINESS_DB_TIMEOUT", "2"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect MongoDB, build indexes in the background and start the OCR pool"""
+    logger.info("✅ FastAPI app started successfully")
+    logger.info("📄 Facture Management API")
+    logger.info("🔍 Available routes:")
+    for route in app.routes:
+        if hasattr(route, 'methods') and hasattr(route, 'path'):
+            methods = list(route.methods)
+            logger.info(f"   {methods[0]:6} {route.path}")
+
+    # MongoClient connects in the background: no round trip here, /ready reports when it is up
+    db.connect()
+    db.start_index_build()
+    # Mapped PO cache of this process: drop entries as bons_commande changes (TTL otherwise)
+    po_watch_stop = start_po_cache_watcher(db.get_po_collection())
+
+    # Start the OCR worker pool: workers load EasyOCR in the background
+    # so the app serves traffic immediately
+    if os.getenv("OCR_WARMUP", "true").lower() in ("1", "true", "yes"):
+        job_manager.start()
+        logger.info("🔥 OCR worker pool warm-up started in background")
+
+    app.state.startup_seconds = round(time.perf_counter() - _import_started, 3)
+    logger.info(f"⏱️ Startup time: {app.state.startup_seconds}s")
+    logger.info("=" * 50)
+
+    yield
+
+    po_watch_stop.set()
+    job_manager.shutdown()
+    # After the jobs: their completion callbacks may still queue emails
+    email_outbox.shutdown()
+    db.shutdown_db_executor()
+    db.close()
+    logger.info("👋 FastAPI app shutting down...")
+
+
 # Create FastAPI app
 app = FastAPI(
     title="Module d'achat - Invoice Management",
     description="API pour la gestion des factures avec OCR et validation PO",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 print("=" * 50)
@@ -30,6 +81,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Oversized uploads refused from Content-Length, before the body is read
+app.add_middleware(
+    UploadSizeLimit,
+    limits={
+        "/factures/upload-and-validate": MAX_UPLOAD_BYTES,
+        "/factures/batch": MAX_BATCH_UPLOAD_BYTES,
+    },
+)
+
 # Include routers
 app.include_router(facture_router)
 
@@ -40,8 +100,16 @@ def root():
         "version": "1.0.0",
         "endpoints": {
             "docs": "/docs",
+            "liveness": "GET /live",
+            "readiness": "GET /ready",
             "upload_facture": "POST /factures/upload-and-validate",
+            "job_status": "GET /factures/jobs/{job_id}",
+            "job_events": "GET /factures/jobs/{job_id}/events",
+            "batch_upload": "POST /factures/batch",
+            "batch_report": "GET /factures/batch/{batch_id}",
+            "reconcile": "POST /factures/reconcile",
             "list_factures": "GET /factures/",
+            "bulk_transition": "POST /factures/bulk-transition",
             "get_facture": "GET /factures/{facture_id}",
             "approve_facture": "POST /factures/{facture_id}/approve",
             "reject_facture": "POST /factures/{facture_id}/reject",
@@ -50,33 +118,40 @@ def root():
         }
     }
 
+@app.get("/live")
+async def liveness():
+    """Liveness: the process and its event loop respond (no dependency checked)"""
+    return {"status": "alive"}
+
+@app.get("/ready")
+async def readiness():
+    """Readiness: MongoDB answers a ping, so every endpoint can serve (503 otherwise)"""
+    db_ok = await db.run_db(db.test_connection, READINESS_DB_TIMEOUT)
+
+    body = {
+        "status": "ready" if db_ok else "not_ready",
+        "database": "connected" if db_ok else "disconnected",
+        "indexes": db.index_status,
+        # Uploads are queued while workers warm up: informational, not a readiness condition
+        "ocr_pool": job_manager.stats()
+    }
+    return JSONResponse(content=body, status_code=200 if db_ok else 503)
+
 @app.get("/health")
 def health_check():
-    db_status = test_connection()
+    db_status = db.test_connection()
     
     return {
         "status": "healthy" if db_status else "unhealthy",
         "database": "connected" if db_status else "disconnected",
+        "indexes": db.index_status,
+        "ocr_pool": job_manager.stats(),
+        "po_cache": po_cache.stats(),
+        "email_outbox": email_outbox.stats(),
+        "startup_seconds": getattr(app.state, "startup_seconds", None),
         "api_version": "1.0.0"
     }
 
-# Startup event
-@app.on_event("startup")
-async def startup_event():
-    logger.info("✅ FastAPI app started successfully")
-    logger.info("📄 Facture Management API")
-    logger.info("🔍 Available routes:")
-    for route in app.routes:
-        if hasattr(route, 'methods') and hasattr(route, 'path'):
-            methods = list(route.methods)
-            logger.info(f"   {methods[0]:6} {route.path}")
-    logger.info("=" * 50)
-
-# Shutdown event
-@app.on_event("shutdown")
-async def shutdown_event():
-    logger.info("👋 FastAPI app shutting down...")
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
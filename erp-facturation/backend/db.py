@@ -1,6 +1,10 @@
+import pymongo
 from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+import asyncio
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,63 +12,172 @@ load_dotenv()
 MONGODB_URI = os.getenv("MONGODB_URI")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "purchase_request")
 
-# Initialize connection
-try:
-    client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
-    # Test connection
-    client.admin.command('ping')
-    print(f"✅ Connected to MongoDB: {MONGO_DB_NAME}")
-except ConnectionFailure as e:
-    print(f"❌ MongoDB connection failed: {e}")
-    raise
-
-# Get database
-db = client[MONGO_DB_NAME]
+# Connection pool sizing
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+# Threads running pymongo calls for the async handlers (<= pool size, so no thread waits on a socket)
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(min(MONGO_MAX_POOL_SIZE, 32))))
+# Seconds between two attempts of the background index build while MongoDB is unreachable
+INDEX_RETRY_SECONDS = float(os.getenv("MONGO_INDEX_RETRY_SECONDS", "15"))
 
 # Collections - FIXED: Use correct collection name
-pr_collection = db["purchase_requests"]
-po_collection = db["bons_commande"]  # ✅ CHANGED FROM "POs" to "bons_commande"
-facture_collection = db["factures"]
+PR_COLLECTION = "purchase_requests"
+PO_COLLECTION = "bons_commande"  # ✅ CHANGED FROM "POs" to "bons_commande"
+FACTURE_COLLECTION = "factures"
+GRN_COLLECTION = os.getenv("GRN_COLLECTION", "grns")
+SUPPLIER_COLLECTION = os.getenv("SUPPLIER_COLLECTION", "suppliers")
+EMAIL_DEAD_LETTER_COLLECTION = os.getenv("EMAIL_DEAD_LETTER_COLLECTION", "email_dead_letters")
 
-# Create indexes for better performance
-try:
+# Indexes for better performance: (collection, keys, options), applied once in the background
+INDEXES = [
     # PR indexes
-    pr_collection.create_index("id", unique=True)
-    pr_collection.create_index("statut")
-    pr_collection.create_index("demandeur")
-    pr_collection.create_index("date_creation")
-    
+    (PR_COLLECTION, "id", {"unique": True}),
+    (PR_COLLECTION, "statut", {}),
+    (PR_COLLECTION, "demandeur", {}),
+    (PR_COLLECTION, "date_creation", {}),
+
     # PO indexes - FIXED: Use correct field name
-    po_collection.create_index("purchase_order_id", unique=True)
-    po_collection.create_index("linked_pr_id")
-    po_collection.create_index("status")
-    
+    (PO_COLLECTION, "purchase_order_id", {"unique": True}),
+    (PO_COLLECTION, "linked_pr_id", {}),
+    (PO_COLLECTION, "status", {}),
+
     # Facture indexes
-    facture_collection.create_index("facture_id", unique=True)
-    facture_collection.create_index("linked_po_id")
-    facture_collection.create_index("status")
-    facture_collection.create_index("date_reception")
-    
-    print("✅ Database indexes created")
-except Exception as e:
-    print(f"⚠️ Index creation warning: {e}")
+    (FACTURE_COLLECTION, "facture_id", {"unique": True}),
+    (FACTURE_COLLECTION, "linked_po_id", {}),
+    (FACTURE_COLLECTION, "status", {}),
+    (FACTURE_COLLECTION, "date_reception", {}),
+    # Listing keyset order (date_reception, facture_id), unfiltered and by status
+    (FACTURE_COLLECTION, [("date_reception", -1), ("facture_id", -1)], {}),
+    (FACTURE_COLLECTION, [("status", 1), ("date_reception", -1), ("facture_id", -1)], {}),
+    # Same file uploaded twice (content hash computed while spooling)
+    (FACTURE_COLLECTION, "ocr_data.file_hash", {}),
+    # Near-duplicate lookup: 4 bands of the page-1 perceptual hash (multikey)
+    (FACTURE_COLLECTION, "ocr_data.phash_bands", {}),
+
+    # GRN indexes (three-way match groups receptions by PO; erp-GRN stores str(bons_commande._id))
+    (GRN_COLLECTION, "po_id", {}),
+
+    # Supplier master (fuzzy lookup reads id + name only)
+    (SUPPLIER_COLLECTION, "name", {}),
+
+    # Undelivered notification emails, looked up by invoice
+    (EMAIL_DEAD_LETTER_COLLECTION, "ref", {}),
+]
+
+# Nothing touches the network at import: the client is created on first use
+# (MongoClient connects in the background) and checked by the readiness probe
+client = None
+_client_lock = threading.Lock()
+index_status = {"state": "pending", "applied": 0, "total": len(INDEXES), "attempts": 0, "error": None}
+_index_stop = threading.Event()
+
+
+def connect() -> MongoClient:
+    """Create the MongoDB client once per process (no round trip to the server)"""
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                client = MongoClient(
+                    MONGODB_URI,
+                    serverSelectionTimeoutMS=5000,
+                    maxPoolSize=MONGO_MAX_POOL_SIZE,
+                    minPoolSize=MONGO_MIN_POOL_SIZE,
+                    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS
+                )
+                print(f"🔌 MongoDB client created: {MONGO_DB_NAME}")
+    return client
+
+
+def close():
+    global client
+    _index_stop.set()
+    with _client_lock:
+        if client is not None:
+            client.close()
+            client = None
+
+
+def apply_indexes():
+    """Create the declared indexes (idempotent: existing ones are left untouched)"""
+    database = get_database()
+    applied = 0
+    for collection, keys, options in INDEXES:
+        database[collection].create_index(keys, **options)
+        applied += 1
+        index_status["applied"] = applied
+
+
+def _index_build_loop():
+    while not _index_stop.is_set():
+        index_status["attempts"] += 1
+        index_status["state"] = "running"
+        try:
+            apply_indexes()
+            index_status["state"] = "done"
+            index_status["error"] = None
+            print(f"✅ Database indexes created ({len(INDEXES)})")
+            return
+        except Exception as e:
+            index_status["state"] = "retrying"
+            index_status["error"] = str(e)
+            print(f"⚠️ Index creation warning: {e} - retrying in {INDEX_RETRY_SECONDS:.0f}s")
+            _index_stop.wait(INDEX_RETRY_SECONDS)
+
+
+def start_index_build() -> threading.Thread:
+    """Apply INDEXES in a background thread, retrying until MongoDB is reachable"""
+    _index_stop.clear()
+    thread = threading.Thread(target=_index_build_loop, name="mongo-indexes", daemon=True)
+    thread.start()
+    return thread
+
+
+def get_database():
+    return connect()[MONGO_DB_NAME]
 
 def get_pr_collection():
-    return pr_collection
+    return get_database()[PR_COLLECTION]
 
 def get_po_collection():
-    return po_collection
+    return get_database()[PO_COLLECTION]
 
 def get_facture_collection():
-    return facture_collection
+    return get_database()[FACTURE_COLLECTION]
+
+def get_supplier_collection():
+    return get_database()[SUPPLIER_COLLECTION]
+
+def get_email_dead_letter_collection():
+    return get_database()[EMAIL_DEAD_LETTER_COLLECTION]
+
+# pymongo is synchronous: async handlers must not call it on the event loop
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="mongo")
+
+
+async def run_db(fn, *args, **kwargs):
+    """
+    Run a blocking pymongo call on the bounded DB thread pool and await it.
+    Usage: await run_db(collection.find_one, {"facture_id": facture_id})
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, partial(fn, *args, **kwargs))
+
+
+def shutdown_db_executor():
+    db_executor.shutdown(wait=False, cancel_futures=True)
 
-def get_database():
-    return db
 
-def test_connection():
+def test_connection(timeout: float = None):
     try:
-        client.admin.command('ping')
+        if timeout is not None:
+            # Client-side deadline so a probe never holds a DB thread for the full server selection timeout
+            with pymongo.timeout(timeout):
+                connect().admin.command('ping')
+            return True
+        connect().admin.command('ping')
         return True
     except Exception as e:
         print(f"❌ Connection test failed: {e}")
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,277 @@
+"""
+Background email sender for facturation notifications
+
+Request handlers and job callbacks only enqueue (the HTML body is built later,
+in the sender thread); one thread delivers the queue over a reused SMTP
+connection, closed after EMAIL_SMTP_IDLE_SECONDS without mail.
+
+Transient failures (connection errors, 4xx replies) are retried with
+exponential backoff up to EMAIL_MAX_ATTEMPTS; permanent ones (5xx replies,
+refused recipients), exhausted retries and messages still pending at shutdown
+are written to the dead-letter collection with the full MIME message, so
+they can be resent by hand.
+"""
+import heapq
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+from uuid import uuid4
+
+from email_service import build_notification_message, open_smtp_connection, smtp_configured
+
+logger = logging.getLogger(__name__)
+
+EMAIL_QUEUE_MAX = int(os.getenv("EMAIL_QUEUE_MAX", "1000"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "4"))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "5"))
+EMAIL_SMTP_IDLE_SECONDS = float(os.getenv("EMAIL_SMTP_IDLE_SECONDS", "60"))
+EMAIL_SHUTDOWN_TIMEOUT = float(os.getenv("EMAIL_SHUTDOWN_TIMEOUT", "10"))
+
+_STOP = object()
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """5xx replies and refused recipients will fail the same way on retry"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+def store_dead_letter(record: Dict):
+    from db import get_email_dead_letter_collection
+    get_email_dead_letter_collection().insert_one(record)
+
+
+class EmailOutbox:
+    """Queue + single sender thread; see the module docstring"""
+
+    def __init__(self, connect: Callable[[], smtplib.SMTP] = open_smtp_connection,
+                 dead_letter: Callable[[Dict], None] = store_dead_letter,
+                 max_queue: int = EMAIL_QUEUE_MAX, max_attempts: int = EMAIL_MAX_ATTEMPTS,
+                 retry_base_seconds: float = EMAIL_RETRY_BASE_SECONDS,
+                 idle_seconds: float = EMAIL_SMTP_IDLE_SECONDS,
+                 configured: Callable[[], bool] = smtp_configured):
+        self._connect = connect
+        self._dead_letter = dead_letter
+        self._configured = configured
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.idle_seconds = idle_seconds
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._retries = []  # heap of (due, seq, item)
+        self._seq = 0
+        self._connection: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.counters = {"queued": 0, "sent": 0, "retried": 0, "dead_lettered": 0,
+                         "skipped": 0, "dropped": 0, "connections": 0}
+
+    # ---------- producer side ----------
+
+    def enqueue(self, to_email: str, subject: str, build: Callable, kind: str = "notification",
+                ref: Optional[str] = None) -> Optional[str]:
+        """
+        Queue one email; build() returns the MIME message and runs in the sender thread.
+        Returns the message ID, or None when the queue is full (message dropped, logged).
+        """
+        item = {
+            "id": uuid4().hex[:12],
+            "to": to_email,
+            "subject": subject,
+            "kind": kind,
+            "ref": ref,
+            "build": build,
+            "message": None,
+            "attempts": 0,
+            "queued_at": datetime.now().isoformat(),
+            "last_error": None
+        }
+        self.start()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.counters["dropped"] += 1
+            logger.error(f"📧 Email queue full ({self._queue.maxsize}): '{subject}' to {to_email} dropped")
+            return None
+        with self._lock:
+            self.counters["queued"] += 1
+        return item["id"]
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+                self._thread.start()
+
+    def shutdown(self, timeout: float = EMAIL_SHUTDOWN_TIMEOUT):
+        """
+        Deliver what is queued (bounded by timeout), dead-letter pending retries.
+        Never blocks longer than timeout, even with a full queue and a hung SMTP server.
+        """
+        with self._lock:
+            thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            # Sender stuck on a full queue: left to die with the process (daemon thread)
+            logger.warning(f"⚠️ Email queue still full after {timeout:.1f}s, "
+                           f"{self._queue.qsize()} email(s) not delivered")
+            return
+        thread.join(max(0.0, deadline - time.monotonic()))
+        if thread.is_alive():
+            logger.warning(f"⚠️ Email sender still busy after {timeout:.0f}s, {self._queue.qsize()} email(s) left")
+
+    def stats(self) -> Dict:
+        return {
+            **self.counters,
+            "pending": self._queue.qsize(),
+            "waiting_retry": len(self._retries),
+            "connection_open": self._connection is not None
+        }
+
+    # ---------- sender thread ----------
+
+    def _run(self):
+        stopping = False
+        while True:
+            now = time.monotonic()
+            while self._retries and self._retries[0][0] <= now:
+                self._deliver(heapq.heappop(self._retries)[2])
+            if stopping and self._queue.empty():
+                break
+
+            timeout = None
+            if self._retries:
+                timeout = max(0.0, self._retries[0][0] - time.monotonic())
+            if self._connection is not None:
+                idle_left = max(0.0, self._last_used + self.idle_seconds - time.monotonic())
+                timeout = idle_left if timeout is None else min(timeout, idle_left)
+            if stopping:
+                timeout = 0.0
+
+            try:
+                item = self._queue.get(timeout=timeout) if timeout != 0.0 else self._queue.get_nowait()
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                self._deliver(item)
+
+            if self._connection is not None and time.monotonic() - self._last_used >= self.idle_seconds:
+                self._close()
+
+        for _, _, item in self._retries:
+            self._to_dead_letter(item, "shutdown before retry")
+        self._retries.clear()
+        self._close()
+
+    def _smtp(self) -> smtplib.SMTP:
+        if self._connection is None:
+            self._connection = self._connect()
+            self.counters["connections"] += 1
+        return self._connection
+
+    def _close(self):
+        if self._connection is not None:
+            try:
+                self._connection.quit()
+            except Exception:
+                pass
+            self._connection = None
+
+    def _deliver(self, item: Dict):
+        if item["message"] is None:
+            try:
+                item["message"] = item.pop("build")()
+            except Exception as e:
+                logger.error(f"❌ Email '{item['subject']}' could not be built: {e}")
+                self._to_dead_letter(item, f"build failed: {e}")
+                return
+
+        if not self._configured():
+            self.counters["skipped"] += 1
+            logger.warning(f"📧 SMTP not configured, email skipped: '{item['subject']}' to {item['to']}")
+            return
+
+        item["attempts"] += 1
+        try:
+            try:
+                self._smtp().send_message(item["message"])
+            except smtplib.SMTPServerDisconnected:
+                # The reused connection was dropped by the server: one fresh session
+                self._connection = None
+                self._smtp().send_message(item["message"])
+        except Exception as e:
+            self._close()
+            item["last_error"] = f"{type(e).__name__}: {e}"
+            if is_permanent_failure(e) or item["attempts"] >= self.max_attempts:
+                logger.error(f"❌ Email '{item['subject']}' to {item['to']} failed "
+                             f"({item['attempts']} attempt(s)): {item['last_error']}")
+                self._to_dead_letter(item, item["last_error"])
+                return
+            delay = self.retry_base_seconds * 2 ** (item["attempts"] - 1)
+            logger.warning(f"🔁 Email '{item['subject']}' to {item['to']} failed "
+                           f"({item['last_error']}), retry in {delay:.1f}s")
+            self._seq += 1
+            heapq.heappush(self._retries, (time.monotonic() + delay, self._seq, item))
+            self.counters["retried"] += 1
+            return
+
+        self._last_used = time.monotonic()
+        self.counters["sent"] += 1
+        logger.info(f"✅ Email '{item['subject']}' envoyé à {item['to']} (attempt {item['attempts']})")
+
+    def _to_dead_letter(self, item: Dict, error: str):
+        self.counters["dead_lettered"] += 1
+        record = {
+            "email_id": item["id"],
+            "to": item["to"],
+            "subject": item["subject"],
+            "kind": item["kind"],
+            "ref": item["ref"],
+            "attempts": item["attempts"],
+            "error": error,
+            "queued_at": item["queued_at"],
+            "failed_at": datetime.now().isoformat(),
+            "mime": item["message"].as_string() if item["message"] is not None else None
+        }
+        try:
+            self._dead_letter(record)
+            logger.warning(f"📭 Email '{item['subject']}' to {item['to']} moved to dead letters")
+        except Exception as e:
+            logger.error(f"❌ Dead letter not stored for '{item['subject']}' to {item['to']}: {e}")
+
+
+email_outbox = EmailOutbox()
+
+
+def queue_notification_email(to_email: str, subject: str, message: str, pr_id: Optional[str] = None,
+                             kind: str = "notification") -> Optional[str]:
+    """Non-blocking send_notification_email: the message is built and sent by the outbox thread"""
+    return email_outbox.enqueue(
+        to_email, subject,
+        lambda: build_notification_message(to_email, subject, message, pr_id),
+        kind=kind, ref=pr_id
+    )
+
+
+def queue_email(to_email: str, subject: str, build_message: Callable[[], str], pr_id: Optional[str] = None,
+                kind: str = "notification") -> Optional[str]:
+    """Same, with the HTML message itself built in the outbox thread (large bodies)"""
+    return email_outbox.enqueue(
+        to_email, subject,
+        lambda: build_notification_message(to_email, subject, build_message(), pr_id),
+        kind=kind, ref=pr_id
+    )
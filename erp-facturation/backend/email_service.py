@@ -20,6 +20,7 @@ SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
 BASE_URL = os.getenv("BASE_URL", "http://127.0.0.1:8050")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
 
 def send_validation_email(
     to_email: str,
@@ -362,25 +363,29 @@ def send_validation_email(
         return True
 
 
-def send_notification_email(
+def smtp_configured() -> bool:
+    return bool(SMTP_USER and SMTP_PASSWORD)
+
+
+def open_smtp_connection(timeout: float = SMTP_TIMEOUT) -> smtplib.SMTP:
+    """Connected, TLS-upgraded and logged-in SMTP session (caller closes it)"""
+    server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=timeout)
+    try:
+        server.starttls()
+        server.login(SMTP_USER, SMTP_PASSWORD)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+def build_notification_message(
     to_email: str,
     subject: str,
     message: str,
     pr_id: Optional[str] = None
-) -> bool:
-    """
-    Send general notification email
-    
-    Args:
-        to_email: Recipient email address
-        subject: Email subject
-        message: Email message body
-        pr_id: Optional PR ID for reference
-        
-    Returns:
-        bool: True if email sent successfully, False otherwise
-    """
-    
+) -> MIMEMultipart:
+    """General notification email (HTML + plain text), ready to send"""
     html_body = f"""
     <!DOCTYPE html>
     <html>
@@ -464,21 +469,42 @@ def send_notification_email(
     ERP Achat - Email automatique
     """
     
-    try:
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = f"ERP Achat <{SMTP_USER}>"
-        msg['To'] = to_email
-        
-        text_part = MIMEText(text_body, 'plain', 'utf-8')
-        html_part = MIMEText(html_body, 'html', 'utf-8')
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = f"ERP Achat <{SMTP_USER}>"
+    msg['To'] = to_email
+    
+    text_part = MIMEText(text_body, 'plain', 'utf-8')
+    html_part = MIMEText(html_body, 'html', 'utf-8')
+    
+    msg.attach(text_part)
+    msg.attach(html_part)
+    return msg
+
+
+def send_notification_email(
+    to_email: str,
+    subject: str,
+    message: str,
+    pr_id: Optional[str] = None
+) -> bool:
+    """
+    Send general notification email (synchronous, one SMTP session).
+    Request handlers should use email_outbox.queue_notification_email instead.
+    
+    Args:
+        to_email: Recipient email address
+        subject: Email subject
+        message: Email message body
+        pr_id: Optional PR ID for reference
         
-        msg.attach(text_part)
-        msg.attach(html_part)
+    Returns:
+        bool: True if email sent successfully, False otherwise
+    """
+    try:
+        msg = build_notification_message(to_email, subject, message, pr_id)
         
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASSWORD)
+        with open_smtp_connection() as server:
             server.send_message(msg)
         
         logger.info(f"✅ Email de notification envoyé à {to_email}")
@@ -1,202 +1,347 @@
-from fastapi import APIRouter, Form, HTTPException, UploadFile, File
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Form, HTTPException, UploadFile, File, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import Optional
 from datetime import datetime
 from uuid import uuid4
+import asyncio
+import json
 import logging
 import os
-from facture_ocr import FactureOCREasyOCR
-from facture_validator import FactureValidator
-from db import get_database
-from email_service import send_notification_email
+import zipfile
+from facture_jobs import job_manager, JobQueueFull, UPLOAD_DIR
+from facture_batch import start_batch, get_batch
+from upload_spool import MAX_BATCH_UPLOAD_BYTES, MAX_UPLOAD_BYTES, UploadTooLarge, spool_upload
+from db import get_po_collection, get_facture_collection, get_database, run_db
+from po_lookup import find_mapped_po
+from facture_stats import get_stats, invalidate_stats
+from facture_listing import (
+    LIST_DEFAULT_LIMIT, LIST_MAX_LIMIT, LIST_STREAM_BATCH, ListingError,
+    build_projection, build_query, fetch_page, sort_spec
+)
+from email_outbox import queue_email, queue_notification_email
+from perceptual_hash import flag_near_duplicates, phash_bands
+from facture_status import (
+    BULK_ACTIONS, BULK_TRANSITION_MAX_IDS, FactureNotFound, TransitionNotAllowed, apply_transition, bulk_transition
+)
+from facture_models import BulkTransitionRequest
 
 logger = logging.getLogger(__name__)
 
+# Job progress stream: the job state is in memory, re-read every JOB_EVENTS_POLL_SECONDS
+JOB_EVENTS_POLL_SECONDS = float(os.getenv("JOB_EVENTS_POLL_SECONDS", "0.25"))
+JOB_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("JOB_EVENTS_KEEPALIVE_SECONDS", "15"))
+
 facture_router = APIRouter(prefix="/factures", tags=["Factures"])
 
-# Get MongoDB collections
-db = get_database()
-po_collection = db["bons_commande"]  # ✅ FIXED: Use correct collection name
-facture_collection = db["factures"]
+# MongoDB collections are resolved per call (db.get_*_collection): importing this
+# module never touches the database, the app lifespan connects it.
 
-# Initialize EasyOCR (no API key needed!)
-try:
-    ocr_reader = FactureOCREasyOCR(languages=['fr', 'en'])
-    logger.info("✅ EasyOCR initialized and ready")
-except Exception as e:
-    logger.error(f"❌ Failed to initialize EasyOCR: {e}")
-    ocr_reader = None
+# EasyOCR runs in the worker processes of facture_jobs.job_manager,
+# each one holding its own warm reader.
 
 
-def map_po_fields(po: dict) -> dict:
-    """
-    Map bons_commande structure to expected PO structure for validation
-    """
-    # Extract first ligne if exists
-    first_ligne = po.get("lignes", [{}])[0] if po.get("lignes") else {}
-    
-    # Calculate total quantity from all lines
-    total_quantite = sum(ligne.get("quantite", 0) for ligne in po.get("lignes", []))
-    
-    return {
-        "purchase_order_id": po.get("purchase_order_id"),
-        "linked_pr_id": po.get("linked_pr_id"),
-        "type_achat": po.get("type_achat"),
-        "quantite": total_quantite or first_ligne.get("quantite"),
-        "unite": first_ligne.get("unite"),
-        "prix_estime": po.get("montant_total_ttc"),
-        "montant_ht": po.get("montant_total_ht"),
-        "montant_tva": po.get("montant_tva"),
-        "montant_ttc": po.get("montant_total_ttc"),
-        "devise": po.get("devise", "TND"),
-        "centre_cout": po.get("centre_cout"),
-        "priorite": po.get("priorite"),
-        "delai_souhaite": po.get("delai_souhaite"),
-        "date_livraison_souhaitee": po.get("date_livraison_souhaitee"),
-        "specifications_techniques": first_ligne.get("specifications_techniques") or first_ligne.get("description"),
-        "fournisseur": po.get("fournisseur", {}),
-        "demandeur": po.get("demandeur", {}),
-        "details": po.get("details_demande"),
-        "items": po.get("lignes", [])
-    }
-
-
-@facture_router.post("/upload-and-validate")
+@facture_router.post("/upload-and-validate", status_code=202)
 async def upload_facture_with_po_validation(
     file: UploadFile = File(...),
     po_id: str = Form(...),
     user_email: str = Form(...)
 ):
     """
-    Extraire une facture depuis un fichier uploadé et valider contre un PO
+    Recevoir une facture et la mettre en file d'attente pour OCR + validation contre un PO
     
-    Uses EasyOCR for local, offline text extraction (no API needed!)
+    The OCR itself runs in the EasyOCR worker pool (facture_jobs), so this
+    endpoint returns right away with a job ID to poll on /factures/jobs/{job_id}
+    or to follow on /factures/jobs/{job_id}/events (server-sent events).
     
     Steps:
-    1. Read uploaded file bytes
-    2. Extract text using EasyOCR (local processing)
-    3. Parse extracted data into structured fields
-    4. Retrieve PO from database
-    5. Validate invoice against PO
-    6. Save to MongoDB
-    7. Send email notification if errors detected
-    8. Return detailed results
+    1. Retrieve PO from database (fail fast if unknown)
+    2. Persist the uploaded file
+    3. Queue the OCR job (503 if the queue is full)
+    4. Return the job ID
+    
+    The worker then extracts text with EasyOCR, parses the fields and validates
+    against the PO; the result is saved to MongoDB by finalize_facture_job.
     """
     facture_id = None
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=str(UploadTooLarge(MAX_UPLOAD_BYTES)))
     try:
         facture_id = f"FACT-{uuid4().hex[:8].upper()}"
         logger.info(f"📤 Traitement facture: {file.filename}")
         logger.info(f"🔗 Liée au PO: {po_id}")
 
-        # Check if OCR is initialized
-        if ocr_reader is None:
-            raise HTTPException(
-                status_code=500,
-                detail="EasyOCR not initialized. Please restart the server."
-            )
-
-        # Step 1: Read file bytes directly (no upload to external service needed!)
-        logger.info("📖 Reading uploaded file...")
-        file_bytes = await file.read()
-        logger.info(f"✅ File read: {len(file_bytes)} bytes")
-
-        # Step 2: OCR Extraction using EasyOCR
-        logger.info("🔍 Starting OCR extraction with EasyOCR...")
-        ocr_result = ocr_reader.extract_from_bytes(file_bytes)
-
-        if not ocr_result.get("success"):
-            error_msg = f"OCR extraction failed: {ocr_result.get('error')}"
+        # Step 1: Retrieve PO from database (also tries the BC- prefix)
+        logger.info(f"🔍 Searching for PO: {po_id}")
+        found_po_id, po = await run_db(find_mapped_po, get_po_collection(), po_id)
+        
+        if not po:
+            error_msg = f"Purchase Order {po_id} not found in bons_commande collection"
             logger.error(f"❌ {error_msg}")
             
-            # Send error email
-            send_notification_email(
+            # Error email: queued, sent by the outbox thread
+            queue_notification_email(
                 to_email=user_email,
-                subject=f"❌ Échec d'extraction OCR - Facture {facture_id}",
+                subject=f"❌ PO Introuvable - Facture {facture_id}",
                 message=f"""
                 <p>Bonjour,</p>
-                <p>L'extraction OCR de votre facture <strong>{file.filename}</strong> a échoué.</p>
-                <p><strong>Raison:</strong> {ocr_result.get('error')}</p>
+                <p>Le bon de commande <strong>{po_id}</strong> est introuvable dans la base de données.</p>
                 <p>Veuillez vérifier que:</p>
                 <ul>
-                    <li>Le fichier est une image ou PDF lisible</li>
-                    <li>La qualité de l'image est suffisante</li>
-                    <li>Le texte est bien visible et non flou</li>
-                    <li>L'orientation de l'image est correcte</li>
+                    <li>L'ID du PO est correct (format: BC-XXXX ou simplement le numéro)</li>
+                    <li>Le PO existe bien dans le système</li>
+                    <li>Le PO n'a pas été supprimé</li>
                 </ul>
-                <p>Vous pouvez réessayer avec un fichier de meilleure qualité.</p>
+                <p>Fichier uploadé: <strong>{file.filename}</strong></p>
                 """,
                 pr_id=facture_id
             )
             
             raise HTTPException(
-                status_code=400,
+                status_code=404,
                 detail=error_msg
             )
 
-        logger.info(f"✅ OCR completed - Confidence: {ocr_result.get('confidence')*100:.1f}%")
-        logger.info(f"📊 Extracted {len(ocr_result.get('raw_text', ''))} characters")
+        po_id = found_po_id  # Update po_id for consistency
+        logger.info(f"✅ PO found: {po_id}")
 
-        # Step 3: Retrieve PO from database
-        logger.info(f"🔍 Searching for PO: {po_id}")
-        po_raw = po_collection.find_one({"purchase_order_id": po_id})
-
-        # Try with BC prefix if user entered just the number
-        if not po_raw and not po_id.startswith("BC-"):
-            logger.info(f"🔍 Trying with BC- prefix: BC-{po_id}")
-            po_raw = po_collection.find_one({"purchase_order_id": f"BC-{po_id}"})
-            if po_raw:
-                po_id = f"BC-{po_id}"  # Update po_id for consistency
-        
-        if not po_raw:
-            error_msg = f"Purchase Order {po_id} not found in bons_commande collection"
+        # Step 2: Spool the upload to disk in chunks, hashed on the way (never fully in memory)
+        extension = os.path.splitext(file.filename or "")[1].lower()
+        file_path = os.path.join(UPLOAD_DIR, f"{facture_id}{extension}")
+        try:
+            file_size, file_hash = await spool_upload(file, file_path, MAX_UPLOAD_BYTES)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        logger.info(f"✅ File saved: {file_path} ({file_size} bytes)")
+
+        # Same file already received? (reported, the upload is still processed)
+        duplicate_of = await run_db(
+            lambda: [doc["facture_id"] for doc in get_facture_collection().find(
+                {"ocr_data.file_hash": file_hash}, {"_id": 0, "facture_id": 1}
+            ).limit(5)]
+        )
+        if duplicate_of:
+            logger.warning(f"♻️ {file.filename} already received as {', '.join(duplicate_of)}")
+
+        # Step 3: Queue OCR + parsing + validation
+        try:
+            job_id = job_manager.submit(
+                file_path,
+                po_id,
+                context={
+                    "facture_id": facture_id,
+                    "filename": file.filename,
+                    "user_email": user_email,
+                    "po": po
+                },
+                on_complete=finalize_facture_job,
+                file_hash=file_hash,
+                on_failure=fail_facture_job
+            )
+        except JobQueueFull as e:
+            os.remove(file_path)
+            logger.warning(f"⏳ {e}")
+            raise HTTPException(
+                status_code=503,
+                detail="OCR queue is full, please retry in a moment",
+                headers={"Retry-After": "30"}
+            )
+
+        # Step 4: Return the job ID right away
+        return JSONResponse(
+            content={
+                "success": True,
+                "job_id": job_id,
+                "facture_id": facture_id,
+                "linked_po_id": po_id,
+                "status": "queued",
+                "status_url": f"/factures/jobs/{job_id}",
+                "events_url": f"/factures/jobs/{job_id}/events",
+                "file_hash": file_hash,
+                "duplicate_of": duplicate_of,
+                "message": "📥 Facture reçue - extraction OCR en cours"
+            },
+            status_code=202
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Facture upload failed: {str(e)}")
+        logger.exception("Full traceback:")
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+
+
+@facture_router.get("/jobs/{job_id}")
+async def get_facture_job(job_id: str):
+    """Statut d'un job OCR (queued, running, done, failed) et résultat final"""
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str, ensure_ascii=False)}\n\n"
+
+
+async def _job_events(job_id: str):
+    """A 'progress' event on every stage or page change, then one 'done' / 'failed' event with the result"""
+    last = None
+    idle = 0.0
+    while True:
+        job = job_manager.get(job_id)
+        if job is None:
+            yield _sse("failed", {"job_id": job_id, "error": "Job expired"})
+            return
+        if job["status"] in ("done", "failed"):
+            yield _sse(job["status"], job)
+            return
+        state = (job["status"], job["stage"], job["pages_done"], job["pages_total"])
+        if state != last:
+            last, idle = state, 0.0
+            yield _sse("progress", {key: value for key, value in job.items() if key != "result"})
+        elif idle >= JOB_EVENTS_KEEPALIVE_SECONDS:
+            idle = 0.0
+            yield ": keepalive\n\n"  # SSE comment: keeps proxies from closing an idle stream
+        await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+        idle += JOB_EVENTS_POLL_SECONDS
+
+
+@facture_router.get("/jobs/{job_id}/events")
+async def stream_facture_job(job_id: str):
+    """
+    Suivi d'un job OCR en server-sent events (stage, pages OCR n/N, progression %),
+    pour l'UI: pas de polling côté client, une connexion jusqu'à la fin du job
+    """
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        _job_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@facture_router.post("/batch", status_code=202)
+async def upload_facture_batch(
+    file: UploadFile = File(...),
+    user_email: str = Form(...),
+    po_id: Optional[str] = Form(None)
+):
+    """
+    Recevoir une archive ZIP de factures et les traiter en lot
+    
+    The archive is spooled to disk in chunks, then its entries are streamed one
+    by one into the OCR worker pool. Without po_id each invoice is matched to
+    its PO from the numero_po found on it. Poll /factures/batch/{batch_id}.
+    """
+    if not (file.filename or "").lower().endswith(".zip"):
+        raise HTTPException(status_code=400, detail="A .zip archive is expected")
+
+    archive_path = os.path.join(UPLOAD_DIR, f"batch-{uuid4().hex[:8]}.zip")
+    try:
+        await spool_upload(file, archive_path, MAX_BATCH_UPLOAD_BYTES)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    if not zipfile.is_zipfile(archive_path):
+        os.remove(archive_path)
+        raise HTTPException(status_code=400, detail="Invalid ZIP archive")
+
+    batch = start_batch(
+        archive_path,
+        user_email,
+        finalize_facture_job,
+        po_id=po_id or None,
+        on_failure=fail_facture_job,
+        display_name=file.filename,
+        remove_source=True
+    )
+    return JSONResponse(
+        content={
+            "success": True,
+            "batch_id": batch.batch_id,
+            "status": batch.status,
+            "status_url": f"/factures/batch/{batch.batch_id}",
+            "message": "📦 Archive reçue - traitement du lot en cours"
+        },
+        status_code=202
+    )
+
+
+@facture_router.get("/batch/{batch_id}")
+async def get_facture_batch(batch_id: str):
+    """Rapport d'un lot: résultat par fichier et débit global"""
+    batch = get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch.report()
+
+
+def finalize_facture_job(job: dict, outcome: dict) -> dict:
+    """
+    Save the invoice once the OCR worker is done and notify the user.
+    Runs in a background thread of the job manager, off the event loop.
+    Returns the same payload the upload endpoint used to return synchronously.
+    """
+    context = job["context"]
+    facture_id = context["facture_id"]
+    filename = context["filename"]
+    user_email = context["user_email"]
+    ocr_result = outcome["ocr_result"]
+    po = context.get("po") or outcome.get("po")
+    po_id = outcome.get("po_id") or job["po_id"]
+    if po is None and po_id:
+        # Batch ingestion: PO matched by the worker from the invoice's numero_po
+        _, po = find_mapped_po(get_po_collection(), po_id)
+    if po_id:
+        job["po_id"] = po_id
+
+    try:
+        if not ocr_result.get("success"):
+            error_msg = f"OCR extraction failed: {ocr_result.get('error')}"
             logger.error(f"❌ {error_msg}")
             
-            # Send error email
-            send_notification_email(
+            # Error email: queued, sent by the outbox thread
+            queue_notification_email(
                 to_email=user_email,
-                subject=f"❌ PO Introuvable - Facture {facture_id}",
+                subject=f"❌ Échec d'extraction OCR - Facture {facture_id}",
                 message=f"""
                 <p>Bonjour,</p>
-                <p>Le bon de commande <strong>{po_id}</strong> est introuvable dans la base de données.</p>
+                <p>L'extraction OCR de votre facture <strong>{filename}</strong> a échoué.</p>
+                <p><strong>Raison:</strong> {ocr_result.get('error')}</p>
                 <p>Veuillez vérifier que:</p>
                 <ul>
-                    <li>L'ID du PO est correct (format: BC-XXXX ou simplement le numéro)</li>
-                    <li>Le PO existe bien dans le système</li>
-                    <li>Le PO n'a pas été supprimé</li>
-                </ul>
-                <p>Fichier uploadé: <strong>{file.filename}</strong></p>
-                <p><strong>Données extraites:</strong></p>
-                <ul>
-                    <li>Numéro facture: {ocr_result.get('numero_facture', 'N/A')}</li>
-                    <li>Fournisseur: {ocr_result.get('fournisseur_nom', 'N/A')}</li>
-                    <li>Montant: {ocr_result.get('montant_ttc', 'N/A')} {ocr_result.get('devise', 'TND')}</li>
+                    <li>Le fichier est une image ou PDF lisible</li>
+                    <li>La qualité de l'image est suffisante</li>
+                    <li>Le texte est bien visible et non flou</li>
+                    <li>L'orientation de l'image est correcte</li>
                 </ul>
+                <p>Vous pouvez réessayer avec un fichier de meilleure qualité.</p>
                 """,
                 pr_id=facture_id
             )
-            
-            raise HTTPException(
-                status_code=404,
-                detail=error_msg
-            )
-
-        logger.info(f"✅ PO found: {po_raw.get('purchase_order_id')}")
-        
-        # Map the PO structure to expected format
-        po = map_po_fields(po_raw)
-        logger.info(f"✅ PO mapped successfully")
+            raise Exception(error_msg)
 
-        # Step 4: Validation against PO
-        logger.info("🔍 Validating invoice against PO...")
-        validator = FactureValidator(po_collection)
-        validation = validator.validate_against_po(ocr_result, po_id)
+        if po is None or outcome.get("validation") is None:
+            # Fichier gardé dans uploads/ et OCR en cache: re-soumission avec po_id immédiate
+            raise Exception(
+                f"No purchase order matched for {filename} "
+                f"(numero_po read on invoice: {ocr_result.get('numero_po') or 'none'})"
+            )
 
+        validation = outcome["validation"]
+        near_duplicates = outcome.get("near_duplicates") or []
+        if near_duplicates:
+            # Same page as a stored invoice: held for review when the number, or amount + date, match too
+            validation = flag_near_duplicates(validation, near_duplicates, ocr_result)
+        logger.info(f"✅ OCR completed - Confidence: {ocr_result.get('confidence')*100:.1f}%")
         logger.info(f"📊 Validation score: {validation['confidence_score']}%")
         logger.info(f"✅ Matched fields: {len(validation['matched_fields'])}/10")
         logger.info(f"❌ Errors: {len(validation['errors'])}")
         logger.info(f"⚠️  Warnings: {len(validation['warnings'])}")
 
-        # Step 5: Prepare invoice document
+        # Prepare invoice document
         facture_doc = {
             "facture_id": facture_id,
             "linked_po_id": po_id,
@@ -235,8 +380,15 @@ async def upload_facture_with_po_validation(
                 "method": "EasyOCR",
                 "confidence": ocr_result.get("confidence", 0.0),
                 "raw_text": ocr_result.get("raw_text", "")[:500],
-                "extraction_date": datetime.now().isoformat()
+                "extraction_date": datetime.now().isoformat(),
+                "file_path": job["file_path"],
+                "file_hash": ocr_result.get("file_hash"),
+                "cache": ocr_result.get("cache"),
+                "phash": outcome.get("phash"),
+                "phash_bands": phash_bands(outcome["phash"]) if outcome.get("phash") else [],
+                "reused_from": outcome.get("ocr_reused_from")
             },
+            "near_duplicates": validation.get("near_duplicates", []),
             
             # Validation results
             "validation_result": {
@@ -258,35 +410,31 @@ async def upload_facture_with_po_validation(
             }]
         }
 
-        # Step 6: Save to MongoDB
-        try:
-            logger.info(f"💾 Saving facture to database...")
-            facture_collection.insert_one(facture_doc)
-            logger.info(f"✅ Facture {facture_id} saved successfully")
-        except Exception as db_error:
-            logger.error(f"❌ Database save failed: {str(db_error)}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to save facture to database: {str(db_error)}"
-            )
+        # Save to MongoDB
+        logger.info(f"💾 Saving facture to database...")
+        get_facture_collection().insert_one(facture_doc)
+        invalidate_stats("insert")
+        logger.info(f"✅ Facture {facture_id} saved successfully")
 
-        # Step 7: Send email notification if validation failed
+        # Send email notification if validation failed
         if not validation["is_valid"] or validation["errors"] or validation["warnings"]:
-            logger.info("📧 Sending error notification email...")
-            email_sent = send_delivery_error_email(
+            email_id = send_delivery_error_email(
                 user_email=user_email,
                 facture_id=facture_id,
                 po_id=po_id,
                 validation_result=validation,
                 ocr_data=ocr_result,
-                filename=file.filename
+                filename=filename
             )
-            logger.info(f"📧 Email notification sent: {email_sent}")
+            logger.info(f"📧 Error notification email queued: {email_id}")
         else:
             logger.info("✅ Validation passed - No notification email needed")
 
-        # Step 8: Prepare response
-        response = {
+        logger.info("="*50)
+        logger.info(f"✅ FACTURE PROCESSING COMPLETED: {facture_id}")
+        logger.info("="*50)
+
+        return {
             "success": True,
             "facture_id": facture_id,
             "linked_po_id": po_id,
@@ -312,41 +460,62 @@ async def upload_facture_with_po_validation(
                       else "⚠️ Facture nécessite des corrections - Email de notification envoyé"
         }
 
-        logger.info("="*50)
-        logger.info(f"✅ FACTURE PROCESSING COMPLETED: {facture_id}")
-        logger.info("="*50)
-
-        return JSONResponse(content=response, status_code=200)
-    
-    except HTTPException:
-        raise
     except Exception as e:
-        logger.error(f"❌ Facture processing failed: {str(e)}")
-        logger.exception("Full traceback:")
-        
-        # Send error email for unexpected errors
-        if user_email and facture_id:
-            send_notification_email(
-                to_email=user_email,
-                subject=f"❌ Erreur de traitement - Facture {facture_id}",
-                message=f"""
-                <p>Bonjour,</p>
-                <p>Une erreur inattendue s'est produite lors du traitement de votre facture.</p>
-                <p><strong>Détails de l'erreur:</strong> {str(e)}</p>
-                <p>Fichier uploadé: <strong>{file.filename if file else 'N/A'}</strong></p>
-                <p>Veuillez contacter le support technique si le problème persiste.</p>
-                """,
-                pr_id=facture_id
-            )
-        
-        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+        if ocr_result.get("success"):
+            logger.error(f"❌ Facture processing failed: {str(e)}")
+            logger.exception("Full traceback:")
+            queue_processing_error_email(user_email, facture_id, filename, e)
+        raise
+
+
+def fail_facture_job(job: dict, error: Exception):
+    """
+    Failure callback of the OCR job: the worker crashed, or parsing / validation
+    raised, before finalize_facture_job could run. Logged and emailed like any
+    other processing error: with the 202 upload, this email is the user's only signal.
+    """
+    context = job["context"]
+    logger.error(f"❌ Facture processing failed: {str(error)}", exc_info=error)
+    queue_processing_error_email(context.get("user_email"), context.get("facture_id"),
+                                 context.get("filename"), error)
+
+
+def queue_processing_error_email(user_email: str, facture_id: str, filename: Optional[str], error: Exception):
+    """Queue the "Erreur de traitement" email sent for unexpected errors"""
+    if not (user_email and facture_id):
+        return
+    queue_notification_email(
+        to_email=user_email,
+        subject=f"❌ Erreur de traitement - Facture {facture_id}",
+        message=f"""
+        <p>Bonjour,</p>
+        <p>Une erreur inattendue s'est produite lors du traitement de votre facture.</p>
+        <p><strong>Détails de l'erreur:</strong> {str(error)}</p>
+        <p>Fichier uploadé: <strong>{filename or 'N/A'}</strong></p>
+        <p>Veuillez contacter le support technique si le problème persiste.</p>
+        """,
+        pr_id=facture_id
+    )
 
 
-def send_delivery_error_email(user_email: str, facture_id: str, po_id: str, 
-                               validation_result: dict, ocr_data: dict, filename: str) -> bool:
+def send_delivery_error_email(user_email: str, facture_id: str, po_id: str,
+                               validation_result: dict, ocr_data: dict, filename: str) -> Optional[str]:
     """
-    Send email notification when delivery errors are detected
+    Queue the email notification sent when delivery errors are detected.
+    The HTML is built by the outbox thread; returns the queued email ID (None if the queue is full).
     """
+    return queue_email(
+        to_email=user_email,
+        subject=f"⚠️ Erreur de Livraison Détectée - Facture {facture_id} vs PO {po_id}",
+        build_message=lambda: build_delivery_error_message(facture_id, po_id, validation_result, ocr_data, filename),
+        pr_id=facture_id,
+        kind="delivery_error"
+    )
+
+
+def build_delivery_error_message(facture_id: str, po_id: str, validation_result: dict,
+                                 ocr_data: dict, filename: str) -> str:
+    """HTML body of the delivery error email"""
     # Build error summary
     errors_html = ""
     if validation_result.get("errors"):
@@ -429,41 +598,113 @@ def send_delivery_error_email(user_email: str, facture_id: str, po_id: str,
     <strong>Système ERP Achat</strong></p>
     """
     
-    return send_notification_email(
-        to_email=user_email,
-        subject=f"⚠️ Erreur de Livraison Détectée - Facture {facture_id} vs PO {po_id}",
-        message=message,
-        pr_id=facture_id
-    )
+    return message
+
+
+# ==================== RECONCILIATION, LISTING & STATUS ENDPOINTS ====================
+
+@facture_router.post("/reconcile")
+async def reconcile_factures(dry_run: bool = False):
+    """
+    Rapprochement 3 voies (facture / lignes du PO / quantités reçues GRN)
+    de toutes les factures ouvertes, en masse; résultat écrit dans three_way_match
+    """
+    from facture_matching import run_three_way_match  # pandas: loaded on first use only
 
+    result = await run_db(run_three_way_match, get_database(), dry_run)
+    return result
 
-# ==================== ENDPOINTS BELOW UNCHANGED ====================
 
 @facture_router.get("/")
 async def list_factures(
     status: Optional[str] = None,
-    po_id: Optional[str] = None
+    po_id: Optional[str] = None,
+    search: Optional[str] = Query(None, max_length=50, description="Partie de l'ID facture"),
+    fields: Optional[str] = Query(None, description="Champs retournés, séparés par des virgules"),
+    sort: str = Query("desc", pattern="^(asc|desc)$", description="Ordre sur date_reception"),
+    limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="next_cursor de la page précédente"),
+    format: str = Query("json", pattern="^(json|ndjson)$")
 ):
-    """Liste toutes les factures avec filtres optionnels"""
-    query = {}
-    
-    if status:
-        query["status"] = status
-    if po_id:
-        query["linked_po_id"] = po_id
-    
-    factures = list(facture_collection.find(
-        query,
-        {"_id": 0, "ocr_data.raw_text": 0}
-    ))
-    
-    return {"total": len(factures), "factures": factures}
+    """
+    Liste paginée des factures (pagination par clé date_reception + facture_id).
+    total: nombre de factures correspondant aux filtres (toutes pages), count: lignes de la page.
+    format=ndjson: export de toutes les factures filtrées (limit ignoré), une par
+    ligne, écrites au fil du curseur.
+    """
+    descending = sort == "desc"
+    try:
+        query = build_query(status, po_id, search, cursor, descending)
+        count_query = build_query(status, po_id, search)
+        projection = build_projection(fields)
+    except ListingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if format == "ndjson":
+        return StreamingResponse(
+            _stream_factures(query, projection, descending),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": 'attachment; filename="factures.ndjson"'}
+        )
+
+    return await run_db(fetch_page, get_facture_collection(), query, projection, descending, limit, count_query)
+
+
+async def _stream_factures(query: dict, projection: dict, descending: bool):
+    """One cursor batch in memory at a time, fetched on the DB thread pool"""
+    cursor = get_facture_collection().find(query, projection, batch_size=LIST_STREAM_BATCH) \
+        .sort(sort_spec(descending))
+
+    def next_batch():
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= LIST_STREAM_BATCH:
+                break
+        return batch
+
+    try:
+        while True:
+            batch = await run_db(next_batch)
+            if not batch:
+                break
+            yield "".join(json.dumps(doc, ensure_ascii=False, default=str) + "\n" for doc in batch)
+    finally:
+        cursor.close()
+
+
+@facture_router.post("/bulk-transition")
+async def bulk_transition_factures(request: BulkTransitionRequest):
+    """
+    Approuver ou marquer payées plusieurs factures en une fois: un seul
+    bulk_write, chaque mise à jour filtrée sur les statuts autorisés.
+    Retourne le résultat par facture (updated, not_found, not_allowed).
+    """
+    if request.action not in BULK_ACTIONS:
+        raise HTTPException(status_code=400, detail=f"Unsupported bulk action: {request.action}")
+    if len(request.facture_ids) > BULK_TRANSITION_MAX_IDS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {BULK_TRANSITION_MAX_IDS} factures per bulk transition"
+        )
+
+    result = await run_db(
+        bulk_transition, get_facture_collection(), request.facture_ids, request.action, request.user
+    )
+    if result["updated"]:
+        invalidate_stats("status")
+    logger.info(
+        f"📦 Bulk {request.action} by {request.user}: "
+        f"{result['updated']}/{result['requested']} facture(s) updated"
+    )
+    return result
 
 
 @facture_router.get("/{facture_id}")
 async def get_facture_details(facture_id: str):
     """Récupérer les détails d'une facture"""
-    facture = facture_collection.find_one(
+    facture = await run_db(
+        get_facture_collection().find_one,
         {"facture_id": facture_id},
         {"_id": 0}
     )
@@ -474,35 +715,22 @@ async def get_facture_details(facture_id: str):
     return facture
 
 
+async def _transition(facture_id: str, action: str, user: str, reason: Optional[str] = None) -> dict:
+    try:
+        return await run_db(apply_transition, get_facture_collection(), facture_id, action, user, reason)
+    except FactureNotFound:
+        raise HTTPException(status_code=404, detail="Facture not found")
+
+
 @facture_router.post("/{facture_id}/approve")
 async def approve_facture(facture_id: str, user: str = Form(...)):
     """Approuver une facture pour paiement"""
-    facture = facture_collection.find_one({"facture_id": facture_id})
-    
-    if not facture:
-        raise HTTPException(status_code=404, detail="Facture not found")
-    
-    if facture["status"] not in ["Validée", "En attente correction"]:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Cannot approve facture with status: {facture['status']}"
-        )
-    
-    facture_collection.update_one(
-        {"facture_id": facture_id},
-        {
-            "$set": {"status": "Approuvée"},
-            "$push": {
-                "history": {
-                    "action": "Approbation",
-                    "user": user,
-                    "timestamp": datetime.now().isoformat(),
-                    "status": "Approuvée"
-                }
-            }
-        }
-    )
+    try:
+        await _transition(facture_id, "approve", user)
+    except TransitionNotAllowed as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
+    invalidate_stats("status")
     logger.info(f"✅ Facture {facture_id} approved by {user}")
     
     return {"message": f"Facture {facture_id} approuvée avec succès"}
@@ -514,28 +742,13 @@ async def reject_facture(
     user: str = Form(...),
     reason: str = Form(...)
 ):
-    """Rejeter une facture"""
-    facture = facture_collection.find_one({"facture_id": facture_id})
-    
-    if not facture:
-        raise HTTPException(status_code=404, detail="Facture not found")
-    
-    facture_collection.update_one(
-        {"facture_id": facture_id},
-        {
-            "$set": {"status": "Rejetée"},
-            "$push": {
-                "history": {
-                    "action": "Rejet",
-                    "user": user,
-                    "reason": reason,
-                    "timestamp": datetime.now().isoformat(),
-                    "status": "Rejetée"
-                }
-            }
-        }
-    )
+    """Rejeter une facture (pas une facture déjà payée ou rejetée)"""
+    try:
+        await _transition(facture_id, "reject", user, reason)
+    except TransitionNotAllowed as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
+    invalidate_stats("status")
     logger.info(f"❌ Facture {facture_id} rejected by {user}")
     
     return {"message": f"Facture {facture_id} rejetée"}
@@ -544,64 +757,28 @@ async def reject_facture(
 @facture_router.post("/{facture_id}/mark-paid")
 async def mark_facture_paid(facture_id: str, user: str = Form(...)):
     """Marquer une facture comme payée"""
-    facture = facture_collection.find_one({"facture_id": facture_id})
-    
-    if not facture:
-        raise HTTPException(status_code=404, detail="Facture not found")
-    
-    if facture["status"] != "Approuvée":
+    try:
+        await _transition(facture_id, "mark_paid", user)
+    except TransitionNotAllowed:
         raise HTTPException(
             status_code=400,
             detail="Only approved factures can be marked as paid"
         )
     
-    facture_collection.update_one(
-        {"facture_id": facture_id},
-        {
-            "$set": {"status": "Payée"},
-            "$push": {
-                "history": {
-                    "action": "Paiement effectué",
-                    "user": user,
-                    "timestamp": datetime.now().isoformat(),
-                    "status": "Payée"
-                }
-            }
-        }
-    )
-    
+    invalidate_stats("status")
     logger.info(f"💰 Facture {facture_id} marked as paid")
     
     return {"message": f"Facture {facture_id} marquée comme payée"}
 
 
 @facture_router.get("/stats/summary")
-async def get_facture_statistics():
-    """Statistiques des factures pour le dashboard"""
-    total = facture_collection.count_documents({})
-    
-    stats = {
-        "total": total,
-        "by_status": {},
-        "total_amount": 0.0,
-        "average_confidence": 0.0
-    }
-    
-    for status in ["Validée", "En attente correction", "Approuvée", "Rejetée", "Payée"]:
-        count = facture_collection.count_documents({"status": status})
-        stats["by_status"][status] = count
-    
-    pipeline = [
-        {"$group": {
-            "_id": None,
-            "total": {"$sum": "$montant_ttc"},
-            "avg_confidence": {"$avg": "$ocr_data.confidence"}
-        }}
-    ]
-    
-    result = list(facture_collection.aggregate(pipeline))
-    if result:
-        stats["total_amount"] = round(result[0].get("total", 0.0), 2)
-        stats["average_confidence"] = round(result[0].get("avg_confidence", 0.0), 2)
-    
-    return stats
\ No newline at end of file
+async def get_facture_statistics(
+    by_month: bool = False,
+    months: int = Query(12, ge=1, le=120)
+):
+    """
+    Statistiques des factures pour le dashboard: une seule agrégation $facet,
+    mise en cache quelques secondes (invalidée à chaque insertion / changement de statut).
+    by_month=true ajoute les tendances mensuelles (nombre, montant, confiance OCR).
+    """
+    return await run_db(get_stats, get_facture_collection(), by_month, months)
@@ -0,0 +1,249 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import zipfile
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+from facture_jobs import job_manager, UPLOAD_DIR
+from upload_spool import MAX_UPLOAD_BYTES, copy_hashed
+
+logger = logging.getLogger(__name__)
+
+BATCH_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg")
+
+
+def iter_batch_entries(source: str) -> Iterator[Tuple[str, Callable]]:
+    """
+    Yield (name, open) for every invoice file of a ZIP archive or a directory.
+    open() returns a binary file object; ZIP members are decompressed as they
+    are read, so nothing is extracted up front.
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(BATCH_EXTENSIONS) and not name.startswith("."):
+                    path = os.path.join(root, name)
+                    yield os.path.relpath(path, source), (lambda p=path: open(p, "rb"))
+        return
+
+    with zipfile.ZipFile(source) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            base = os.path.basename(name)
+            # Skip folders and macOS metadata (__MACOSX/, ._file)
+            if info.is_dir() or not base or base.startswith(".") or name.startswith("__MACOSX/"):
+                continue
+            if name.lower().endswith(BATCH_EXTENSIONS):
+                yield name, (lambda i=info: archive.open(i))
+
+
+class BatchRun:
+    """One ZIP/folder ingestion: the submitted jobs and their per-file outcome"""
+
+    def __init__(self, source: str, user_email: str, po_id: Optional[str] = None,
+                 display_name: Optional[str] = None):
+        self.batch_id = f"BATCH-{uuid4().hex[:8].upper()}"
+        self.source = source
+        self.display_name = display_name or os.path.basename(source.rstrip(os.sep))
+        self.user_email = user_email
+        self.po_id = po_id
+        self.files: List[Dict] = []
+        self.status = "submitting"
+        self.error = None
+        self.started_at = time.time()
+        self.submitted_at = None
+        self.finished_at = None
+
+    def _file_report(self, entry: Dict) -> Dict:
+        report = dict(entry)
+        job = job_manager.get(entry["job_id"]) if entry.get("job_id") else None
+        if job is None:
+            return report
+
+        report["status"] = job["status"]
+        report["pages"] = job["pages_total"]
+        report["elapsed_seconds"] = job["elapsed_seconds"]
+        report["po_id"] = job["po_id"]
+        report["error"] = job["error"]
+        result = job["result"] or {}
+        validation = result.get("validation_results") or {}
+        report["facture_status"] = result.get("status")
+        report["is_valid"] = validation.get("is_valid")
+        report["confidence_score"] = validation.get("confidence_score")
+        return report
+
+    def report(self) -> Dict:
+        """Per-file results plus aggregate throughput"""
+        files = [self._file_report(entry) for entry in self.files]
+        finished = [f for f in files if f["status"] in ("done", "failed", "rejected")]
+
+        if self.status != "failed" and self.submitted_at and len(finished) == len(files):
+            if self.finished_at is None:
+                self.finished_at = time.time()
+            self.status = "done"
+
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        done = [f for f in files if f["status"] == "done"]
+        pages = sum(f.get("pages") or 0 for f in finished)
+
+        return {
+            "batch_id": self.batch_id,
+            "source": self.display_name,
+            "status": self.status,
+            "error": self.error,
+            "summary": {
+                "files": len(files),
+                "done": len(done),
+                "failed": sum(1 for f in files if f["status"] in ("failed", "rejected")),
+                "pending": len(files) - len(finished),
+                "valid": sum(1 for f in done if f.get("is_valid")),
+                "po_auto_matched": sum(1 for f in done if f.get("po_source") == "auto"),
+                "pages": pages,
+                "elapsed_seconds": round(elapsed, 2),
+                "files_per_minute": round(len(finished) / elapsed * 60, 2) if elapsed > 0 else None,
+                "pages_per_second": round(pages / elapsed, 2) if elapsed > 0 else None
+            },
+            "files": files
+        }
+
+
+_batches: Dict[str, BatchRun] = {}
+_batches_lock = threading.Lock()
+
+
+def _spool_entry(name: str, opener: Callable, facture_id: str) -> Tuple[str, str]:
+    """Copy one entry to the upload directory in chunks; returns (path, sha256)
+    Entries are held to the single-upload size limit (guards against ZIP bombs)."""
+    extension = os.path.splitext(name)[1].lower()
+    file_path = os.path.join(UPLOAD_DIR, f"{facture_id}{extension}")
+    with opener() as src:
+        _, file_hash = copy_hashed(src, file_path, MAX_UPLOAD_BYTES)
+    return file_path, file_hash
+
+
+def _submit_entries(batch: BatchRun, on_complete: Callable[[Dict, Dict], Dict], remove_source: bool,
+                    on_failure: Optional[Callable[[Dict, Exception], None]] = None):
+    """Stream the entries into the OCR pool, waiting for free slots (batch thread)"""
+    try:
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        for name, opener in iter_batch_entries(batch.source):
+            facture_id = f"FACT-{uuid4().hex[:8].upper()}"
+            entry = {
+                "filename": name,
+                "facture_id": facture_id,
+                "job_id": None,
+                "status": "queued",
+                "po_id": batch.po_id,
+                "po_source": "given" if batch.po_id else "auto",
+                "error": None
+            }
+            try:
+                file_path, file_hash = _spool_entry(name, opener, facture_id)
+                entry["job_id"] = job_manager.submit(
+                    file_path,
+                    batch.po_id,
+                    context={
+                        "facture_id": facture_id,
+                        "filename": os.path.basename(name),
+                        "user_email": batch.user_email,
+                        "batch_id": batch.batch_id
+                    },
+                    on_complete=on_complete,
+                    block=True,
+                    file_hash=file_hash,
+                    on_failure=on_failure
+                )
+            except Exception as e:
+                logger.error(f"❌ Batch {batch.batch_id}: {name} rejected: {e}")
+                entry["status"] = "rejected"
+                entry["error"] = str(e)
+            batch.files.append(entry)
+
+        batch.submitted_at = time.time()
+        logger.info(f"📦 Batch {batch.batch_id}: {len(batch.files)} file(s) submitted")
+    except Exception as e:
+        logger.error(f"❌ Batch {batch.batch_id} failed: {e}")
+        batch.status = "failed"
+        batch.error = str(e)
+        batch.finished_at = time.time()
+    finally:
+        if remove_source and os.path.isfile(batch.source):
+            os.remove(batch.source)
+
+
+def start_batch(source: str, user_email: str, on_complete: Callable[[Dict, Dict], Dict],
+                po_id: Optional[str] = None, display_name: Optional[str] = None,
+                remove_source: bool = False,
+                on_failure: Optional[Callable[[Dict, Exception], None]] = None) -> BatchRun:
+    """
+    Start ingesting a ZIP archive or a directory in a background thread.
+    Without po_id each invoice is matched to its PO from the numero_po it carries.
+    """
+    batch = BatchRun(source, user_email, po_id, display_name)
+    with _batches_lock:
+        _batches[batch.batch_id] = batch
+    threading.Thread(
+        target=_submit_entries,
+        args=(batch, on_complete, remove_source, on_failure),
+        name=f"batch-{batch.batch_id}",
+        daemon=True
+    ).start()
+    logger.info(f"📦 Batch {batch.batch_id} started from {batch.display_name}")
+    return batch
+
+
+def get_batch(batch_id: str) -> Optional[BatchRun]:
+    with _batches_lock:
+        return _batches.get(batch_id)
+
+
+def main():
+    """CLI: python facture_batch.py <archive.zip|folder> --user-email ... [--po-id ...]"""
+    parser = argparse.ArgumentParser(description="Ingest a ZIP archive or a folder of invoices")
+    parser.add_argument("source", help="ZIP archive or directory of PDF/PNG/JPG invoices")
+    parser.add_argument("--user-email", required=True, help="Recipient of the validation emails")
+    parser.add_argument("--po-id", default=None, help="PO for every invoice (default: matched from numero_po)")
+    parser.add_argument("--report", default=None, help="Write the JSON report to this file")
+    parser.add_argument("--poll", type=float, default=2.0, help="Progress refresh interval (seconds)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from facture_api import fail_facture_job, finalize_facture_job
+
+    job_manager.start()
+    try:
+        batch = start_batch(args.source, args.user_email, finalize_facture_job, po_id=args.po_id,
+                            on_failure=fail_facture_job)
+        while True:
+            report = batch.report()
+            summary = report["summary"]
+            print(
+                f"⏳ {summary['done'] + summary['failed']}/{summary['files']} files "
+                f"({summary['failed']} failed) - {summary['elapsed_seconds']}s",
+                flush=True
+            )
+            if report["status"] in ("done", "failed"):
+                break
+            time.sleep(args.poll)
+    finally:
+        job_manager.shutdown()
+
+    for f in report["files"]:
+        outcome = "✅" if f["status"] == "done" else "❌"
+        print(f"{outcome} {f['filename']}: {f['status']} po={f.get('po_id')} "
+              f"valid={f.get('is_valid')} score={f.get('confidence_score')} {f.get('error') or ''}")
+    print(json.dumps(report["summary"], indent=2))
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as out:
+            json.dump(report, out, indent=2, ensure_ascii=False)
+        print(f"📝 Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import re
+from typing import Dict, Optional, Pattern, Sequence, Tuple
+
+
+def _compile(patterns: Sequence[str], flags: int = re.IGNORECASE) -> Tuple[Pattern, ...]:
+    return tuple(re.compile(p, flags) for p in patterns)
+
+
+class FactureFieldExtractor:
+    """
+    Structured invoice fields from raw OCR text.
+
+    Every pattern is compiled once here at class level, and the text is
+    lowercased and split into lines once per document, then each field is
+    filled in turn. Patterns are tried in priority order (first pattern that
+    matches anywhere wins), exactly like the former _extract_* methods of
+    FactureOCREasyOCR: benchmarks/parser_golden.json pins those outputs.
+    """
+
+    INVOICE_NUMBER_PATTERNS = _compile([
+        r'(?:FACTURE|INVOICE|N°|NO|#|NUM)\s*[:.]?\s*([A-Z0-9-]+)',
+        r'(?:F|INV)[-/]?(\d{4,})',
+        r'N°\s*([A-Z0-9-]{3,})',
+    ])
+    DATE_PATTERNS = _compile([
+        r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
+        r'(\d{1,2}\s+(?:Jan|Fév|Fev|Mar|Avr|Mai|Juin|Juil|Août|Aout|Sep|Oct|Nov|Déc|Dec)[a-z]*\s+\d{4})',
+        r'(?:Date|DATE)\s*[:.]?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
+    ])
+    MATRICULE_PATTERNS = _compile([
+        r'(?:MF|TVA|SIRET|SIREN|RC|Matricule|N° TVA|Numéro TVA|Matricule fiscal)\s*[:.]?\s*(\d{7}[A-Z]{3}\d{3})',
+        r'(\d{7}[A-Z]{3}\d{3})',
+    ])
+    PO_NUMBER_PATTERNS = _compile([
+        r'(?:PO|Purchase Order|Bon de commande|BC)\s*[:.]?\s*([A-Z0-9-]+)',
+        r'PO[-\s]?([A-Z0-9]+)',
+    ])
+    AMOUNT_PATTERNS = {
+        "HT": _compile([
+            r'(?:Montant HT|Sous[-\s]?total|HT|Hors Taxes)\s*[:.]?\s*([\d\s,\.]+)',
+            r'HT\s*[:.]?\s*([\d\s,\.]+)',
+        ]),
+        "TVA": _compile([
+            r'(?:TVA|Tax|Taxes)\s*[:.]?\s*([\d\s,\.]+)',
+            r'TVA\s*\(?\d+%?\)?\s*[:.]?\s*([\d\s,\.]+)',
+        ]),
+        "TTC": _compile([
+            r'(?:Total TTC|Total|TOTAL|Montant Total)\s*[:.]?\s*([\d\s,\.]+)',
+            r'TTC\s*[:.]?\s*([\d\s,\.]+)',
+        ]),
+    }
+    AMOUNT_CLEANUP = re.compile(r'[^\d.]')
+    QUANTITE_PATTERNS = _compile([
+        r'(?:Quantité|Qté|QTE|Quantity|Qty)\s*[:.]?\s*(\d+)',
+        r'(\d+)\s+(?:pcs|pièces|piéces|unités|unites|units)',
+        r'Qté\s*[:.]?\s*(\d+)',
+    ])
+    SPECIFICATION_PATTERNS = _compile([
+        r'(?:Description|Spécifications|Specifications|Details|Détails)\s*[:.]?\s*(.{20,200})',
+        r'(?:Caractéristiques|Features|Reference|Référence)\s*[:.]?\s*(.{20,200})',
+    ], re.IGNORECASE | re.DOTALL)
+    WHITESPACE_RUN = re.compile(r'\s+')
+
+    # Supplier: scored candidate lines of the document header
+    SUPPLIER_HEADER_LINES = 20
+    SUPPLIER_ONLY_DIGITS = re.compile(r'^[\d\W_]+$')
+    # Lines that cannot be the supplier: invoice title, address, amounts (one scan per line)
+    SUPPLIER_REJECT = re.compile(
+        r'\b(?:Facture|Invoice|Reçu|Receipt|Bill)\b'
+        r'|\b(?:Rue|Av\.|Avenue|Boulevard|Boulv|BP|P\.O\. Box|Po Box|Address|Adresse)\b'
+        r'|[€\$\£]|(?<!\d)\d{1,3}(?:[.,]\d{3})*[.,]\d{2}',
+        re.I
+    )
+    # Whitespace-separated words containing at least one letter
+    SUPPLIER_ALPHA_WORD = re.compile(r'\S*[A-Za-zÀ-ÖØ-öø-ÿ]\S*')
+    SUPPLIER_COMPANY = re.compile(
+        r'\b(SARL|S\.A\.R\.L|S A R L|SAS|SASU|SA|Ltd|LLC|GmbH|Inc|Entreprise|Soci[eé]t[eé]|Company|Corporation)\b', re.I
+    )
+    SUPPLIER_CUSTOMER = re.compile(r'\b(Client|Destinataire|Bill To|Billed To)\b', re.I)
+    SUPPLIER_IDS = re.compile(r'\b(SIRET|SIREN|TVA|RC|Matricule|N[oº]+)\b[:\s]*\S*', re.I)
+    SUPPLIER_SYMBOLS = re.compile(r'[^\w\s\-\.,&()\/]')
+
+    # Keyword tables, checked in order (currencies against the original case)
+    CURRENCIES = (
+        ('TND', ('TND', 'DT', 'Dinar')),
+        ('EUR', ('EUR', '€', 'Euro')),
+        ('USD', ('USD', '$', 'Dollar')),
+    )
+    PURCHASE_TYPES = (
+        ('Article', ('article', 'produit', 'matériel', 'matériau', 'équipement', 'fourniture')),
+        ('Service', ('service', 'prestation', 'consultation', 'maintenance')),
+        ('CAPEX', ('capex', 'investissement', 'immobilisation', 'capital')),
+        ('Contrat', ('contrat', 'abonnement', 'subscription')),
+    )
+    UNITS = ('pcs', 'pièce', 'pièces', 'piéces', 'kg', 'litre', 'mètre', 'metre', 'heure', 'jour', 'unit', 'unité')
+    PIECE_UNITS = frozenset(('pcs', 'pièce', 'pièces', 'piéces', 'unit', 'unité'))
+
+    DEFAULTS = {
+        "numero_facture": None,
+        "date_facture": None,
+        "fournisseur_nom": None,
+        "fournisseur_matricule": None,
+        "numero_po": None,
+        "montant_ht": None,
+        "montant_tva": None,
+        "montant_ttc": None,
+        "devise": "TND",
+        "type_achat": "Article",
+        "quantite": None,
+        "unite": "pcs",
+        "specifications_techniques": None,
+    }
+
+    def extract(self, text: Optional[str]) -> Dict:
+        """All invoice fields of one OCR text, in parse_ocr_result order"""
+        if not isinstance(text, str) or not text.strip():
+            return dict(self.DEFAULTS)
+
+        lowered = text.lower()
+        lines = [ln.strip() for ln in text.splitlines()]
+        return {
+            "numero_facture": self._first_group(self.INVOICE_NUMBER_PATTERNS, text),
+            "date_facture": self._first_group(self.DATE_PATTERNS, text),
+            "fournisseur_nom": self._supplier(lines),
+            "fournisseur_matricule": self._matricule(text),
+            "numero_po": self._first_group(self.PO_NUMBER_PATTERNS, text),
+            "montant_ht": self._amount(text, "HT"),
+            "montant_tva": self._amount(text, "TVA"),
+            "montant_ttc": self._amount(text, "TTC"),
+            "devise": self._devise(text),
+            "type_achat": self._type_achat(lowered),
+            "quantite": self._quantite(text),
+            "unite": self._unite(lowered),
+            "specifications_techniques": self._specifications(text),
+        }
+
+    @staticmethod
+    def _first_group(patterns: Tuple[Pattern, ...], text: str) -> Optional[str]:
+        for pattern in patterns:
+            match = pattern.search(text)
+            if match:
+                return match.group(1).strip()
+        return None
+
+    def _matricule(self, text: str) -> Optional[str]:
+        # The bare ID pattern matches whenever the labelled one does: use it as a cheap gate
+        if not self.MATRICULE_PATTERNS[-1].search(text):
+            return None
+        return self._first_group(self.MATRICULE_PATTERNS, text)
+
+    def _amount(self, text: str, amount_type: str) -> Optional[float]:
+        for pattern in self.AMOUNT_PATTERNS[amount_type]:
+            match = pattern.search(text)
+            if match:
+                amount_str = match.group(1).replace(' ', '').replace(',', '.')
+                try:
+                    return float(self.AMOUNT_CLEANUP.sub('', amount_str))
+                except ValueError:
+                    continue
+        return None
+
+    def _quantite(self, text: str) -> Optional[int]:
+        for pattern in self.QUANTITE_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                try:
+                    return int(match.group(1))
+                except ValueError:
+                    continue
+        return None
+
+    def _specifications(self, text: str) -> Optional[str]:
+        for pattern in self.SPECIFICATION_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                return self.WHITESPACE_RUN.sub(' ', match.group(1).strip())[:200]
+        return None
+
+    def _devise(self, text: str) -> str:
+        for code, symbols in self.CURRENCIES:
+            for symbol in symbols:
+                if symbol in text:
+                    return code
+        return "TND"
+
+    def _type_achat(self, lowered: str) -> str:
+        for type_name, keywords in self.PURCHASE_TYPES:
+            if any(keyword in lowered for keyword in keywords):
+                return type_name
+        return "Article"
+
+    def _unite(self, lowered: str) -> str:
+        for unit in self.UNITS:
+            if unit in lowered:
+                return "pcs" if unit in self.PIECE_UNITS else unit
+        return "pcs"
+
+    def _supplier(self, lines: list) -> Optional[str]:
+        """Best-scoring company-looking line of the header"""
+        candidates = []
+        for idx, ln in enumerate(lines[:self.SUPPLIER_HEADER_LINES]):
+            if not ln:
+                continue
+            norm = ' '.join(ln.split())
+
+            if len(norm) < 3 or len(norm) > 120:
+                continue
+            if self.SUPPLIER_ONLY_DIGITS.match(norm) or self.SUPPLIER_REJECT.search(norm):
+                continue
+
+            score = min(len(self.SUPPLIER_ALPHA_WORD.findall(norm)), 5)
+            words = norm.split()
+
+            if self.SUPPLIER_COMPANY.search(norm):
+                score += 10
+
+            score += sum(1 for w in words if w.isupper() and len(w) > 1) * 2
+
+            if self.SUPPLIER_CUSTOMER.search(norm):
+                score -= 5
+
+            candidates.append((score, idx, norm))
+
+        if not candidates:
+            return None
+
+        best_score, _, best_line = max(candidates, key=lambda c: (c[0], -c[1]))
+        if best_score < 2:
+            return None
+
+        cleaned = self.SUPPLIER_IDS.sub('', best_line)
+        cleaned = ' '.join(self.SUPPLIER_SYMBOLS.sub('', cleaned).split())
+        return cleaned or None
@@ -0,0 +1,576 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional
+from uuid import uuid4
+
+import fitz  # PyMuPDF, used in the worker processes only (not thread-safe)
+
+from ocr_cache import get_ocr_cache, hash_file
+from ocr_artifacts import load_stored_raw, store_raw
+from perceptual_hash import (
+    PHASH_ENABLED, PHASH_REUSE_MAX_DISTANCE, PHASH_REUSE_OCR, compute_phash, find_near_duplicates,
+    has_text_layer
+)
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration
+OCR_POOL_SIZE = int(os.getenv("OCR_POOL_SIZE", "2"))        # worker processes, each with a warm EasyOCR reader
+OCR_QUEUE_DEPTH = int(os.getenv("OCR_QUEUE_DEPTH", "20"))   # jobs allowed to wait behind the running ones
+OCR_PAGE_WINDOW = int(os.getenv("OCR_PAGE_WINDOW", str(OCR_POOL_SIZE)))  # PDF pages in flight per job
+# forkserver: the models are loaded once (ocr_model_preload) and the workers forked from
+# that process share them; spawn: every worker loads its own copy
+OCR_WORKER_START = os.getenv("OCR_WORKER_START", "forkserver")
+JOB_RESULT_TTL = int(os.getenv("OCR_JOB_RESULT_TTL", "3600"))  # seconds a finished job stays pollable
+
+# Job stages in order, with the progress (%) reached when each one starts.
+# "ocr" covers rasterization + OCR of every page (one worker task per page) and
+# moves from 10 to 85 with pages_done / pages_total.
+JOB_STAGES = {
+    "queued": 0,
+    "lookup": 5,       # file hash, near-duplicates, OCR cache / stored artifacts
+    "ocr": 10,
+    "parse": 85,
+    "validate": 90,
+    "save": 95,        # on_complete: database insert, notifications
+    "done": 100,
+    "failed": 100,
+}
+UPLOAD_DIR = os.getenv(
+    "FACTURE_UPLOAD_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
+)
+
+
+class JobQueueFull(Exception):
+    """Raised when the OCR queue is full and the upload must be retried later"""
+
+
+# ==================== WORKER PROCESS SIDE ====================
+
+_open_pdf = {"path": None, "document": None}
+
+
+def process_memory(pid="self") -> Dict:
+    """RSS, PSS and USS (private pages: what the process really adds) in MB, from /proc (Linux)"""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        return {"rss_mb": None, "pss_mb": None, "uss_mb": None}
+    uss = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "uss_mb": round(uss / 1024, 1)
+    }
+
+
+def _process_age() -> Optional[float]:
+    """Seconds since this process was created (fork / spawn), from /proc (Linux)"""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return round(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 3)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _init_worker(startup_reports=None):
+    """
+    Load the EasyOCR models once when the worker process starts (already there
+    when preloaded by the forkserver), then report the startup time and memory
+    """
+    from facture_ocr import get_ocr_engine, get_ocr_engine_stats
+
+    preloaded = get_ocr_engine_stats(('fr', 'en'))["status"] == "ready"
+    start = time.perf_counter()
+    get_ocr_engine(('fr', 'en'))
+    if startup_reports is not None:
+        startup_reports.put({
+            "pid": os.getpid(),
+            "preloaded": preloaded,
+            "engine_seconds": round(time.perf_counter() - start, 3),
+            "startup_seconds": _process_age(),
+            "startup_memory": process_memory()
+        })
+
+
+def _ping_worker() -> int:
+    """No-op task used to spawn (and so warm) every worker at startup"""
+    return os.getpid()
+
+
+def _worker_pdf(file_path: str):
+    """The PDF open in this worker: consecutive tasks of a document usually land on the same worker"""
+    if _open_pdf["path"] != file_path:
+        if _open_pdf["document"] is not None:
+            _open_pdf["document"].close()
+        _open_pdf["document"] = fitz.open(file_path)
+        _open_pdf["path"] = file_path
+    return _open_pdf["document"]
+
+
+def _pdf_page_count(file_path: str) -> int:
+    """Page count of a PDF (runs in a worker process: PyMuPDF is never used from the API's threads)"""
+    return len(_worker_pdf(file_path))
+
+
+def _ocr_pdf_page(file_path: str, page_index: int) -> list:
+    """Text blocks of one PDF page (runs in a worker process)"""
+    from facture_ocr import get_ocr_engine
+
+    page = _worker_pdf(file_path)[page_index]
+    return get_ocr_engine(('fr', 'en')).ocr_pdf_page(page, page_index)
+
+
+def _page1_probe(file_path: str, text_layer: bool) -> Dict:
+    """
+    Perceptual hash of page 1 and, if asked, whether the PDF has a text layer
+    (runs in a worker process: PyMuPDF is not thread-safe, the API's runner threads never use it)
+    """
+    return {
+        "phash": compute_phash(file_path),
+        "text_layer": has_text_layer(file_path) if text_layer else None
+    }
+
+
+def _ocr_image_file(file_path: str) -> Dict:
+    """Raw OCR result of an image file (runs in a worker process)"""
+    from facture_ocr import get_ocr_engine
+
+    return get_ocr_engine(('fr', 'en')).ocr_image(file_path)
+
+
+def _verify_reuse(file_path: str, raw: Dict) -> Dict:
+    """Re-read of a near-duplicate's key fields on this file (runs in a worker process)"""
+    from facture_ocr import get_ocr_engine
+
+    return get_ocr_engine(('fr', 'en')).verify_reuse(file_path, raw)
+
+
+def _parse(raw: Dict, file_hash: str, cache_status: str) -> Dict:
+    """Field parsing of the raw OCR (runs in a worker process)"""
+    from facture_ocr import get_ocr_engine
+
+    return get_ocr_engine(('fr', 'en')).parse_raw(raw, file_hash, cache_status)
+
+
+def _validate(ocr_result: Dict, po_id: Optional[str], po: Optional[Dict] = None) -> Dict:
+    """
+    Validation of the parsed fields against the PO (runs in a worker process).
+    po is the mapped PO already loaded by the API; without po_id the PO is
+    matched from the numero_po read on the invoice.
+    """
+    from facture_validator import FactureValidator
+    from db import get_po_collection, get_supplier_collection
+    from po_lookup import find_mapped_po
+
+    po_collection = get_po_collection()
+
+    if not po_id and ocr_result.get("success"):
+        po_id, po = find_mapped_po(po_collection, ocr_result.get("numero_po"))
+        if po_id:
+            logger.info(f"🔗 PO auto-matched from invoice: {po_id}")
+    if not po_id:
+        return {"ocr_result": ocr_result, "validation": None, "po_id": None, "po": None}
+
+    validator = FactureValidator(po_collection, get_supplier_collection())
+    validation = validator.validate_against_po(ocr_result, po_id, po)
+    return {"ocr_result": ocr_result, "validation": validation, "po_id": po_id, "po": po}
+
+
+# ==================== API PROCESS SIDE ====================
+
+class FactureJobManager:
+    """
+    Runs invoice OCR jobs and tracks their status for polling.
+
+    Each job is driven by a thread of a small runner pool: it checks the OCR
+    cache, fans the PDF pages out to the worker processes (at most
+    OCR_PAGE_WINDOW pages in flight, so memory stays flat whatever the page
+    count), merges the blocks in page order, then has a worker parse and
+    validate the result. The job's current stage (JOB_STAGES), page counts
+    and progress are exposed by get() for polling and the SSE endpoint.
+    """
+
+    def __init__(self, pool_size: int = OCR_POOL_SIZE, queue_depth: int = OCR_QUEUE_DEPTH,
+                 page_window: int = OCR_PAGE_WINDOW, start_method: str = OCR_WORKER_START):
+        self.pool_size = pool_size
+        self.queue_depth = queue_depth
+        self.page_window = max(1, page_window)
+        # Never "fork" the API process itself (threads, MongoDB client, event loop)
+        if start_method not in ("forkserver", "spawn") or \
+                start_method not in multiprocessing.get_all_start_methods():
+            logger.warning(f"⚠️ OCR worker start method '{start_method}' unavailable, using spawn")
+            start_method = "spawn"
+        self.start_method = start_method
+        self._workers: Dict[int, Dict] = {}
+        self._startup_reports = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._runner: Optional[ThreadPoolExecutor] = None
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._slot_free = threading.Condition(self._lock)
+
+    def start(self):
+        if self._pool is None:
+            os.makedirs(UPLOAD_DIR, exist_ok=True)
+            context = multiprocessing.get_context(self.start_method)
+            if self.start_method == "forkserver":
+                # The forkserver starts with a fresh sys.path (the parent's is ignored before
+                # Python 3.12): put backend/ on PYTHONPATH so it can import the preload module
+                backend_dir = os.path.dirname(os.path.abspath(__file__))
+                python_path = os.environ.get("PYTHONPATH", "").split(os.pathsep)
+                if backend_dir not in python_path:
+                    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [backend_dir, *python_path]))
+                context.set_forkserver_preload(["ocr_model_preload"])
+            self._startup_reports = context.SimpleQueue()
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.pool_size,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self._startup_reports,)
+            )
+            self._runner = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="ocr-job")
+            # Workers are spawned on demand: ping each one so models load before the first upload
+            for _ in range(self.pool_size):
+                self._pool.submit(_ping_worker).add_done_callback(lambda _: self._collect_startup_reports())
+            logger.info(
+                f"🏭 OCR pool started ({self.start_method}): {self.pool_size} worker(s), "
+                f"queue depth {self.queue_depth}, {self.page_window} page(s) in flight per job"
+            )
+
+    def _collect_startup_reports(self):
+        """Record (and log) the startup reports the workers' initializer sent since the last call"""
+        with self._lock:
+            reports = self._startup_reports
+            while reports is not None and not reports.empty():
+                info = reports.get()
+                self._workers[info["pid"]] = info
+                memory = info["startup_memory"]
+                logger.info(
+                    f"👷 OCR worker {info['pid']} ready in {info['startup_seconds']}s "
+                    f"(models {'preloaded' if info['preloaded'] else 'loaded'}), "
+                    f"USS {memory['uss_mb']} MB / RSS {memory['rss_mb']} MB"
+                )
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._runner.shutdown(wait=False, cancel_futures=True)
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._runner = None
+            self._workers.clear()
+            self._startup_reports = None
+            logger.info("🏭 OCR pool stopped")
+
+    def _in_flight(self) -> int:
+        return sum(1 for job in self._jobs.values() if job["status"] in ("queued", "running"))
+
+    def _purge_finished(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.get("finished_at") and now - job["finished_at"] > JOB_RESULT_TTL
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, file_path: str, po_id: Optional[str], context: Dict,
+               on_complete: Callable[[Dict, Dict], Dict], block: bool = False,
+               file_hash: Optional[str] = None,
+               on_failure: Optional[Callable[[Dict, Exception], None]] = None) -> str:
+        """
+        Queue an OCR job and return its ID.
+        on_complete(job, outcome) runs in the job's runner thread once OCR, parsing
+        and validation are done, and returns the final result stored on the job.
+        on_failure(job, error) runs instead when the pipeline itself raises (worker
+        crash, parsing or validation error), so the user is still told.
+        po_id may be None: the PO is then matched from the invoice's numero_po.
+        With block=True (batch ingestion) waits for a free slot instead of raising JobQueueFull.
+        file_hash: SHA-256 computed while the file was spooled (hashed here otherwise).
+        """
+        if self._pool is None:
+            self.start()
+
+        with self._lock:
+            self._purge_finished()
+            while block and self._in_flight() >= self.pool_size + self.queue_depth:
+                self._slot_free.wait()
+            if self._in_flight() >= self.pool_size + self.queue_depth:
+                raise JobQueueFull(
+                    f"OCR queue full ({self.pool_size} running + {self.queue_depth} queued)"
+                )
+            job_id = f"JOB-{uuid4().hex[:12].upper()}"
+            job = {
+                "job_id": job_id,
+                "status": "queued",
+                "po_id": po_id,
+                "file_path": file_path,
+                "file_hash": file_hash,
+                "context": context,
+                "pages_total": None,
+                "pages_done": 0,
+                "stage": "queued",
+                "stage_started_at": time.time(),
+                "stages": [],
+                "submitted_at": time.time(),
+                "finished_at": None,
+                "result": None,
+                "error": None
+            }
+            self._jobs[job_id] = job
+            self._runner.submit(self._process, job, on_complete, on_failure)
+
+        logger.info(f"📥 OCR job {job_id} queued ({file_path})")
+        return job_id
+
+    @staticmethod
+    def _set_stage(job: Dict, stage: str):
+        """Close the current stage (its duration goes to job["stages"]) and open the next one"""
+        now = time.time()
+        job["stages"].append({"stage": job["stage"], "seconds": round(now - job["stage_started_at"], 3)})
+        job["stage_started_at"] = now
+        job["stage"] = stage
+
+    @staticmethod
+    def _progress(job: Dict) -> int:
+        if job["stage"] == "ocr" and job["pages_total"]:
+            span = JOB_STAGES["parse"] - JOB_STAGES["ocr"]
+            return JOB_STAGES["ocr"] + span * job["pages_done"] // job["pages_total"]
+        return JOB_STAGES[job["stage"]]
+
+    def _process(self, job: Dict, on_complete, on_failure=None):
+        job["status"] = "running"
+        outcome = None
+        try:
+            outcome = self._run_pipeline(job)
+            self._set_stage(job, "save")
+            job["result"] = on_complete(job, outcome)
+            job["status"] = "done"
+        except Exception as e:
+            logger.error(f"❌ OCR job {job['job_id']} failed: {e}")
+            job["error"] = str(e)
+            job["status"] = "failed"
+            # on_complete reports its own errors; a pipeline error never reached it
+            if outcome is None and on_failure is not None:
+                try:
+                    on_failure(job, e)
+                except Exception as callback_error:
+                    logger.error(f"❌ OCR job {job['job_id']} failure callback failed: {callback_error}")
+        finally:
+            self._set_stage(job, job["status"])
+            job["finished_at"] = time.time()
+            with self._lock:
+                self._slot_free.notify_all()
+            logger.info(
+                f"📤 OCR job {job['job_id']} {job['status']} in "
+                f"{job['finished_at'] - job['submitted_at']:.1f}s"
+            )
+
+    def _near_duplicates(self, file_path: str):
+        """
+        (perceptual hash of page 1, stored invoices that look the same, PDF text layer
+        present when PHASH_REUSE_OCR); never fails the job
+        """
+        if not PHASH_ENABLED:
+            return None, [], None
+        try:
+            probe = self._pool.submit(_page1_probe, file_path, PHASH_REUSE_OCR).result()
+        except Exception as e:
+            logger.warning(f"⚠️ Perceptual hash skipped: {e}")
+            return None, [], None
+        phash, text_layer = probe["phash"], probe["text_layer"]
+        if phash is None:
+            return None, [], text_layer
+        try:
+            from db import get_facture_collection
+            near = find_near_duplicates(get_facture_collection(), phash)
+        except Exception as e:
+            logger.warning(f"⚠️ Near-duplicate lookup skipped: {e}")
+            return phash, [], text_layer
+        if near:
+            logger.warning(
+                f"♻️ {os.path.basename(file_path)} looks like "
+                + ", ".join(f"{m['facture_id']} ({m['distance']} bits)" for m in near)
+            )
+        return phash, near, text_layer
+
+    def _reusable_raw(self, file_path: str, near, text_layer: Optional[bool], cache) -> Optional[tuple]:
+        """
+        (raw OCR, facture_id) of the closest near-duplicate whose OCR is still
+        stored and whose key fields (number, dates, amounts) re-read the same on
+        this file: another invoice on the same template hashes just as close.
+        Never for a PDF with a text layer (its extraction is already cheap) or
+        when the text-layer probe did not run.
+        """
+        if text_layer is not False:
+            return None
+        for match in near:
+            if match["distance"] > PHASH_REUSE_MAX_DISTANCE or not match.get("file_hash"):
+                continue
+            raw = cache.get_raw(match["file_hash"]) if cache is not None else None
+            if raw is None:
+                raw = load_stored_raw(match["file_hash"], cache)
+            if raw is None:
+                continue
+            check = self._pool.submit(_verify_reuse, file_path, raw).result()
+            if check["compared"] and check["matched"] == check["compared"]:
+                logger.info(
+                    f"🔎 {check['matched']} key field(s) of {match['facture_id']} re-read identical "
+                    f"in {check['seconds']:.2f}s"
+                )
+                return raw, match["facture_id"]
+            logger.info(
+                f"🔎 OCR of {match['facture_id']} not reused: "
+                + (f"'{check['mismatch']['stored']}' read '{check['mismatch']['read']}'"
+                   if check["mismatch"] else "no key field to check")
+            )
+        return None
+
+    def _run_pipeline(self, job: Dict) -> Dict:
+        """Cache / artifact / near-duplicate lookup, OCR fan-out, then parsing + validation in a worker"""
+        file_path = job["file_path"]
+        phash, near, reused_from = None, [], None
+        self._set_stage(job, "lookup")
+        try:
+            file_hash = job["file_hash"] or hash_file(file_path)
+            phash, near, text_layer = self._near_duplicates(file_path)
+
+            cache = get_ocr_cache()
+            raw = cache.get_raw(file_hash) if cache is not None else None
+            if raw is None:
+                raw = load_stored_raw(file_hash, cache)
+            reusable = self._reusable_raw(file_path, near, text_layer, cache) \
+                if raw is None and near and PHASH_REUSE_OCR else None
+            if raw is not None:
+                cache_status = "hit"
+                job["pages_total"] = job["pages_done"] = raw.get("pages", 1)
+            elif reusable is not None:
+                # Same page and key fields as an invoice already read: its OCR stands in (not stored under this hash)
+                raw, reused_from = reusable
+                cache_status = "near_duplicate"
+                job["pages_total"] = job["pages_done"] = raw.get("pages", 1)
+                logger.info(f"⚡ OCR reused from near-duplicate {reused_from} - EasyOCR skipped")
+            else:
+                cache_status = "miss"
+                self._set_stage(job, "ocr")
+                with open(file_path, "rb") as f:
+                    is_pdf = f.read(4) == b"%PDF"
+                if is_pdf:
+                    raw = self._ocr_pdf(job)
+                else:
+                    job["pages_total"] = 1
+                    raw = self._pool.submit(_ocr_image_file, file_path).result()
+                    job["pages_done"] = 1
+                store_raw(file_hash, raw, cache)
+        except Exception as e:
+            logger.error(f"❌ OCR extraction failed: {e}")
+            return {
+                "ocr_result": {"success": False, "error": str(e), "raw_text": "", "confidence": 0.0},
+                "validation": None,
+                "po_id": job["po_id"],
+                "phash": phash,
+                "near_duplicates": near
+            }
+
+        self._set_stage(job, "parse")
+        ocr_result = self._pool.submit(_parse, raw, file_hash, cache_status).result()
+        self._set_stage(job, "validate")
+        outcome = self._pool.submit(_validate, ocr_result, job["po_id"], job["context"].get("po")).result()
+        return {**outcome, "phash": phash, "near_duplicates": near, "ocr_reused_from": reused_from}
+
+    def _ocr_pdf(self, job: Dict) -> Dict:
+        """OCR every page on the worker pool, bounded window, merged in page order"""
+        page_count = self._pool.submit(_pdf_page_count, job["file_path"]).result()
+        job["pages_total"] = page_count
+
+        page_blocks = [None] * page_count
+        pending = {}
+        next_page = 0
+        while next_page < page_count or pending:
+            while next_page < page_count and len(pending) < self.page_window:
+                future = self._pool.submit(_ocr_pdf_page, job["file_path"], next_page)
+                pending[future] = next_page
+                next_page += 1
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                page_blocks[pending.pop(future)] = future.result()
+                job["pages_done"] += 1
+
+        blocks = [block for page in page_blocks for block in page]
+        text_layer_pages = len({b["page"] for b in blocks if b.get("source") == "text_layer"})
+        logger.info(
+            f"✅ PDF extraction completed - {page_count} pages "
+            f"({text_layer_pages} from text layer), {len(blocks)} text blocks"
+        )
+        return {"pages": page_count, "text_layer_pages": text_layer_pages, "blocks": blocks}
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Public view of a job (status, progress, timings, result or error)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            end = job["finished_at"] or time.time()
+            return {
+                "job_id": job["job_id"],
+                "status": job["status"],
+                "po_id": job["po_id"],
+                "facture_id": job["context"].get("facture_id"),
+                "filename": job["context"].get("filename"),
+                "pages_total": job["pages_total"],
+                "pages_done": job["pages_done"],
+                "stage": job["stage"],
+                "progress": self._progress(job),
+                "stages": list(job["stages"]),
+                "elapsed_seconds": round(end - job["submitted_at"], 2),
+                "result": job["result"],
+                "error": job["error"]
+            }
+
+    def workers(self) -> list:
+        """Startup info of each worker and its current memory (USS: pages no other process shares)"""
+        self._collect_startup_reports()
+        pool = self._pool
+        pids = list(getattr(pool, "_processes", None) or {}) if pool is not None else []
+        with self._lock:
+            startup = {pid: self._workers.get(pid, {}) for pid in pids}
+        return [
+            {
+                "pid": pid,
+                "preloaded": info.get("preloaded"),
+                "startup_seconds": info.get("startup_seconds"),
+                "engine_seconds": info.get("engine_seconds"),
+                **process_memory(pid)
+            }
+            for pid, info in startup.items()
+        ]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = {
+                "pool_size": self.pool_size,
+                "queue_depth": self.queue_depth,
+                "page_window": self.page_window,
+                "start_method": self.start_method,
+                "in_flight": self._in_flight(),
+                "started": self._pool is not None
+            }
+        stats["workers"] = self.workers()
+        return stats
+
+
+job_manager = FactureJobManager()
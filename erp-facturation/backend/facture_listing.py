@@ -0,0 +1,112 @@
+"""
+Invoice listing helpers: filters, projection, keyset pagination
+
+Pages are ordered on (date_reception, facture_id), both in the requested
+direction, and continue from an opaque cursor holding the last key seen, so
+page N costs the same as page 1 (no skip). The compound indexes declared in
+db.INDEXES serve the unfiltered and status-filtered orders.
+"""
+import base64
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+LIST_DEFAULT_LIMIT = 50
+LIST_MAX_LIMIT = 500
+LIST_STREAM_BATCH = 500  # documents fetched per cursor batch in NDJSON mode
+
+# Heavy fields left out of listings unless asked for with fields=
+LIST_DEFAULT_EXCLUDE = {
+    "_id": 0,
+    "ocr_data.raw_text": 0,
+    "ocr_data.phash_bands": 0,
+    "history": 0,
+    "validation_result.mismatches": 0,
+}
+# Always returned: the pagination key
+LIST_KEY_FIELDS = ("date_reception", "facture_id")
+LIST_MAX_FIELDS = 40
+
+_FIELD_NAME = re.compile(r"^[A-Za-z][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$")
+
+
+class ListingError(ValueError):
+    """Invalid listing parameter (reported as HTTP 400)"""
+
+
+def encode_cursor(doc: Dict) -> str:
+    key = [doc.get(field) for field in LIST_KEY_FIELDS]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date_reception, facture_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ListingError("Invalid cursor")
+    return date_reception, facture_id
+
+
+def build_projection(fields: Optional[str]) -> Dict:
+    """fields='a,b.c' -> inclusion projection (+ pagination key); None -> default exclusions"""
+    if not fields:
+        return dict(LIST_DEFAULT_EXCLUDE)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    if len(names) > LIST_MAX_FIELDS:
+        raise ListingError(f"Too many fields (max {LIST_MAX_FIELDS})")
+    invalid = [name for name in names if not _FIELD_NAME.match(name)]
+    if invalid:
+        raise ListingError(f"Invalid field name(s): {', '.join(invalid)}")
+    projection = {"_id": 0}
+    for name in (*LIST_KEY_FIELDS, *names):
+        projection[name] = 1
+    return projection
+
+
+def build_query(status: Optional[str] = None, po_id: Optional[str] = None,
+                search: Optional[str] = None, cursor: Optional[str] = None,
+                descending: bool = True) -> Dict:
+    filters: List[Dict] = []
+    if status:
+        filters.append({"status": status})
+    if po_id:
+        filters.append({"linked_po_id": po_id})
+    if search:
+        filters.append({"facture_id": {"$regex": re.escape(search), "$options": "i"}})
+    if cursor:
+        date_reception, facture_id = decode_cursor(cursor)
+        op = "$lt" if descending else "$gt"
+        filters.append({"$or": [
+            {"date_reception": {op: date_reception}},
+            {"date_reception": date_reception, "facture_id": {op: facture_id}}
+        ]})
+    if not filters:
+        return {}
+    return filters[0] if len(filters) == 1 else {"$and": filters}
+
+
+def sort_spec(descending: bool = True) -> List[Tuple[str, int]]:
+    direction = -1 if descending else 1
+    return [(field, direction) for field in LIST_KEY_FIELDS]
+
+
+def fetch_page(facture_collection, query: Dict, projection: Dict, descending: bool, limit: int,
+               count_query: Optional[Dict] = None) -> Dict:
+    """
+    One page + the cursor of the next one (None on the last page).
+    total: invoices matching the filters over all pages (count_query: the filters
+    without the cursor), as the unpaginated listing returned; count: rows in this page.
+    """
+    docs = list(
+        facture_collection.find(query, projection).sort(sort_spec(descending)).limit(limit + 1)
+    )
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    return {
+        "total": facture_collection.count_documents(query if count_query is None else count_query),
+        "count": len(docs),
+        "factures": docs,
+        "has_more": has_more,
+        "next_cursor": encode_cursor(docs[-1]) if has_more else None
+    }
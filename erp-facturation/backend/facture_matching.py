@@ -0,0 +1,281 @@
+"""
+Three-way match: invoice lines vs. PO lines vs. received quantities (GRN)
+
+Data read (bulk, projected):
+- factures (open statuses): `lignes` = [{ligne_po, quantite, prix_unitaire}].
+  Invoices read by OCR only carry header fields, so an invoice without lines
+  counts as one line on PO line 1 (quantite, montant_ht / quantite).
+- bons_commande: `lignes` = [{ligne_id? | numero_ligne?, quantite, prix_unitaire? | montant_ht?}],
+  line number = ligne_id, numero_ligne or 1-based position.
+- grns, as written by erp-GRN: {po_id, lines: [{po_line_id, received_qty}]},
+  po_id = str(bons_commande._id), po_line_id = str(numero_ligne); summed per
+  PO line server-side, then mapped back to purchase_order_id / line number.
+
+Variances are computed column-wise with pandas/NumPy over every line at once,
+then the per-invoice result is written back with unordered bulk_write batches.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pymongo import UpdateOne
+
+from db import FACTURE_COLLECTION, GRN_COLLECTION, PO_COLLECTION, get_database
+from facture_validator import FactureValidator
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = ["En analyse", "Validée", "En attente correction"]
+MATCH_WRITE_BATCH = int(os.getenv("MATCH_WRITE_BATCH", "1000"))
+MATCH_ID_CHUNK = 5000  # PO ids per $in query
+
+# Line statuses, most severe first: an invoice takes the worst status of its lines
+LINE_STATUSES = ["po_line_missing", "not_received", "over_received", "price_mismatch", "quantity_mismatch", "matched"]
+
+INVOICE_COLUMNS = ["facture_id", "po_id", "ligne_po", "qty_invoiced", "price_invoiced"]
+PO_COLUMNS = ["po_id", "ligne_po", "qty_ordered", "price_ordered"]
+GRN_COLUMNS = ["po_id", "ligne_po", "qty_received"]
+
+
+def _unit_price(line: Dict) -> Optional[float]:
+    price = line.get("prix_unitaire")
+    if price is None and line.get("montant_ht") is not None and line.get("quantite"):
+        price = line["montant_ht"] / line["quantite"]
+    return price
+
+
+def _line_number(value):
+    """GRN po_line_id is a string ("1"): back to the int used by invoice and PO lines"""
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return value
+
+
+# ==================== BULK LOADING ====================
+
+def load_invoice_lines(facture_collection, statuses: List[str] = OPEN_STATUSES) -> pd.DataFrame:
+    cursor = facture_collection.find(
+        {"status": {"$in": statuses}, "linked_po_id": {"$nin": [None, ""]}},
+        {"_id": 0, "facture_id": 1, "linked_po_id": 1, "quantite": 1, "montant_ht": 1, "lignes": 1}
+    )
+    rows = []
+    for facture in cursor:
+        lines = facture.get("lignes") or [{
+            "ligne_po": 1,
+            "quantite": facture.get("quantite"),
+            "montant_ht": facture.get("montant_ht")
+        }]
+        for position, line in enumerate(lines, start=1):
+            rows.append((
+                facture["facture_id"], facture["linked_po_id"], line.get("ligne_po") or position,
+                line.get("quantite"), _unit_price(line)
+            ))
+    return pd.DataFrame.from_records(rows, columns=INVOICE_COLUMNS)
+
+
+def load_po_lines(po_collection, po_ids: List[str]) -> Tuple[pd.DataFrame, Dict[str, str]]:
+    """PO lines, and {str(_id): purchase_order_id}: erp-GRN refers to POs by their _id"""
+    rows = []
+    object_ids = {}
+    for start in range(0, len(po_ids), MATCH_ID_CHUNK):
+        cursor = po_collection.find(
+            {"purchase_order_id": {"$in": po_ids[start:start + MATCH_ID_CHUNK]}},
+            {"_id": 1, "purchase_order_id": 1, "lignes": 1}
+        )
+        for po in cursor:
+            object_ids[str(po["_id"])] = po["purchase_order_id"]
+            for position, line in enumerate(po.get("lignes") or [], start=1):
+                rows.append((
+                    po["purchase_order_id"], line.get("ligne_id") or line.get("numero_ligne") or position,
+                    line.get("quantite"), _unit_price(line)
+                ))
+    return pd.DataFrame.from_records(rows, columns=PO_COLUMNS), object_ids
+
+
+def load_received_quantities(grn_collection, po_object_ids: Dict[str, str]) -> pd.DataFrame:
+    """Received quantity per (purchase_order_id, line number), from the {str(_id): purchase_order_id} map"""
+    rows = []
+    keys = list(po_object_ids)
+    for start in range(0, len(keys), MATCH_ID_CHUNK):
+        pipeline = [
+            {"$match": {"po_id": {"$in": keys[start:start + MATCH_ID_CHUNK]}}},
+            {"$unwind": "$lines"},
+            {"$group": {
+                "_id": {"po_id": "$po_id", "po_line_id": "$lines.po_line_id"},
+                "qty_received": {"$sum": "$lines.received_qty"}
+            }}
+        ]
+        for doc in grn_collection.aggregate(pipeline, allowDiskUse=True):
+            rows.append((
+                po_object_ids[doc["_id"]["po_id"]], _line_number(doc["_id"].get("po_line_id")),
+                doc["qty_received"]
+            ))
+    return pd.DataFrame.from_records(rows, columns=GRN_COLUMNS)
+
+
+# ==================== VECTORIZED MATCHING ====================
+
+def compute_line_matches(invoices: pd.DataFrame, po_lines: pd.DataFrame, received: pd.DataFrame,
+                         amount_percent: float = FactureValidator.TOLERANCE_AMOUNT_PERCENT,
+                         amount_absolute: float = FactureValidator.TOLERANCE_AMOUNT_ABSOLUTE,
+                         quantity_percent: float = FactureValidator.TOLERANCE_QUANTITY_PERCENT) -> pd.DataFrame:
+    """
+    One row per invoice line with price/quantity variances and a line status.
+    Quantity checks use the cumulative quantity invoiced on each PO line by all
+    open invoices, so two invoices for the same delivery are caught.
+    """
+    lines = invoices.merge(po_lines, on=["po_id", "ligne_po"], how="left")
+    lines = lines.merge(received, on=["po_id", "ligne_po"], how="left")
+
+    qty_invoiced = lines["qty_invoiced"].astype(float).fillna(0.0).to_numpy()
+    price_invoiced = lines["price_invoiced"].astype(float).to_numpy()
+    qty_ordered = lines["qty_ordered"].astype(float).to_numpy()
+    price_ordered = lines["price_ordered"].astype(float).to_numpy()
+    qty_received = lines["qty_received"].astype(float).fillna(0.0).to_numpy()
+
+    qty_cumulated = lines.groupby(["po_id", "ligne_po"], sort=False)["qty_invoiced"] \
+        .transform("sum").astype(float).fillna(0.0).to_numpy()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        price_variance = price_invoiced - price_ordered
+        price_variance_pct = np.where(price_ordered != 0, price_variance / price_ordered * 100, np.nan)
+        qty_variance_po = qty_cumulated - qty_ordered
+        qty_variance_po_pct = np.where(qty_ordered != 0, qty_variance_po / qty_ordered * 100, np.nan)
+        qty_variance_received = qty_cumulated - qty_received
+
+    price_ok = np.isnan(price_variance) | (np.abs(price_variance) <= amount_absolute) | \
+        (np.abs(price_variance_pct) <= amount_percent)
+    qty_po_ok = np.isnan(qty_variance_po_pct) | (np.abs(qty_variance_po_pct) <= quantity_percent)
+    received_tolerance = qty_received * quantity_percent / 100
+
+    lines["line_value"] = qty_invoiced * np.nan_to_num(price_invoiced)
+    lines["price_variance"] = price_variance
+    lines["price_variance_pct"] = price_variance_pct
+    lines["qty_cumulated"] = qty_cumulated
+    lines["qty_variance_po"] = qty_variance_po
+    lines["qty_variance_received"] = qty_variance_received
+    lines["status"] = np.select(
+        [
+            np.isnan(qty_ordered),
+            qty_received <= 0,
+            qty_variance_received > received_tolerance,
+            ~price_ok,
+            ~qty_po_ok,
+        ],
+        LINE_STATUSES[:-1],
+        default="matched"
+    )
+    lines["severity"] = lines["status"].map({status: rank for rank, status in enumerate(LINE_STATUSES)})
+    return lines
+
+
+def summarize_invoices(lines: pd.DataFrame) -> pd.DataFrame:
+    """Per-invoice result: worst line status, line counts, total price variance"""
+    lines = lines.assign(
+        is_matched=lines["status"] == "matched",
+        price_variance_value=lines["qty_invoiced"].astype(float).fillna(0.0) * lines["price_variance"].fillna(0.0)
+    )
+    summary = lines.groupby("facture_id", sort=False).agg(
+        po_id=("po_id", "first"),
+        lines=("status", "size"),
+        lines_matched=("is_matched", "sum"),
+        worst=("severity", "min"),
+        price_variance_total=("price_variance_value", "sum"),
+        invoiced_total=("line_value", "sum"),
+    ).reset_index()
+    summary["status"] = np.array(LINE_STATUSES, dtype=object)[summary["worst"].to_numpy()]
+    return summary.drop(columns="worst")
+
+
+# ==================== BULK WRITE-BACK ====================
+
+def build_updates(summary: pd.DataFrame, lines: pd.DataFrame, matched_at: str) -> List[UpdateOne]:
+    line_fields = ["ligne_po", "status", "qty_invoiced", "qty_ordered", "qty_received",
+                   "qty_cumulated", "price_invoiced", "price_ordered", "price_variance_pct"]
+    # Column lists of Python scalars, NaN -> None so BSON stores nulls; one zip over
+    # every line is far cheaper than converting each invoice's group separately
+    columns = [
+        [None if value != value else value for value in lines[field].tolist()]
+        for field in line_fields
+    ]
+    lines_by_invoice: Dict[str, List[Dict]] = {}
+    for facture_id, values in zip(lines["facture_id"].tolist(), zip(*columns)):
+        lines_by_invoice.setdefault(facture_id, []).append(dict(zip(line_fields, values)))
+
+    updates = []
+    for row in summary.itertuples(index=False):
+        updates.append(UpdateOne(
+            {"facture_id": row.facture_id},
+            {"$set": {"three_way_match": {
+                "status": row.status,
+                "lines": int(row.lines),
+                "lines_matched": int(row.lines_matched),
+                "price_variance_total": round(float(row.price_variance_total), 3),
+                "details": lines_by_invoice.get(row.facture_id, []),
+                "matched_at": matched_at
+            }}}
+        ))
+    return updates
+
+
+def write_results(facture_collection, updates: List[UpdateOne]) -> int:
+    modified = 0
+    for start in range(0, len(updates), MATCH_WRITE_BATCH):
+        result = facture_collection.bulk_write(updates[start:start + MATCH_WRITE_BATCH], ordered=False)
+        modified += result.modified_count
+    return modified
+
+
+def run_three_way_match(database, dry_run: bool = False) -> Dict:
+    """Load, match and write back every open invoice; returns counts and stage timings"""
+    timings = {}
+    start = time.perf_counter()
+    invoices = load_invoice_lines(database[FACTURE_COLLECTION])
+    po_ids = invoices["po_id"].unique().tolist()
+    po_lines, po_object_ids = load_po_lines(database[PO_COLLECTION], po_ids)
+    received = load_received_quantities(database[GRN_COLLECTION], po_object_ids)
+    timings["load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lines = compute_line_matches(invoices, po_lines, received)
+    summary = summarize_invoices(lines)
+    timings["match"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    updates = build_updates(summary, lines, datetime.now().isoformat())
+    modified = 0 if dry_run else write_results(database[FACTURE_COLLECTION], updates)
+    timings["write"] = time.perf_counter() - start
+
+    result = {
+        "invoices": len(summary),
+        "lines": len(lines),
+        "by_status": {status: int(count) for status, count in summary["status"].value_counts().items()},
+        "modified": modified,
+        "dry_run": dry_run,
+        "seconds": {stage: round(value, 3) for stage, value in timings.items()}
+    }
+    logger.info(
+        f"🧮 Three-way match: {result['invoices']} invoices / {result['lines']} lines - "
+        f"load {result['seconds']['load']}s, match {result['seconds']['match']}s, write {result['seconds']['write']}s"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Three-way match of open invoices vs PO lines vs GRNs")
+    parser.add_argument("--dry-run", action="store_true", help="Compute without writing results back")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    print(json.dumps(run_three_way_match(get_database(), dry_run=args.dry_run), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
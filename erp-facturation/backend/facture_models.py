@@ -74,4 +74,10 @@ class Facture(BaseModel):
 class FactureCreate(BaseModel):
     linked_po_id: str
     image_url: str
-    user_email: str
\ No newline at end of file
+    user_email: str
+
+class BulkTransitionRequest(BaseModel):
+    """Changement de statut en masse (approve ou mark_paid)"""
+    action: str
+    facture_ids: List[str]
+    user: str
@@ -1,137 +1,133 @@
 import easyocr
-import re
 import logging
-from typing import Dict, Optional
-from datetime import datetime
+from typing import Callable, Dict, Optional
 import numpy as np
 from PIL import Image
 import io
-import cv2
-import requests
 import os
 import json
 import re as _re_for_json
+import threading
+import time
+from concurrent.futures import Future
 import fitz  # PyMuPDF for PDF handling
+from ocr_cache import get_ocr_cache, hash_file, hash_file_bytes
+from ocr_artifacts import load_stored_raw, store_raw, summarize_raw
+from ocr_preprocess import PreprocessConfig, preprocess_image, map_points_back
+from ocr_refine import image_crop, pdf_crop, refine_blocks, verify_blocks
+from facture_fields import FactureFieldExtractor
+from llm_client import get_llm_client, resolved
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 class FactureOCREasyOCR:    
+    # Bump whenever parse_ocr_result or FactureFieldExtractor changes:
+    # cached OCR text is then re-parsed instead of served from the parsed cache
+    PARSER_VERSION = "1"
+
+    # PDF handling: rasterization DPI for scanned pages, and the minimum number of
+    # alphanumeric characters for a page's text layer to be used instead of OCR
+    PDF_OCR_DPI = int(os.getenv("PDF_OCR_DPI", "300"))
+    PDF_TEXT_MIN_CHARS = int(os.getenv("PDF_TEXT_MIN_CHARS", "20"))
+
+    # Stateless, patterns compiled once: shared by every engine of the process
+    field_extractor = FactureFieldExtractor()
+
     def __init__(self, languages=['fr', 'en']):
         try:
             logger.info("📄 Initializing EasyOCR reader...")
+            start = time.perf_counter()
             self.reader = easyocr.Reader(languages, gpu=False)
-            logger.info("✅ EasyOCR initialized successfully")
+            self.load_seconds = time.perf_counter() - start
+            logger.info(f"✅ EasyOCR initialized successfully in {self.load_seconds:.2f}s")
         except Exception as e:
             logger.error(f"❌ Failed to initialize EasyOCR: {e}")
             raise
+        # The reader is shared by every request of the process: serialize inference
+        self._lock = threading.Lock()
+        self.first_request_seconds = None
+        self.cache = get_ocr_cache()
+        self.preprocess_config = PreprocessConfig()
+
+    def _readtext(self, img_array) -> list:
+        """Run EasyOCR on one image, one inference at a time per reader"""
+        with self._lock:
+            return self.reader.readtext(img_array)
     
+    def _recognize_crop(self, gray) -> list:
+        """Recognition only (no text detection) on a crop holding a single text block"""
+        height, width = gray.shape[:2]
+        with self._lock:
+            return self.reader.recognize(gray, [[0, width, 0, height]], [], reformat=False)
+
     def _is_pdf(self, file_bytes: bytes) -> bool:
         """Check if file is a PDF by checking magic bytes"""
         return file_bytes[:4] == b'%PDF'
     
-    def _pdf_to_images(self, pdf_bytes: bytes) -> list:
-        """Convert PDF pages to PIL Images"""
-        try:
-            logger.info("📄 Converting PDF to images...")
-            
-            # Open PDF from bytes
-            pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
-            images = []
-            
-            # Convert each page to image
-            for page_num in range(len(pdf_document)):
-                page = pdf_document[page_num]
-                
-                # Render page to pixmap (image) at 300 DPI for better OCR
-                mat = fitz.Matrix(300/72, 300/72)  # 300 DPI
-                pix = page.get_pixmap(matrix=mat)
-                
-                # Convert pixmap to PIL Image
-                img_data = pix.tobytes("png")
-                img = Image.open(io.BytesIO(img_data))
-                
-                images.append(img)
-                logger.info(f"✅ Converted PDF page {page_num + 1}/{len(pdf_document)}")
-            
-            pdf_document.close()
-            logger.info(f"✅ PDF converted to {len(images)} image(s)")
-            return images
-            
-        except Exception as e:
-            logger.error(f"❌ PDF conversion failed: {e}")
-            raise Exception(f"Failed to convert PDF to images: {str(e)}")
-    
+    def _render_page(self, page, dpi: int = None) -> np.ndarray:
+        """Render one PDF page straight to an RGB numpy array (no PNG round trip)"""
+        dpi = dpi or self.PDF_OCR_DPI
+        mat = fitz.Matrix(dpi / 72, dpi / 72)
+        pix = page.get_pixmap(matrix=mat, colorspace=fitz.csRGB, alpha=False)
+        # Pixmap samples are already packed RGB rows: view them, then copy once
+        # so the array outlives the pixmap
+        return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n).copy()
+
+    def _page_text_blocks(self, page, page_index: int) -> list:
+        """
+        Text blocks from the PDF's own text layer, one per text line, in the same
+        format as OCR blocks (boxes in pixels at PDF_OCR_DPI, confidence 1.0).
+        Returns [] when the page has no usable text (scanned page).
+        """
+        words = page.get_text("words")
+        usable_chars = sum(1 for w in words for c in w[4] if c.isalnum())
+        if usable_chars < self.PDF_TEXT_MIN_CHARS:
+            return []
+
+        # Group words by (block, line), keeping the PDF reading order
+        lines = {}
+        for x0, y0, x1, y1, word, block_no, line_no, _ in words:
+            lines.setdefault((block_no, line_no), []).append((x0, y0, x1, y1, word))
+
+        scale = self.PDF_OCR_DPI / 72
+        blocks = []
+        for line_words in lines.values():
+            x0 = min(w[0] for w in line_words) * scale
+            y0 = min(w[1] for w in line_words) * scale
+            x1 = max(w[2] for w in line_words) * scale
+            y1 = max(w[3] for w in line_words) * scale
+            blocks.append({
+                "text": " ".join(w[4] for w in line_words),
+                "bbox": [[x0, y0], [x1, y0], [x1, y1], [x0, y1]],
+                "confidence": 1.0,
+                "page": page_index,
+                "source": "text_layer"
+            })
+        return blocks
+
     def extract_from_bytes(self, image_bytes: bytes) -> Dict:
         """Extract text from image or PDF bytes"""
+        return self._extract(lambda: hash_file_bytes(image_bytes), lambda: self._run_ocr(image_bytes), "bytes")
+
+    def _extract(self, compute_hash: Callable[[], str], run_ocr: Callable[[], Dict], source: str) -> Dict:
+        start = time.perf_counter()
         try:
-            logger.info("🔍 Starting OCR extraction from bytes...")
-            
-            # Check if it's a PDF
-            if self._is_pdf(image_bytes):
-                logger.info("📄 PDF file detected, converting to images...")
-                images = self._pdf_to_images(image_bytes)
-                
-                # Process all pages and combine results
-                all_text = []
-                all_confidences = []
-                
-                for idx, img in enumerate(images):
-                    logger.info(f"🔖 Processing page {idx + 1}/{len(images)}...")
-                    
-                    # Convert PIL Image to numpy array
-                    img_array = np.array(img)
-                    
-                    # Perform OCR on this page
-                    results = self.reader.readtext(img_array)
-                    
-                    for (bbox, text, confidence) in results:
-                        all_text.append(text)
-                        all_confidences.append(confidence)
-                
-                # Combine all text from all pages
-                raw_text = "\n".join(all_text)
-                avg_confidence = sum(all_confidences) / len(all_confidences) if all_confidences else 0.0
-                
-                logger.info(f"✅ PDF OCR completed - {len(images)} pages, {len(all_text)} text blocks")
-                
+            logger.info(f"🔍 Starting OCR extraction from {source}...")
+            file_hash = compute_hash()
+
+            raw = self.cache.get_raw(file_hash) if self.cache is not None else None
+            if raw is None:
+                raw = load_stored_raw(file_hash, self.cache)
+            if raw is not None:
+                cache_status = "hit"
             else:
-                # It's an image file
-                logger.info("🖼️ Image file detected...")
-                image = Image.open(io.BytesIO(image_bytes))
-                
-                # Convert to RGB if needed
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-                
-                # Convert PIL Image to numpy array
-                img_array = np.array(image)
-                
-                # Perform OCR
-                logger.info("📖 Running EasyOCR text detection...")
-                results = self.reader.readtext(img_array)
-                
-                # Extract all text with confidence scores
-                all_text = []
-                all_confidences = []
-                
-                for (bbox, text, confidence) in results:
-                    all_text.append(text)
-                    all_confidences.append(confidence)
-                
-                raw_text = "\n".join(all_text)
-                avg_confidence = sum(all_confidences) / len(all_confidences) if all_confidences else 0.0
-                
-                logger.info(f"✅ Image OCR completed - {len(results)} text blocks")
-            
-            logger.info(f"📊 Average confidence: {avg_confidence*100:.1f}%")
-            logger.info(f"📄 Extracted text length: {len(raw_text)} characters")
-            
-            # Parse the extracted text into structured data
-            invoice_data = self.parse_ocr_result(raw_text, avg_confidence)
-            
-            return invoice_data
+                raw = run_ocr()
+                store_raw(file_hash, raw, self.cache)
+                cache_status = "miss"
+
+            return self.parse_raw(raw, file_hash, cache_status)
             
         except Exception as e:
             logger.error(f"❌ OCR extraction failed: {e}")
@@ -141,6 +137,159 @@ class FactureOCREasyOCR:
                 "raw_text": "",
                 "confidence": 0.0
             }
+        finally:
+            if self.first_request_seconds is None:
+                self.first_request_seconds = time.perf_counter() - start
+                logger.info(f"⏱️ First OCR request served in {self.first_request_seconds:.2f}s")
+
+    def parse_raw(self, raw: Dict, file_hash: str, cache_status: str = "miss") -> Dict:
+        """
+        Structured invoice data from raw OCR blocks.
+        cache_status "hit" means the raw blocks came from the OCR cache: the parsed
+        fields are then served from cache too when the parser version matches.
+        """
+        if cache_status == "hit" and self.cache is not None:
+            cached = self.cache.get_parsed(file_hash, self.PARSER_VERSION)
+            if cached is not None:
+                logger.info(f"⚡ OCR cache hit ({file_hash[:12]}...) - OCR and parsing skipped")
+                cached["raw_text"] = self._summarize_raw(raw)[0]
+                cached["file_hash"] = file_hash
+                cached["cache"] = "hit"
+                return cached
+            logger.info(f"♻️ OCR cache hit for raw text ({file_hash[:12]}...) - re-parsing only")
+            cache_status = "reparsed"
+
+        raw_text, avg_confidence = self._summarize_raw(raw)
+        logger.info(f"📊 Average confidence: {avg_confidence*100:.1f}%")
+        logger.info(f"📄 Extracted text length: {len(raw_text)} characters")
+        
+        # Parse the extracted text into structured data
+        invoice_data = self.parse_ocr_result(raw_text, avg_confidence)
+
+        if self.cache is not None and invoice_data.get("success"):
+            self.cache.put_parsed(
+                file_hash, self.PARSER_VERSION,
+                {k: v for k, v in invoice_data.items() if k != "raw_text"}
+            )
+
+        invoice_data["file_hash"] = file_hash
+        invoice_data["cache"] = cache_status
+        return invoice_data
+
+    def _readtext_blocks(self, img_array, page: int, crop: Optional[Callable] = None) -> list:
+        """
+        Preprocess + EasyOCR, as JSON-serializable text blocks whose boxes are
+        in the coordinates of the image that was passed in.
+        Low-confidence key-field blocks then get a second, higher-scale pass
+        (ocr_refine); crop(bbox) supplies their image, a crop of img_array by default.
+        """
+        processed, transform = preprocess_image(img_array, self.preprocess_config)
+        blocks = [
+            {
+                "text": text,
+                "bbox": map_points_back(bbox, transform),
+                "confidence": float(confidence),
+                "page": page
+            }
+            for (bbox, text, confidence) in self._readtext(processed)
+        ]
+        refine_blocks(blocks, crop or (lambda bbox: image_crop(img_array, bbox)), self._recognize_crop)
+        return blocks
+
+    def ocr_pdf_page(self, page, page_index: int) -> list:
+        """Text blocks of one PDF page: text layer if present, else render + OCR"""
+        # Digitally generated invoices carry a text layer: no rasterization needed
+        blocks = self._page_text_blocks(page, page_index)
+        if blocks:
+            logger.info(f"⚡ Page {page_index + 1}: text layer used ({len(blocks)} lines)")
+            return blocks
+        logger.info(f"🔖 Page {page_index + 1}: no text layer, running OCR...")
+        # Second pass re-renders only the clips of the doubtful key fields, at a higher DPI
+        return self._readtext_blocks(
+            self._render_page(page), page_index,
+            crop=lambda bbox: pdf_crop(page, bbox, self.PDF_OCR_DPI)
+        )
+
+    def ocr_image(self, image) -> Dict:
+        """Run EasyOCR on an image (bytes or file path): raw text blocks with boxes and confidences"""
+        logger.info("🖼️ Image file detected...")
+        image = Image.open(io.BytesIO(image) if isinstance(image, (bytes, bytearray)) else image)
+        
+        # Convert to RGB if needed
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        # Perform OCR
+        logger.info("📖 Running EasyOCR text detection...")
+        blocks = self._readtext_blocks(np.array(image), 0)
+        
+        logger.info(f"✅ Image OCR completed - {len(blocks)} text blocks")
+        return {"pages": 1, "blocks": blocks}
+
+    def verify_reuse(self, file_path: str, raw: Dict) -> Dict:
+        """
+        Re-read the key fields of an earlier invoice's raw OCR at the same boxes
+        on this file (a few recognition-only crops instead of the full OCR).
+        Returns ocr_refine.verify_blocks counters; compared == 0 when nothing could be checked.
+        """
+        blocks = raw.get("blocks", [])
+        with open(file_path, "rb") as f:
+            is_pdf = self._is_pdf(f.read(4))
+        if not is_pdf:
+            if raw.get("pages", 1) != 1:
+                return {"compared": 0, "matched": 0, "mismatch": None, "seconds": 0.0}
+            with Image.open(file_path) as image:
+                img_array = np.array(image.convert('RGB'))
+            return verify_blocks(blocks, lambda block: image_crop(img_array, block["bbox"]), self._recognize_crop)
+
+        with fitz.open(file_path) as pdf_document:
+            if len(pdf_document) != raw.get("pages", 1):
+                return {"compared": 0, "matched": 0, "mismatch": None, "seconds": 0.0}
+            return verify_blocks(
+                blocks,
+                lambda block: pdf_crop(pdf_document[block.get("page", 0)], block["bbox"], self.PDF_OCR_DPI),
+                self._recognize_crop
+            )
+
+    def _run_ocr(self, image_bytes: bytes) -> Dict:
+        """Run EasyOCR on every page: raw text blocks with boxes and confidences"""
+        if not self._is_pdf(image_bytes):
+            return self.ocr_image(image_bytes)
+
+        logger.info("📄 PDF file detected...")
+        return self._ocr_pdf_document(fitz.open(stream=image_bytes, filetype="pdf"))
+
+    def _run_ocr_file(self, file_path: str) -> Dict:
+        """Same as _run_ocr, reading from disk: PyMuPDF opens the PDF by path (no bytes copy)"""
+        with open(file_path, "rb") as f:
+            is_pdf = self._is_pdf(f.read(4))
+        if not is_pdf:
+            return self.ocr_image(file_path)
+
+        logger.info("📄 PDF file detected...")
+        return self._ocr_pdf_document(fitz.open(file_path))
+
+    def _ocr_pdf_document(self, pdf_document) -> Dict:
+        # PDF pages are rendered lazily, one at a time, as the document is iterated
+        try:
+            page_count = len(pdf_document)
+            blocks = []
+            for idx, page in enumerate(pdf_document):
+                blocks.extend(self.ocr_pdf_page(page, idx))
+        except Exception as e:
+            logger.error(f"❌ PDF processing failed: {e}")
+            raise Exception(f"Failed to process PDF: {str(e)}")
+        finally:
+            pdf_document.close()
+
+        logger.info(f"✅ PDF extraction completed - {page_count} pages, {len(blocks)} text blocks")
+        text_layer_pages = len({b["page"] for b in blocks if b.get("source") == "text_layer"})
+        return {"pages": page_count, "text_layer_pages": text_layer_pages, "blocks": blocks}
+
+    @staticmethod
+    def _summarize_raw(raw: Dict) -> tuple:
+        """Raw OCR blocks -> (raw_text, average confidence)"""
+        return summarize_raw(raw)
 
     def parse_ocr_result(self, raw_text: str, confidence: float) -> Dict:
         # Parse OCR result into structured invoice data + OCR confidence score
@@ -154,23 +303,14 @@ class FactureOCREasyOCR:
         logger.info(f"🔍 Parsing extracted text into structured fields...")
         logger.info(f"📏 Text length: {len(raw_text)} characters")
         
+        # Start the LLM mapping first: it runs on the shared async client while the regexes parse
+        llm_future = self._call_llm_map_fields(raw_text)
+        
         # Parse structured fields from raw text
         try:
             invoice_data = {
                 "success": True,
-                "numero_facture": self._extract_invoice_number(raw_text),
-                "date_facture": self._extract_date(raw_text),
-                "fournisseur_nom": self._extract_supplier(raw_text),
-                "fournisseur_matricule": self._extract_matricule_fiscale(raw_text),
-                "numero_po": self._extract_po_number(raw_text),
-                "montant_ht": self._extract_amount(raw_text, "HT"),
-                "montant_tva": self._extract_amount(raw_text, "TVA"),
-                "montant_ttc": self._extract_amount(raw_text, "TTC"),
-                "devise": self._extract_devise(raw_text),
-                "type_achat": self._extract_type_achat(raw_text),
-                "quantite": self._extract_quantite(raw_text),
-                "unite": self._extract_unite(raw_text),
-                "specifications_techniques": self._extract_specifications(raw_text),
+                **self.field_extractor.extract(raw_text),
                 "raw_text": raw_text,
                 "confidence": confidence
             }
@@ -204,7 +344,7 @@ class FactureOCREasyOCR:
         
         # Attempt to get LLM-assisted mapping (non-blocking override)
         try:
-            llm_mapping = self._call_llm_map_fields(raw_text)
+            llm_mapping = get_llm_client().wait(llm_future)
             if llm_mapping:
                 merge_keys = [
                     "numero_facture", "date_facture", "fournisseur_nom", "fournisseur_matricule",
@@ -228,290 +368,20 @@ class FactureOCREasyOCR:
         return invoice_data
     
     def extract_from_file(self, file_path: str) -> Dict:
-        """Extract text from image or PDF file"""
-        try:
-            with open(file_path, 'rb') as f:
-                file_bytes = f.read()
-            return self.extract_from_bytes(file_bytes)
-        except Exception as e:
-            logger.error(f"❌ Failed to read file: {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "raw_text": "",
-                "confidence": 0.0
-            }
-    
-    def _extract_devise(self, text: str) -> str:
-        """Extract currency"""
-        if not text:
-            return "TND"
-        
-        # Look for currency codes or symbols
-        currencies = {
-            'TND': ['TND', 'DT', 'Dinar'],
-            'EUR': ['EUR', '€', 'Euro'],
-            'USD': ['USD', '$', 'Dollar'],
-        }
-        
-        for code, patterns in currencies.items():
-            for pattern in patterns:
-                if pattern in text:
-                    return code
-        
-        return "TND"  # Default
-    
-    def _extract_invoice_number(self, text: str) -> Optional[str]:
-        """Extract invoice number"""
-        if text is None or not isinstance(text, str) or not text.strip():
-            return None
-            
-        try:
-            patterns = [
-                r'(?:FACTURE|INVOICE|N°|NO|#|NUM)\s*[:.]?\s*([A-Z0-9-]+)',
-                r'(?:F|INV)[-/]?(\d{4,})',
-                r'N°\s*([A-Z0-9-]{3,})',
-            ]
-            for pattern in patterns:
-                match = re.search(pattern, text, re.IGNORECASE)
-                if match:
-                    return match.group(1).strip()
-        except Exception:
-            pass
-        return None
+        """Extract text from image or PDF file (hashed in chunks, PDF opened by path)"""
+        return self._extract(lambda: hash_file(file_path), lambda: self._run_ocr_file(file_path), "file")
     
-    def _extract_date(self, text: str) -> Optional[str]:
-        """Extract invoice date"""
-        if not text:
-            return None
-            
-        patterns = [
-            r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-            r'(\d{1,2}\s+(?:Jan|Fév|Fev|Mar|Avr|Mai|Juin|Juil|Août|Aout|Sep|Oct|Nov|Déc|Dec)[a-z]*\s+\d{4})',
-            r'(?:Date|DATE)\s*[:.]?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                return match.group(1).strip()
-        return None
-    
-    def _extract_supplier(self, text: str) -> Optional[str]:
-        """Extract supplier name"""
-        if not text or not isinstance(text, str):
-            return None
-
-        try:
-            lines = [ln.strip() for ln in text.splitlines()]
-            if not lines:
-                return None
-
-            HEADER_LINES = 20
-            header = lines[:HEADER_LINES]
-
-            email_re = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
-            only_digits_re = re.compile(r'^[\d\W_]+$')
-            invoice_title_re = re.compile(r'\b(Facture|Invoice|Reçu|Receipt|Bill)\b', re.I)
-            address_tokens = re.compile(r'\b(Rue|Av\.|Avenue|Boulevard|Boulv|BP|P\.O\. Box|Po Box|Address|Adresse)\b', re.I)
-            company_keywords = re.compile(r'\b(SARL|S\.A\.R\.L|S A R L|SAS|SASU|SA|Ltd|LLC|GmbH|Inc|Entreprise|Soci[eé]t[eé]|Company|Corporation)\b', re.I)
-
-            candidates = []
-            for idx, ln in enumerate(header):
-                if not ln:
-                    continue
-                norm = ' '.join(ln.split())
-
-                if len(norm) < 3 or len(norm) > 120:
-                    continue
-                if only_digits_re.match(norm):
-                    continue
-                if invoice_title_re.search(norm):
-                    continue
-                if address_tokens.search(norm):
-                    continue
-                if re.search(r'[€\$\£]|(?<!\d)\d{1,3}(?:[.,]\d{3})*[.,]\d{2}', norm):
-                    continue
-
-                score = 0
-                words = norm.split()
-                alpha_words = [w for w in words if re.search(r'[A-Za-zÀ-ÖØ-öø-ÿ]', w)]
-                if len(alpha_words) >= 1:
-                    score += min(len(alpha_words), 5)
-
-                if company_keywords.search(norm):
-                    score += 10
-
-                uppercase_words = sum(1 for w in words if w.isupper() and len(w) > 1)
-                score += uppercase_words * 2
-
-                if re.search(r'\b(Client|Destinataire|Bill To|Billed To)\b', norm, re.I):
-                    score -= 5
-
-                candidates.append((score, idx, norm))
-
-            if not candidates:
-                return None
-
-            candidates.sort(reverse=True, key=lambda x: (x[0], -x[1]))
-            best_score, best_idx, best_line = candidates[0]
-
-            if best_score < 2:
-                return None
-
-            cleaned = re.sub(r'\b(SIRET|SIREN|TVA|RC|Matricule|N[oº]+)\b[:\s]*\S*', '', best_line, flags=re.I)
-            cleaned = re.sub(r'[^\w\s\-\.,&()\/]', '', cleaned).strip()
-            cleaned = ' '.join(cleaned.split())
-            return cleaned if cleaned else None
-
-        except Exception:
-            return None
-    
-    def _extract_matricule_fiscale(self, text: str) -> Optional[str]:
-        """Extract Tunisian fiscal ID"""
-        if not text:
-            return None
-            
-        patterns = [
-            r'(?:MF|TVA|SIRET|SIREN|RC|Matricule|N° TVA|Numéro TVA|Matricule fiscal)\s*[:.]?\s*(\d{7}[A-Z]{3}\d{3})',
-            r'(\d{7}[A-Z]{3}\d{3})',
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                return match.group(1).strip()
-        return None
-    
-    def _extract_po_number(self, text: str) -> Optional[str]:
-        """Extract Purchase Order number"""
-        if not text:
-            return None
-            
-        patterns = [
-            r'(?:PO|Purchase Order|Bon de commande|BC)\s*[:.]?\s*([A-Z0-9-]+)',
-            r'PO[-\s]?([A-Z0-9]+)',
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                return match.group(1).strip()
-        return None
-    
-    def _extract_amount(self, text: str, amount_type: str) -> Optional[float]:
-        """Extract amount (HT, TVA, or TTC)"""
-        if not text:
-            return None
-            
-        patterns = {
-            "HT": [
-                r'(?:Montant HT|Sous[-\s]?total|HT|Hors Taxes)\s*[:.]?\s*([\d\s,\.]+)',
-                r'HT\s*[:.]?\s*([\d\s,\.]+)',
-            ],
-            "TVA": [
-                r'(?:TVA|Tax|Taxes)\s*[:.]?\s*([\d\s,\.]+)',
-                r'TVA\s*\(?\d+%?\)?\s*[:.]?\s*([\d\s,\.]+)',
-            ],
-            "TTC": [
-                r'(?:Total TTC|Total|TOTAL|Montant Total)\s*[:.]?\s*([\d\s,\.]+)',
-                r'TTC\s*[:.]?\s*([\d\s,\.]+)',
-            ]
-        }
-        
-        pattern_list = patterns.get(amount_type.upper(), [])
-        for pattern in pattern_list:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                amount_str = match.group(1).replace(' ', '').replace(',', '.')
-                amount_str = re.sub(r'[^\d.]', '', amount_str)
-                try:
-                    return float(amount_str)
-                except ValueError:
-                    continue
-        return None
-    
-    def _extract_type_achat(self, text: str) -> str:
-        """Extract purchase type"""
-        if text is None or not isinstance(text, str) or not text.strip():
-            return "Article"
-            
-        types = {
-            'Article': ['article', 'produit', 'matériel', 'matériau', 'équipement', 'fourniture'],
-            'Service': ['service', 'prestation', 'consultation', 'maintenance'],
-            'CAPEX': ['capex', 'investissement', 'immobilisation', 'capital'],
-            'Contrat': ['contrat', 'abonnement', 'subscription'],
-        }
-        
-        try:
-            for type_name, keywords in types.items():
-                if any(keyword in text.lower() for keyword in keywords):
-                    return type_name
-        except (AttributeError, TypeError):
-            pass
-        
-        return "Article"
-    
-    def _extract_quantite(self, text: str) -> Optional[int]:
-        """Extract quantity"""
-        if not text:
-            return None
-            
-        patterns = [
-            r'(?:Quantité|Qté|QTE|Quantity|Qty)\s*[:.]?\s*(\d+)',
-            r'(\d+)\s+(?:pcs|pièces|piéces|unités|unites|units)',
-            r'Qté\s*[:.]?\s*(\d+)',
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                try:
-                    return int(match.group(1))
-                except ValueError:
-                    continue
-        return None
-    
-    def _extract_unite(self, text: str) -> str:
-        """Extract unit"""
-        if text is None or not isinstance(text, str):
-            return "pcs"
-            
-        units = ['pcs', 'pièce', 'pièces', 'piéces', 'kg', 'litre', 'mètre', 'metre', 'heure', 'jour', 'unit', 'unité']
-        
-        try:
-            for unit in units:
-                if unit in text.lower():
-                    if unit in ['pcs', 'pièce', 'pièces', 'piéces', 'unit', 'unité']:
-                        return "pcs"
-                    return unit
-        except (AttributeError, TypeError):
-            pass
-        
-        return "pcs"
-    
-    def _extract_specifications(self, text: str) -> Optional[str]:
-        """Extract technical specifications"""
-        if not text:
-            return None
-            
-        patterns = [
-            r'(?:Description|Spécifications|Specifications|Details|Détails)\s*[:.]?\s*(.{20,200})',
-            r'(?:Caractéristiques|Features|Reference|Référence)\s*[:.]?\s*(.{20,200})',
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-            if match:
-                spec_text = match.group(1).strip()
-                spec_text = re.sub(r'\s+', ' ', spec_text)
-                return spec_text[:200]
-        return None
-    
-    def _call_llm_map_fields(self, raw_text: str) -> Dict:
-        """LLM-assisted field mapping"""
+    def _call_llm_map_fields(self, raw_text: str) -> Future:
+        """LLM-assisted field mapping, started in the background (Future of a dict, {} if skipped)"""
         RAPIDAPI_URL = os.getenv("RAPIDAPI_URL")
         RAPIDAPI_KEY = os.getenv("RAPIDAPI_KEY")
         RAPIDAPI_HOST = os.getenv("RAPIDAPI_HOST")
 
         if not RAPIDAPI_URL or not RAPIDAPI_KEY:
             logger.warning("⚠️ RapidAPI URL/KEY not set; skipping LLM mapping.")
-            return {}
+            return resolved({})
+        if not raw_text.strip():
+            return resolved({})
 
         system_prompt = (
             "You are a JSON extractor. Given raw OCR text of an invoice in French or English, "
@@ -538,16 +408,13 @@ class FactureOCREasyOCR:
             "Content-Type": "application/json"
         }
 
-        try:
-            resp = requests.post(RAPIDAPI_URL, json=payload, headers=headers, timeout=60)
-        except Exception as e:
-            logger.warning(f"⚠️ LLM request failed: {e}")
-            return {}
-
-        if not resp.ok:
-            logger.warning(f"⚠️ LLM responded with HTTP {resp.status_code}: {resp.text[:500]}")
-            return {}
+        return get_llm_client().submit(
+            "map_fields", raw_text, RAPIDAPI_URL, payload, headers, self._interpret_llm_mapping
+        )
 
+    @staticmethod
+    def _interpret_llm_mapping(resp) -> Dict:
+        """Field mapping JSON out of the LLM response, whatever envelope it comes in"""
         try:
             data = resp.json()
         except ValueError:
@@ -627,9 +494,66 @@ class FactureOCREasyOCR:
         return {}
 
 
+# ==================== OCR ENGINE REGISTRY ====================
+# One warm EasyOCR engine per process and per language set. Loading the
+# detection + recognition models takes several seconds and hundreds of MB,
+# so it must never happen on the request path more than once.
+
+_engines: Dict[tuple, FactureOCREasyOCR] = {}
+_engines_lock = threading.Lock()
+_engine_stats: Dict[tuple, Dict] = {}
+
+
+def get_ocr_engine(languages=('fr', 'en')) -> FactureOCREasyOCR:
+    """Return the shared OCR engine, loading it on first use"""
+    key = tuple(languages)
+    engine = _engines.get(key)
+    if engine is not None:
+        return engine
+
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            _engine_stats[key] = {"status": "loading", "error": None}
+            try:
+                engine = FactureOCREasyOCR(languages=list(key))
+            except Exception as e:
+                _engine_stats[key] = {"status": "failed", "error": str(e)}
+                raise
+            _engines[key] = engine
+            _engine_stats[key] = {"status": "ready", "error": None}
+    return engine
+
+
+def warm_ocr_engine(languages=('fr', 'en')) -> threading.Thread:
+    """Load the shared OCR engine in a background thread (call after startup)"""
+    def _warm():
+        try:
+            get_ocr_engine(languages)
+        except Exception as e:
+            logger.error(f"❌ OCR warm-up failed: {e}")
+
+    thread = threading.Thread(target=_warm, name="ocr-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def get_ocr_engine_stats(languages=('fr', 'en')) -> Dict:
+    """Load status, model load time and first-request latency of the shared engine"""
+    key = tuple(languages)
+    stats = dict(_engine_stats.get(key, {"status": "not_loaded", "error": None}))
+    engine = _engines.get(key)
+    stats["load_seconds"] = round(engine.load_seconds, 3) if engine else None
+    stats["first_request_seconds"] = (
+        round(engine.first_request_seconds, 3)
+        if engine and engine.first_request_seconds is not None else None
+    )
+    return stats
+
+
 def process_facture_from_bytes(image_bytes: bytes) -> Dict:
     """Complete workflow: Extract invoice data from image or PDF bytes"""
-    ocr = FactureOCREasyOCR(languages=['fr', 'en'])
+    ocr = get_ocr_engine(('fr', 'en'))
     result = ocr.extract_from_bytes(image_bytes)
     
     if result.get("success"):
@@ -645,7 +569,7 @@ def process_facture_from_bytes(image_bytes: bytes) -> Dict:
 
 def process_facture_from_file(file_path: str) -> Dict:
     """Complete workflow: Extract invoice data from image or PDF file"""
-    ocr = FactureOCREasyOCR(languages=['fr', 'en'])
+    ocr = get_ocr_engine(('fr', 'en'))
     result = ocr.extract_from_file(file_path)
     
     if result.get("success"):
@@ -0,0 +1,142 @@
+"""
+Dashboard statistics of the factures collection
+
+One $facet aggregation returns totals, per-status counts and amounts, average
+OCR confidence and (optionally) monthly buckets in a single round trip. Results
+are cached for STATS_CACHE_TTL_SECONDS and dropped as soon as an invoice is
+inserted or changes status (invalidate_stats()).
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATS_CACHE_TTL_SECONDS = float(os.getenv("STATS_CACHE_TTL_SECONDS", "30"))
+
+# Always reported, even at zero (dashboard tiles)
+STATS_STATUSES = ["Validée", "En attente correction", "Approuvée", "Rejetée", "Payée"]
+
+
+def _month_floor(months: int) -> str:
+    """'YYYY-MM' of the first month of a window of `months` months ending this month"""
+    now = datetime.now()
+    index = now.year * 12 + now.month - 1 - (months - 1)
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def build_stats_pipeline(by_month: bool = False, months: int = 12) -> List[Dict]:
+    sums = {
+        "count": {"$sum": 1},
+        "amount": {"$sum": "$montant_ttc"},
+        "avg_confidence": {"$avg": "$ocr_data.confidence"}
+    }
+    facets = {
+        "totals": [{"$group": {"_id": None, **sums}}],
+        "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}, "amount": {"$sum": "$montant_ttc"}}}]
+    }
+    if by_month:
+        # date_reception is an ISO string: its first 7 characters are the month
+        facets["by_month"] = [
+            {"$match": {"date_reception": {"$type": "string", "$gte": _month_floor(months)}}},
+            {"$group": {"_id": {"$substrCP": ["$date_reception", 0, 7]}, **sums}},
+            {"$sort": {"_id": 1}}
+        ]
+    return [
+        # Only the fields the facets read travel through the pipeline
+        {"$project": {"_id": 0, "status": 1, "montant_ttc": 1, "ocr_data.confidence": 1, "date_reception": 1}},
+        {"$facet": facets}
+    ]
+
+
+def _round(value, digits: int = 2) -> float:
+    return round(value or 0.0, digits)
+
+
+def compute_stats(facture_collection, by_month: bool = False, months: int = 12) -> Dict:
+    facet = next(facture_collection.aggregate(build_stats_pipeline(by_month, months)), {})
+    totals = (facet.get("totals") or [{}])[0]
+
+    by_status = {status: 0 for status in STATS_STATUSES}
+    amount_by_status = {status: 0.0 for status in STATS_STATUSES}
+    for row in facet.get("by_status", []):
+        status = row["_id"] or "Inconnu"
+        by_status[status] = row["count"]
+        amount_by_status[status] = _round(row.get("amount"))
+
+    stats = {
+        "total": totals.get("count", 0),
+        "by_status": by_status,
+        "amount_by_status": amount_by_status,
+        "total_amount": _round(totals.get("amount")),
+        "average_confidence": _round(totals.get("avg_confidence"))
+    }
+    if by_month:
+        stats["by_month"] = [
+            {
+                "month": row["_id"],
+                "count": row["count"],
+                "amount": _round(row.get("amount")),
+                "average_confidence": _round(row.get("avg_confidence"))
+            }
+            for row in facet.get("by_month", [])
+        ]
+    return stats
+
+
+class StatsCache:
+    """
+    Short-TTL cache of computed statistics, per (by_month, months) variant.
+    invalidate() bumps a generation: a computation that started before it is
+    returned to its caller but not stored, so a stale result never outlives a write.
+    """
+
+    def __init__(self, ttl_seconds: float = STATS_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[Tuple, Tuple[float, Dict]] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Tuple, compute) -> Tuple[Dict, bool]:
+        """(stats, served_from_cache)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1], True
+            generation = self._generation
+
+        value = compute()
+        with self._lock:
+            if generation == self._generation and self.ttl_seconds > 0:
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        return value, False
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+stats_cache = StatsCache()
+
+
+def get_stats(facture_collection, by_month: bool = False, months: int = 12) -> Dict:
+    """Cached statistics; adds cached / computed_at for the dashboard"""
+    start = time.perf_counter()
+    stats, cached = stats_cache.get_or_compute(
+        (by_month, months if by_month else None),
+        lambda: {**compute_stats(facture_collection, by_month, months), "computed_at": datetime.now().isoformat()}
+    )
+    if not cached:
+        logger.info(f"📊 Invoice statistics computed in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return {**stats, "cached": cached}
+
+
+def invalidate_stats(reason: Optional[str] = None):
+    """Call after inserting an invoice or changing its status"""
+    stats_cache.invalidate()
+    if reason:
+        logger.debug(f"📊 Statistics cache invalidated: {reason}")
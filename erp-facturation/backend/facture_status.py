@@ -0,0 +1,149 @@
+"""
+Invoice status transitions
+
+Each transition is a single find_one_and_update filtered on the statuses it is
+allowed from: the check and the write happen atomically in MongoDB, so two
+concurrent requests (double click, two approvers) cannot both move the same
+invoice, and an invoice paid in the meantime cannot be approved again.
+
+    Validée / En attente correction --approve--> Approuvée --mark_paid--> Payée
+    Validée / En attente correction / Approuvée --reject--> Rejetée
+
+bulk_transition() applies one transition to many invoices with a single
+bulk_write; each history entry carries the batch's transition_id so a single
+follow-up find tells which invoices it actually moved.
+"""
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+from pymongo import ReturnDocument, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+BULK_TRANSITION_MAX_IDS = int(os.getenv("BULK_TRANSITION_MAX_IDS", "500"))
+
+TRANSITIONS = {
+    "approve": {
+        "from": ("Validée", "En attente correction"),
+        "to": "Approuvée",
+        "history": "Approbation",
+    },
+    "reject": {
+        "from": ("Validée", "En attente correction", "Approuvée"),
+        "to": "Rejetée",
+        "history": "Rejet",
+    },
+    "mark_paid": {
+        "from": ("Approuvée",),
+        "to": "Payée",
+        "history": "Paiement effectué",
+    },
+}
+
+# Transitions exposed by POST /factures/bulk-transition (a rejection needs its own reason)
+BULK_ACTIONS = ("approve", "mark_paid")
+
+
+class TransitionError(Exception):
+    """Raised when a status transition cannot be applied"""
+
+
+class FactureNotFound(TransitionError):
+    pass
+
+
+class TransitionNotAllowed(TransitionError):
+    def __init__(self, action: str, status: Optional[str]):
+        super().__init__(f"Cannot {action} facture with status: {status}")
+        self.action = action
+        self.status = status
+
+
+def _update(action: str, user: str, reason: Optional[str] = None,
+            transition_id: Optional[str] = None) -> Dict:
+    transition = TRANSITIONS[action]
+    entry = {
+        "action": transition["history"],
+        "user": user,
+        "timestamp": datetime.now().isoformat(),
+        "status": transition["to"],
+    }
+    if reason is not None:
+        entry["reason"] = reason
+    if transition_id is not None:
+        entry["transition_id"] = transition_id
+    return {"$set": {"status": transition["to"]}, "$push": {"history": entry}}
+
+
+def apply_transition(facture_collection, facture_id: str, action: str, user: str,
+                     reason: Optional[str] = None) -> Dict:
+    """
+    Move one invoice, or raise FactureNotFound / TransitionNotAllowed.
+    Returns {"facture_id", "status"} after the update.
+    """
+    transition = TRANSITIONS[action]
+    updated = facture_collection.find_one_and_update(
+        {"facture_id": facture_id, "status": {"$in": list(transition["from"])}},
+        _update(action, user, reason),
+        projection={"_id": 0, "facture_id": 1, "status": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if updated is not None:
+        return updated
+
+    # Nothing matched: tell a missing invoice from one in the wrong status
+    current = facture_collection.find_one({"facture_id": facture_id}, {"_id": 0, "status": 1})
+    if current is None:
+        raise FactureNotFound(facture_id)
+    raise TransitionNotAllowed(action, current.get("status"))
+
+
+def bulk_transition(facture_collection, facture_ids: List[str], action: str, user: str,
+                    reason: Optional[str] = None) -> Dict:
+    """
+    Apply one transition to many invoices in a single bulk_write (unordered:
+    an invoice in the wrong status does not stop the others).
+
+    Returns the counts and one outcome per requested ID, in request order:
+    "updated", "not_found" or "not_allowed" (with the current status).
+    """
+    transition = TRANSITIONS[action]
+    facture_ids = list(dict.fromkeys(facture_ids))  # dedupe, keep order
+    if not facture_ids:
+        return {"action": action, "requested": 0, "updated": 0, "results": []}
+
+    transition_id = uuid4().hex
+    update = _update(action, user, reason, transition_id)
+    sources = list(transition["from"])
+    result = facture_collection.bulk_write(
+        [UpdateOne({"facture_id": facture_id, "status": {"$in": sources}}, update)
+         for facture_id in facture_ids],
+        ordered=False
+    )
+
+    # One round trip for the outcomes: current status + this batch's history entry, if any
+    docs = {
+        doc["facture_id"]: doc
+        for doc in facture_collection.find(
+            {"facture_id": {"$in": facture_ids}},
+            {"_id": 0, "facture_id": 1, "status": 1,
+             "history": {"$elemMatch": {"transition_id": transition_id}}}
+        )
+    }
+    results = []
+    for facture_id in facture_ids:
+        doc = docs.get(facture_id)
+        if doc is None:
+            results.append({"facture_id": facture_id, "outcome": "not_found"})
+        elif doc.get("history"):
+            results.append({"facture_id": facture_id, "outcome": "updated", "status": transition["to"]})
+        else:
+            results.append({"facture_id": facture_id, "outcome": "not_allowed", "status": doc.get("status")})
+
+    updated = sum(1 for r in results if r["outcome"] == "updated")
+    if updated != result.modified_count:
+        logger.warning(f"⚠️ Bulk {action}: {result.modified_count} modified but {updated} found with the batch entry")
+    return {"action": action, "requested": len(facture_ids), "updated": updated, "results": results}
@@ -1,14 +1,16 @@
 import logging
 from typing import Dict
-from difflib import SequenceMatcher
-import re
 
-import requests
 import os
 import json
 import re as _re_for_json
+from concurrent.futures import Future
 from typing import Optional
 
+from llm_client import get_llm_client, resolved
+from po_lookup import get_mapped_po
+from similarity import bounded_similarity, get_supplier_index, normalize_text
+
 logger = logging.getLogger(__name__)
 
 
@@ -21,8 +23,9 @@ class FactureValidator:
     TOLERANCE_QUANTITY_PERCENT = 5.0  # 5% tolerance for quantities
     TOLERANCE_STRING_SIMILARITY = 0.85  # 85% similarity for text fields
     
-    def __init__(self, po_collection):
+    def __init__(self, po_collection, supplier_collection=None):
         self.po_collection = po_collection
+        self.supplier_collection = supplier_collection  # référentiel fournisseurs (optionnel)
     
     def _normalize_string(self, text: str) -> str:
         """
@@ -32,22 +35,7 @@ class FactureValidator:
         - Remove special characters
         - Remove accents
         """
-        if not text or not isinstance(text, str):
-            return ""
-        
-        # Convert to lowercase
-        text = text.lower()
-        
-        # Remove extra whitespace
-        text = ' '.join(text.split())
-        
-        # Remove common punctuation that doesn't affect meaning
-        text = re.sub(r'[.,;:!?\-_/\\()\[\]{}]', ' ', text)
-        
-        # Remove extra spaces again
-        text = ' '.join(text.split())
-        
-        return text.strip()
+        return normalize_text(text)
     
     def _compare_amounts(self, po_amount: float, facture_amount: float, field_name: str) -> Dict:
         """
@@ -168,8 +156,8 @@ class FactureValidator:
                 "facture_value": facture_text
             }
         
-        # Calculate similarity
-        similarity = SequenceMatcher(None, po_normalized, fact_normalized).ratio()
+        # Calculate similarity (2*LCS/total length like SequenceMatcher, stops early once below the threshold)
+        similarity = bounded_similarity(po_normalized, fact_normalized, self.TOLERANCE_STRING_SIMILARITY)
         
         is_match = similarity >= self.TOLERANCE_STRING_SIMILARITY
         
@@ -177,7 +165,7 @@ class FactureValidator:
         if is_match:
             reason = f"Similarité: {similarity*100:.1f}%"
         else:
-            reason = f"Similarité insuffisante: {similarity*100:.1f}% (minimum: {self.TOLERANCE_STRING_SIMILARITY*100:.0f}%)"
+            reason = f"Similarité insuffisante: ≤{similarity*100:.1f}% (minimum: {self.TOLERANCE_STRING_SIMILARITY*100:.0f}%)"
         
         return {
             "match": is_match,
@@ -189,10 +177,25 @@ class FactureValidator:
             "fact_normalized": fact_normalized
         }
     
-    def _call_llm_compare(self, facture_data: Dict, po: Dict) -> Dict:
+    def _resolve_supplier(self, fournisseur_nom: str) -> Optional[Dict]:
+        """
+        Nom fournisseur OCR rapproché du référentiel complet (index trigrammes):
+        meilleur candidat >= seuil de similarité, avec les autres candidats.
+        """
+        if not fournisseur_nom or self.supplier_collection is None:
+            return None
+        index = get_supplier_index(self.supplier_collection)
+        if index is None:
+            return None
+        candidates = index.top_k(fournisseur_nom, k=3, cutoff=self.TOLERANCE_STRING_SIMILARITY)
+        if not candidates:
+            return None
+        return {**candidates[0], "candidates": candidates}
+
+    def _call_llm_compare(self, facture_data: Dict, po: Dict) -> Future:
         """
-        RapidAPI endpoint to compare facture_ocr output vs PO
-        Returns a dict with optional keys:
+        RapidAPI endpoint to compare facture_ocr output vs PO, started in the
+        background on the shared LLM client. The Future resolves to a dict with optional keys:
         - 'discrepancies': list of {field, po_value, facture_value, severity, reason}
         - 'action_suggérée': one of 'accepter', 'reviser', 'rejeter'
         - 'confidence': float (0-100)
@@ -203,7 +206,7 @@ class FactureValidator:
 
         if not RAPIDAPI_URL or not RAPIDAPI_KEY:
             logger.debug("⚠️ RapidAPI config missing, skipping LLM compare.")
-            return {}
+            return resolved({})
 
         system_prompt = (
             "You are an automated invoice vs purchase-order comparer. "
@@ -234,16 +237,15 @@ class FactureValidator:
             "Content-Type": "application/json"
         }
 
-        try:
-            resp = requests.post(RAPIDAPI_URL, json=payload, headers=headers, timeout=30)
-        except Exception as e:
-            logger.warning(f"⚠️ LLM compare request failed: {e}")
-            return {}
-
-        if not resp.ok:
-            logger.warning(f"⚠️ LLM compare HTTP {resp.status_code}: {resp.text[:500]}")
-            return {}
+        # Same PO + same invoice content -> same answer: cache on the compared documents
+        return get_llm_client().submit(
+            "compare", payload_messages[1]["content"], RAPIDAPI_URL, payload, headers,
+            self._interpret_llm_compare
+        )
 
+    @staticmethod
+    def _interpret_llm_compare(resp) -> Dict:
+        """Comparison JSON out of the LLM response, whatever envelope it comes in"""
         try:
             data = resp.json()
         except Exception:
@@ -317,9 +319,10 @@ class FactureValidator:
         logger.debug("⚠️ LLM compare returned no parseable JSON.")
         return {}
 
-    def validate_against_po(self, facture_data: Dict, po_id: str) -> Dict:
+    def validate_against_po(self, facture_data: Dict, po_id: str, po: Optional[Dict] = None) -> Dict:
         """
         Compare une facture OCR (facture_data) avec un Bon de Commande (PO) stocké en base.
+        po: PO déjà chargé (sortie de map_po_fields); sinon lu via le cache des PO.
         Combine: 
             - Vérifications internes (Règles métier AMÉLIORÉES)
             - Vérifications assistées par LLM
@@ -328,8 +331,9 @@ class FactureValidator:
         logger.info(f"🔍 VALIDATION: Facture vs PO {po_id}")
         logger.info(f"{'='*60}")
 
-        # RÉCUPÉRATION DU PO
-        po = self.po_collection.find_one({"purchase_order_id": po_id})
+        # RÉCUPÉRATION DU PO (cache TTL partagé, la base n'est lue qu'au premier passage)
+        if po is None:
+            po = get_mapped_po(self.po_collection, po_id)
 
         if not po:
             return {
@@ -341,6 +345,9 @@ class FactureValidator:
                 "errors": [f"❌ Bon de commande '{po_id}' introuvable dans la base."]
             }
 
+        # LLM comparison runs in the background while the business rules below are checked
+        llm_future = self._call_llm_compare(facture_data, po)
+
         # STRUCTURE INITIALE DU RÉSULTAT
         result = {
             "is_valid": True,
@@ -455,9 +462,22 @@ class FactureValidator:
             po_fournisseur = po["fournisseur"]
         
         fc_fournisseur = facture_data.get("fournisseur_nom", "")
+        supplier_match = self._resolve_supplier(fc_fournisseur)
+        if supplier_match:
+            result["fournisseur_resolu"] = supplier_match
         
         if po_fournisseur and fc_fournisseur:
             fournisseur_comparison = self._compare_strings(po_fournisseur, fc_fournisseur, "Fournisseur")
+            if not fournisseur_comparison["match"] and supplier_match:
+                # Nom OCR bruité: le fournisseur du référentiel qu'il désigne est-il celui du PO ?
+                resolved_comparison = self._compare_strings(po_fournisseur, supplier_match["name"], "Fournisseur")
+                if resolved_comparison["match"]:
+                    fournisseur_comparison = {
+                        **resolved_comparison,
+                        "facture_value": fc_fournisseur,
+                        "reason": f"Fournisseur résolu via le référentiel: {supplier_match['name']} "
+                                  f"({supplier_match['similarity']*100:.1f}%)"
+                    }
             if _add_mismatch("Fournisseur", fournisseur_comparison):
                 matched_count += 1
 
@@ -494,7 +514,7 @@ class FactureValidator:
 
         # INTÉGRATION DU LLM (Optional enhancement)
         try:
-            llm = self._call_llm_compare(facture_data, po)
+            llm = get_llm_client().wait(llm_future)
             if llm:
                 result["llm"] = llm
                 logger.info(f"\n🤖 LLM Analysis:")
@@ -530,13 +550,13 @@ class FactureValidator:
             return 0.0
         norm1 = self._normalize_string(str1)
         norm2 = self._normalize_string(str2)
-        return SequenceMatcher(None, norm1, norm2).ratio()
+        return bounded_similarity(norm1, norm2)
 
 
 # Fonction utilitaire pour valider une facture complète
-def validate_facture_complete(facture_data: Dict, po_id: str, po_collection) -> Dict:
+def validate_facture_complete(facture_data: Dict, po_id: str, po_collection, supplier_collection=None) -> Dict:
     """Wrapper function for complete validation"""
-    validator = FactureValidator(po_collection)
+    validator = FactureValidator(po_collection, supplier_collection)
     validation_result = validator.validate_against_po(facture_data, po_id)
     
     # Log du résultat
@@ -0,0 +1,218 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# LLM (RapidAPI) client configuration
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "8"))     # total deadline per call
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "10"))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))               # cached answers per process
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))     # consecutive failures before opening
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "60"))
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="replace")).hexdigest()
+
+
+def resolved(value: Dict) -> Future:
+    """Already-completed Future, for calls answered from cache or skipped"""
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failures` consecutive failures; while open every call
+    is skipped. After reset_seconds one trial call goes through (half-open):
+    success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.consecutive_failures >= self.failures:
+                if self.opened_at is None:
+                    logger.warning(
+                        f"⚡ LLM circuit opened after {self.consecutive_failures} failures - "
+                        f"skipping LLM calls for {self.reset_seconds:.0f}s"
+                    )
+                self.opened_at = time.monotonic()
+
+
+class LLMClient:
+    """
+    Shared async HTTP client for the RapidAPI LLM calls of the OCR parser and
+    the validator.
+
+    One httpx.AsyncClient (pooled keep-alive connections) runs on a private
+    event loop thread, so the synchronous parsing code can start a call,
+    keep working, and collect the answer later. Every call has a hard
+    deadline, answers are cached by the hash of their input, and a circuit
+    breaker skips the LLM entirely while the endpoint keeps failing.
+    A skipped, failed or late call resolves to {} (the LLM is only an enhancement).
+    """
+
+    def __init__(self, timeout: float = LLM_TIMEOUT_SECONDS, max_connections: int = LLM_MAX_CONNECTIONS,
+                 cache_size: int = LLM_CACHE_SIZE, breaker: Optional[CircuitBreaker] = None):
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.cache_size = cache_size
+        self.breaker = breaker or CircuitBreaker()
+        self._cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._start_lock = threading.Lock()
+        self.stats = {"calls": 0, "cache_hits": 0, "skipped_open_circuit": 0, "failures": 0, "timeouts": 0}
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm-client", daemon=True).start()
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 3.0)),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections)
+            )
+            self._loop = loop
+
+    def _cache_get(self, key: str) -> Optional[Dict]:
+        with self._cache_lock:
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+            return value
+
+    def _cache_put(self, key: str, value: Dict):
+        with self._cache_lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def submit(self, kind: str, cache_text: str, url: str, payload: Dict, headers: Dict,
+               interpret: Callable[[httpx.Response], Dict]) -> Future:
+        """
+        Start a POST in the background and return a Future of the interpreted JSON dict.
+        cache_text identifies the input (raw OCR text, compared documents...).
+        """
+        key = f"{kind}:{hash_text(cache_text)}"
+        cached = self._cache_get(key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            logger.info(f"🤖 LLM {kind}: cache hit")
+            return resolved(cached)
+
+        if not self.breaker.allow():
+            self.stats["skipped_open_circuit"] += 1
+            logger.info(f"⚡ LLM {kind} skipped: circuit open")
+            return resolved({})
+
+        self._ensure_loop()
+        self.stats["calls"] += 1
+        return asyncio.run_coroutine_threadsafe(
+            self._post(kind, key, url, payload, headers, interpret), self._loop
+        )
+
+    async def _post(self, kind: str, key: str, url: str, payload: Dict, headers: Dict,
+                    interpret: Callable[[httpx.Response], Dict]) -> Dict:
+        start = time.perf_counter()
+        try:
+            resp = await asyncio.wait_for(self._client.post(url, json=payload, headers=headers), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            self.breaker.record_failure()
+            logger.warning(f"⚠️ LLM {kind} timed out after {self.timeout:.1f}s")
+            return {}
+        except Exception as e:
+            self.stats["failures"] += 1
+            self.breaker.record_failure()
+            logger.warning(f"⚠️ LLM {kind} request failed: {e}")
+            return {}
+
+        if not resp.is_success:
+            self.stats["failures"] += 1
+            self.breaker.record_failure()
+            logger.warning(f"⚠️ LLM {kind} responded with HTTP {resp.status_code}: {resp.text[:500]}")
+            return {}
+
+        self.breaker.record_success()
+        try:
+            result = interpret(resp) or {}
+        except Exception as e:
+            logger.debug(f"🔎 LLM {kind} response not interpretable: {e}")
+            result = {}
+        if result:
+            self._cache_put(key, result)
+        logger.info(f"🤖 LLM {kind} answered in {time.perf_counter() - start:.2f}s")
+        return result
+
+    def wait(self, future: Future) -> Dict:
+        """Result of a submitted call, never blocking past the call deadline"""
+        try:
+            return future.result(timeout=self.timeout + 1.0)
+        except Exception as e:
+            logger.warning(f"⚠️ LLM result unavailable: {e}")
+            return {}
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "circuit": self.breaker.state, "cached": len(self._cache)}
+
+
+_llm_client: Optional[LLMClient] = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Process-wide LLM client (one connection pool per OCR worker process)"""
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            _llm_client = LLMClient()
+        return _llm_client
@@ -0,0 +1,284 @@
+"""
+Raw OCR artifact store: the full EasyOCR output of every invoice, kept for re-parsing
+
+The OCR cache (ocr_cache.py) is bounded and evicts; artifacts are the durable
+copy of the raw layer, so a parser change never requires running EasyOCR again.
+
+One .ocra file per file hash: a small JSON header (dtype + shape of each
+column) followed by the column arrays, compressed together as one zlib stream.
+Columns:
+- text:        all block texts, UTF-8, concatenated (+ int32 end offsets)
+- boxes:       corner points rounded to the pixel, stored coordinate-major (4, 2, n)
+               so similar values sit together (uint16, int32 if out of range)
+- confidence:  uint16, confidence * 10000
+- page:        uint16
+- source:      uint8, 0 = EasyOCR, 1 = PDF text layer
+- meta:        JSON of the other keys of the raw result (pages, text_layer_pages...)
+
+Usage (from backend/):
+    python ocr_artifacts.py stats
+    python ocr_artifacts.py reparse --workers 8 --output reparsed.jsonl
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import struct
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+OCR_ARTIFACTS_ENABLED = os.getenv("OCR_ARTIFACTS_ENABLED", "true").lower() in ("1", "true", "yes")
+OCR_ARTIFACT_DIR = os.getenv(
+    "OCR_ARTIFACT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "ocr_artifacts")
+)
+CONFIDENCE_SCALE = 10000
+ARTIFACT_MAGIC = b"OCRA\x01"
+ARTIFACT_EXTENSION = ".ocra"
+SOURCES = [None, "text_layer"]
+
+
+def summarize_raw(raw: Dict) -> Tuple[str, float]:
+    """Raw OCR blocks -> (raw_text, average confidence)"""
+    blocks = raw.get("blocks", [])
+    raw_text = "\n".join(block["text"] for block in blocks)
+    avg_confidence = (
+        sum(block["confidence"] for block in blocks) / len(blocks) if blocks else 0.0
+    )
+    return raw_text, avg_confidence
+
+
+def encode_raw(raw: Dict) -> Dict[str, np.ndarray]:
+    """Raw OCR result -> columns (see module docstring)"""
+    blocks = raw.get("blocks", [])
+    encoded_texts = [block["text"].encode("utf-8") for block in blocks]
+    boxes = np.rint(np.array([block["bbox"] for block in blocks], dtype=np.float64).reshape(len(blocks), 4, 2)) \
+        if blocks else np.zeros((0, 4, 2))
+    box_dtype = np.uint16 if boxes.size == 0 or (boxes.min() >= 0 and boxes.max() <= 65535) else np.int32
+    meta = {key: value for key, value in raw.items() if key != "blocks"}
+    return {
+        "text": np.frombuffer(b"".join(encoded_texts), dtype=np.uint8),
+        "text_end": np.cumsum([len(text) for text in encoded_texts], dtype=np.int64).astype(np.int32),
+        "boxes": np.ascontiguousarray(boxes.transpose(1, 2, 0)).astype(box_dtype),
+        "confidence": np.rint(np.array([block["confidence"] for block in blocks], dtype=np.float64)
+                              * CONFIDENCE_SCALE).astype(np.uint16),
+        "page": np.array([block.get("page", 0) for block in blocks], dtype=np.uint16),
+        "source": np.array([SOURCES.index(block.get("source")) for block in blocks], dtype=np.uint8),
+        "meta": np.frombuffer(json.dumps(meta, ensure_ascii=False).encode("utf-8"), dtype=np.uint8),
+    }
+
+
+def decode_raw(columns) -> Dict:
+    """Columns -> raw OCR result in the format of FactureOCREasyOCR (boxes/confidences quantized)"""
+    text = columns["text"].tobytes()
+    starts = np.concatenate(([0], columns["text_end"][:-1])) if len(columns["text_end"]) else []
+    boxes = columns["boxes"].transpose(2, 0, 1).tolist()
+    confidences = (columns["confidence"] / CONFIDENCE_SCALE).tolist()
+    pages = columns["page"].tolist()
+    sources = columns["source"].tolist()
+
+    blocks = []
+    for i, (start, end) in enumerate(zip(starts, columns["text_end"].tolist())):
+        block = {
+            "text": text[start:end].decode("utf-8"),
+            "bbox": boxes[i],
+            "confidence": confidences[i],
+            "page": pages[i]
+        }
+        if SOURCES[sources[i]]:
+            block["source"] = SOURCES[sources[i]]
+        blocks.append(block)
+    return {**json.loads(columns["meta"].tobytes().decode("utf-8")), "blocks": blocks}
+
+
+def pack_columns(columns: Dict[str, np.ndarray]) -> bytes:
+    """Columns -> artifact bytes (one zlib stream: far smaller than one zip member per column)"""
+    header = json.dumps({name: [str(array.dtype), list(array.shape)] for name, array in columns.items()}).encode()
+    payload = b"".join([struct.pack("<I", len(header)), header,
+                        *(np.ascontiguousarray(array).tobytes() for array in columns.values())])
+    return ARTIFACT_MAGIC + zlib.compress(payload, 6)
+
+
+def unpack_columns(data: bytes) -> Dict[str, np.ndarray]:
+    """Artifact bytes -> columns (read-only views on the decompressed buffer)"""
+    if not data.startswith(ARTIFACT_MAGIC):
+        raise ValueError("not an OCR artifact")
+    payload = zlib.decompress(data[len(ARTIFACT_MAGIC):])
+    (header_size,) = struct.unpack_from("<I", payload)
+    offset = 4 + header_size
+    columns = {}
+    for name, (dtype, shape) in json.loads(payload[4:offset]).items():
+        array = np.frombuffer(payload, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+        columns[name] = array
+        offset += array.nbytes
+    return columns
+
+
+class OCRArtifactStore:
+    """Durable compressed raw-OCR artifacts keyed by the SHA-256 of the uploaded file"""
+
+    def __init__(self, artifact_dir: str = OCR_ARTIFACT_DIR):
+        self.artifact_dir = artifact_dir
+        os.makedirs(artifact_dir, exist_ok=True)
+
+    def path(self, file_hash: str) -> str:
+        return os.path.join(self.artifact_dir, file_hash[:2], f"{file_hash}{ARTIFACT_EXTENSION}")
+
+    def exists(self, file_hash: str) -> bool:
+        return os.path.exists(self.path(file_hash))
+
+    def put(self, file_hash: str, raw: Dict):
+        path = self.path(file_hash)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(pack_columns(encode_raw(raw)))
+        os.replace(tmp_path, path)
+
+    def get(self, file_hash: str) -> Optional[Dict]:
+        return load_artifact(self.path(file_hash))
+
+    def iter_paths(self) -> Iterator[str]:
+        for prefix in sorted(os.scandir(self.artifact_dir), key=lambda entry: entry.name):
+            if prefix.is_dir():
+                for entry in sorted(os.scandir(prefix.path), key=lambda entry: entry.name):
+                    if entry.name.endswith(ARTIFACT_EXTENSION):
+                        yield entry.path
+
+    def stats(self) -> Dict:
+        count = total = 0
+        for path in self.iter_paths():
+            count += 1
+            total += os.path.getsize(path)
+        return {"artifacts": count, "size_mb": round(total / 1024 / 1024, 2),
+                "avg_kb": round(total / 1024 / count, 1) if count else 0.0}
+
+
+def load_artifact(path: str) -> Optional[Dict]:
+    try:
+        with open(path, "rb") as f:
+            return decode_raw(unpack_columns(f.read()))
+    except (OSError, ValueError, KeyError, zlib.error, struct.error):
+        return None
+
+
+_store: Optional[OCRArtifactStore] = None
+
+
+def get_artifact_store() -> Optional[OCRArtifactStore]:
+    """Process-wide artifact store, or None when disabled with OCR_ARTIFACTS_ENABLED=false"""
+    global _store
+    if not OCR_ARTIFACTS_ENABLED:
+        return None
+    if _store is None:
+        _store = OCRArtifactStore()
+    return _store
+
+
+def store_raw(file_hash: str, raw: Dict, cache=None):
+    """Keep a fresh OCR result: OCR cache (fast path) + durable artifact"""
+    if cache is not None:
+        cache.put_raw(file_hash, raw)
+    store = get_artifact_store()
+    if store is not None:
+        try:
+            store.put(file_hash, raw)
+        except Exception as e:  # the OCR result is still good: never fail the job here
+            logger.warning(f"⚠️ OCR artifact not stored ({file_hash[:12]}...): {e}")
+
+
+def load_stored_raw(file_hash: str, cache=None) -> Optional[Dict]:
+    """Raw OCR result from the artifact store (after an OCR cache miss), put back in the cache"""
+    store = get_artifact_store()
+    raw = store.get(file_hash) if store is not None else None
+    if raw is not None:
+        logger.info(f"📦 OCR artifact found ({file_hash[:12]}...) - OCR skipped")
+        if cache is not None:
+            cache.put_raw(file_hash, raw)
+    return raw
+
+
+# ==================== REPARSE ====================
+
+_extractor = None
+
+
+def _reparse_artifact(path: str) -> Dict:
+    """Field extraction of one artifact (runs in a worker process: no EasyOCR, no LLM)"""
+    global _extractor
+    if _extractor is None:
+        from facture_fields import FactureFieldExtractor
+        _extractor = FactureFieldExtractor()
+
+    file_hash = os.path.basename(path)[:-len(ARTIFACT_EXTENSION)]
+    raw = load_artifact(path)
+    if raw is None:
+        return {"file_hash": file_hash, "success": False, "error": "unreadable artifact"}
+    raw_text, confidence = summarize_raw(raw)
+    return {"file_hash": file_hash, "success": True, **_extractor.extract(raw_text),
+            "confidence": round(confidence, 4), "pages": raw.get("pages", 1)}
+
+
+def reparse(store: OCRArtifactStore, workers: int, output: Optional[str] = None, limit: Optional[int] = None) -> Dict:
+    """Re-run field extraction over every stored artifact in parallel"""
+    paths = list(store.iter_paths())[:limit]
+    start = time.perf_counter()
+    filled: Dict[str, int] = {}
+    failed = 0
+    out = open(output, "w", encoding="utf-8") if output else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for result in pool.map(_reparse_artifact, paths, chunksize=max(1, len(paths) // (workers * 8))):
+                if not result["success"]:
+                    failed += 1
+                for field, value in result.items():
+                    if value is not None and field not in ("file_hash", "success", "confidence", "pages"):
+                        filled[field] = filled.get(field, 0) + 1
+                if out:
+                    out.write(json.dumps(result, ensure_ascii=False) + "\n")
+    finally:
+        if out:
+            out.close()
+    elapsed = time.perf_counter() - start
+    return {
+        "artifacts": len(paths),
+        "failed": failed,
+        "workers": workers,
+        "seconds": round(elapsed, 2),
+        "artifacts_per_second": round(len(paths) / elapsed, 1) if elapsed else None,
+        "fields_filled": dict(sorted(filled.items()))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raw OCR artifact store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Number and size of stored artifacts")
+    reparse_parser = sub.add_parser("reparse", help="Re-run field extraction over stored artifacts (no OCR)")
+    reparse_parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    reparse_parser.add_argument("--output", help="Write one JSON line per invoice")
+    reparse_parser.add_argument("--limit", type=int)
+    parser.add_argument("--dir", default=OCR_ARTIFACT_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    store = OCRArtifactStore(args.dir)
+    if args.command == "stats":
+        result = store.stats()
+    else:
+        result = reparse(store, args.workers, args.output, args.limit)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
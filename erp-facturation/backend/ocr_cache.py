@@ -0,0 +1,182 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+OCR_CACHE_DIR = os.getenv(
+    "OCR_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "ocr_cache")
+)
+OCR_CACHE_MAX_MB = float(os.getenv("OCR_CACHE_MAX_MB", "512"))
+# Seconds between two full scans of the cache tree when the running size estimate
+# stays under the limit (other workers write to the same directory)
+OCR_CACHE_RESCAN_SECONDS = float(os.getenv("OCR_CACHE_RESCAN_SECONDS", "300"))
+EVICT_LOW_WATER = 0.9  # evict down to 90% of max_bytes: one scan pays for many writes
+
+
+def hash_file_bytes(file_bytes: bytes) -> str:
+    """Content hash used as the cache key of an uploaded invoice"""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """hash_file_bytes of a file on disk, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OCRResultCache:
+    """
+    On-disk OCR cache keyed by the SHA-256 of the uploaded file.
+
+    Two layers per file:
+    - raw: EasyOCR output (text blocks, boxes, confidences), independent of the parser
+    - parsed: structured fields, one entry per parser version
+
+    A repeat upload with the same parser version skips OCR and parsing; after a
+    parser change the raw layer is re-parsed instead of re-OCRed.
+    Entries are shared by all OCR worker processes and evicted least recently
+    used first once the directory grows past max_bytes. Writes only update a
+    running size estimate; the tree is scanned when that estimate passes
+    max_bytes or every OCR_CACHE_RESCAN_SECONDS, not on every write.
+    A cache write never raises: a failed write is logged and skipped.
+    """
+
+    def __init__(self, cache_dir: str = OCR_CACHE_DIR, max_bytes: int = int(OCR_CACHE_MAX_MB * 1024 * 1024)):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None  # bytes, None until the first scan
+        self._scanned_at = 0.0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_dir(self, file_hash: str) -> str:
+        return os.path.join(self.cache_dir, file_hash[:2], file_hash)
+
+    def _read(self, path: str) -> Optional[Dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Reads refresh the entry for LRU eviction
+        try:
+            now = time.time()
+            os.utime(os.path.dirname(path), (now, now))
+        except OSError:
+            pass
+        return data
+
+    def _write(self, path: str, data: Dict):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            written = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            # The OCR result is still returned: only the cache entry is lost
+            logger.warning(f"⚠️ OCR cache write skipped ({os.path.basename(path)}): {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            if self._size is not None:
+                self._size += written - previous
+            due = self._size is None or self._size > self.max_bytes \
+                or time.monotonic() - self._scanned_at > OCR_CACHE_RESCAN_SECONDS
+        if due:
+            try:
+                self._evict()
+            except Exception as e:
+                logger.warning(f"⚠️ OCR cache eviction skipped: {e}")
+
+    def get_raw(self, file_hash: str) -> Optional[Dict]:
+        return self._read(os.path.join(self._entry_dir(file_hash), "raw.json"))
+
+    def put_raw(self, file_hash: str, raw: Dict):
+        self._write(os.path.join(self._entry_dir(file_hash), "raw.json"), raw)
+
+    def get_parsed(self, file_hash: str, parser_version: str) -> Optional[Dict]:
+        return self._read(os.path.join(self._entry_dir(file_hash), f"parsed-v{parser_version}.json"))
+
+    def put_parsed(self, file_hash: str, parser_version: str, parsed: Dict):
+        self._write(os.path.join(self._entry_dir(file_hash), f"parsed-v{parser_version}.json"), parsed)
+
+    def _scan(self) -> List[Tuple[float, int, str]]:
+        """(mtime, size, path) of every entry; entries removed meanwhile by another worker are skipped"""
+        entries = []
+        try:
+            prefixes = [prefix.path for prefix in os.scandir(self.cache_dir) if prefix.is_dir()]
+        except OSError:
+            return entries
+        for prefix in prefixes:
+            try:
+                entry_dirs = [entry for entry in os.scandir(prefix) if entry.is_dir()]
+            except OSError:
+                continue
+            for entry in entry_dirs:
+                try:
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                    entries.append((entry.stat().st_mtime, size, entry.path))
+                except OSError:
+                    continue
+        return entries
+
+    def _evict(self):
+        """Resync the size from disk and drop least recently used entries down to the low-water mark"""
+        with self._lock:
+            entries = self._scan()
+            total = sum(size for _, size, _ in entries)
+            self._scanned_at = time.monotonic()
+
+            if total > self.max_bytes:
+                target = self.max_bytes * EVICT_LOW_WATER
+                entries.sort()
+                for _, size, path in entries:
+                    if total <= target:
+                        break
+                    try:
+                        for f in os.scandir(path):
+                            os.remove(f.path)
+                        os.rmdir(path)
+                        total -= size
+                        logger.info(f"🧹 OCR cache evicted {os.path.basename(path)[:12]}...")
+                    except OSError:
+                        # Another worker removed or refreshed it concurrently
+                        continue
+            self._size = total
+
+    def stats(self) -> Dict:
+        entries = self._scan()
+        total = sum(size for _, size, _ in entries)
+        return {"entries": len(entries), "size_mb": round(total / 1024 / 1024, 2),
+                "max_mb": round(self.max_bytes / 1024 / 1024, 2)}
+
+
+_cache: Optional[OCRResultCache] = None
+
+
+def get_ocr_cache() -> Optional[OCRResultCache]:
+    """Process-wide OCR cache, or None when disabled with OCR_CACHE_ENABLED=false"""
+    global _cache
+    if not OCR_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = OCRResultCache()
+    return _cache
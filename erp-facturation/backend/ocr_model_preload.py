@@ -0,0 +1,34 @@
+"""
+EasyOCR models loaded once in the forkserver of the OCR worker pool
+
+With OCR_WORKER_START=forkserver, facture_jobs registers this module as the
+forkserver preload: it is imported by the forkserver process only (never by
+the API process), which reads and deserializes the detector and recognizer
+weights a single time. Every OCR worker is then forked from that process and
+starts with the engine already built, sharing the weight pages copy-on-write
+instead of holding its own copy.
+
+gc.freeze() moves the loaded objects to the permanent generation: the
+workers' garbage collector never writes to them, so their pages stay shared.
+"""
+import gc
+import logging
+
+logger = logging.getLogger(__name__)
+
+PRELOAD_LANGUAGES = ('fr', 'en')
+
+
+def preload():
+    # The forkserver only ignores ImportError: any other failure would stop it,
+    # and the workers must still start (they load the models themselves then)
+    try:
+        from facture_ocr import get_ocr_engine
+        get_ocr_engine(PRELOAD_LANGUAGES)
+    except Exception as e:
+        logger.error(f"❌ OCR model preload failed, workers will load their own: {e}")
+    gc.collect()
+    gc.freeze()
+
+
+preload()
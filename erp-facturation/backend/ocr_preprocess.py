@@ -0,0 +1,184 @@
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class PreprocessConfig:
+    """Image preprocessing settings applied before EasyOCR (env overridable)"""
+
+    def __init__(
+        self,
+        enabled: Optional[bool] = None,
+        target_text_height: Optional[int] = None,
+        max_side: Optional[int] = None,
+        grayscale: Optional[bool] = None,
+        deskew: Optional[bool] = None,
+        max_skew_degrees: Optional[float] = None,
+        crop_to_text: Optional[bool] = None,
+        crop_margin: Optional[int] = None,
+    ):
+        def _env_bool(name, default):
+            return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+        # Off by default: turn on once benchmarks/bench_preprocess.py shows the
+        # accuracy / time gain on real EasyOCR weights (OCR_PREPROCESS=true)
+        self.enabled = enabled if enabled is not None else _env_bool("OCR_PREPROCESS", "false")
+        # Median text height (px) to downscale to; EasyOCR reads ~20-30px text well
+        self.target_text_height = target_text_height or int(os.getenv("OCR_TARGET_TEXT_HEIGHT", "28"))
+        # Hard limit on the longest side whatever the text height estimate says
+        self.max_side = max_side or int(os.getenv("OCR_MAX_SIDE", "2200"))
+        self.grayscale = grayscale if grayscale is not None else _env_bool("OCR_GRAYSCALE", "true")
+        self.deskew = deskew if deskew is not None else _env_bool("OCR_DESKEW", "true")
+        # 0 is meaningful (no rotation accepted): only None falls back to the env default
+        self.max_skew_degrees = max_skew_degrees if max_skew_degrees is not None \
+            else float(os.getenv("OCR_MAX_SKEW_DEGREES", "15"))
+        self.crop_to_text = crop_to_text if crop_to_text is not None else _env_bool("OCR_CROP_TO_TEXT", "false")
+        self.crop_margin = crop_margin if crop_margin is not None else int(os.getenv("OCR_CROP_MARGIN", "20"))
+
+    def as_dict(self) -> Dict:
+        return dict(self.__dict__)
+
+
+def _text_mask(gray: np.ndarray) -> np.ndarray:
+    """Dark-on-light text pixels (Otsu), as a 0/255 mask"""
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    return mask
+
+
+def estimate_text_height(gray: np.ndarray) -> Optional[float]:
+    """Median height in pixels of character-sized connected components"""
+    # Work on a ~1000px copy: component heights scale back linearly
+    probe_scale = min(1.0, 1000 / max(gray.shape[:2]))
+    probe = cv2.resize(gray, None, fx=probe_scale, fy=probe_scale, interpolation=cv2.INTER_AREA) \
+        if probe_scale < 1.0 else gray
+    count, _, stats, _ = cv2.connectedComponentsWithStats(_text_mask(probe), connectivity=8)
+    if count <= 1:
+        return None
+
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    # Characters: not specks, not lines/boxes/pictures
+    keep = (heights >= 4) & (heights <= probe.shape[0] * 0.1) & (widths <= heights * 4)
+    if keep.sum() < 10:
+        return None
+    return float(np.median(heights[keep])) / probe_scale
+
+
+def estimate_skew(mask: np.ndarray, max_degrees: float) -> float:
+    """
+    Dominant text-line angle in degrees (counter-clockwise positive).
+    Characters are smeared horizontally into line blobs; the median angle of
+    the elongated blobs is the skew.
+    """
+    probe_scale = min(1.0, 1000 / max(mask.shape[:2]))
+    probe = cv2.resize(mask, None, fx=probe_scale, fy=probe_scale, interpolation=cv2.INTER_NEAREST) \
+        if probe_scale < 1.0 else mask
+    lines = cv2.dilate(probe, cv2.getStructuringElement(cv2.MORPH_RECT, (15, 3)))
+    contours, _ = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    angles = []
+    for contour in contours:
+        (_, _), (w, h), angle = cv2.minAreaRect(contour)
+        if w < h:
+            w, h = h, w
+            angle -= 90
+        # Text lines only: long and thin
+        if w < 40 or w < 5 * h:
+            continue
+        angle = (angle + 90) % 180 - 90  # fold to [-90, 90)
+        if abs(angle) <= max_degrees:
+            angles.append(angle)
+
+    if len(angles) < 3:
+        return 0.0
+    # minAreaRect angles are clockwise in image coordinates
+    return -float(np.median(angles))
+
+
+def preprocess_image(image: np.ndarray, config: PreprocessConfig) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Downscale to the target text height, convert to grayscale, deskew and
+    optionally crop to the text region.
+
+    Returns (processed image, 2x3 affine matrix mapping original pixel
+    coordinates to processed ones) so OCR boxes can be mapped back.
+    """
+    transform = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+    if not config.enabled:
+        return image, transform
+
+    orig_h, orig_w = image.shape[:2]
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image
+
+    # 1) Downscale: OCR time grows with pixel count, not with text size
+    scale = 1.0
+    text_height = estimate_text_height(gray)
+    if text_height:
+        scale = min(scale, config.target_text_height / text_height)
+    scale = min(scale, config.max_side / max(gray.shape[:2]))
+    if scale < 0.95:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        if not config.grayscale:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        transform = np.array([[scale, 0.0, 0.0], [0.0, scale, 0.0]])
+    else:
+        scale = 1.0
+
+    out = gray if config.grayscale else image
+    mask = None
+
+    # 2) Deskew
+    angle = 0.0
+    if config.deskew:
+        mask = _text_mask(gray)
+        angle = estimate_skew(mask, config.max_skew_degrees)
+        if abs(angle) >= 0.5:
+            h, w = out.shape[:2]
+            rotation = cv2.getRotationMatrix2D((w / 2, h / 2), -angle, 1.0)
+            border = 255 if out.ndim == 2 else (255, 255, 255)
+            out = cv2.warpAffine(out, rotation, (w, h), flags=cv2.INTER_LINEAR,
+                                 borderMode=cv2.BORDER_CONSTANT, borderValue=border)
+            mask = cv2.warpAffine(mask, rotation, (w, h), flags=cv2.INTER_NEAREST)
+            transform = _compose(rotation, transform)
+        else:
+            angle = 0.0
+
+    # 3) Crop to the text region (cheap detector: dilated text mask)
+    if config.crop_to_text:
+        if mask is None:
+            mask = _text_mask(out if out.ndim == 2 else cv2.cvtColor(out, cv2.COLOR_RGB2GRAY))
+        dilated = cv2.dilate(mask, np.ones((15, 15), np.uint8))
+        coords = cv2.findNonZero(dilated)
+        if coords is not None:
+            x, y, w, h = cv2.boundingRect(coords)
+            m = config.crop_margin
+            x0, y0 = max(0, x - m), max(0, y - m)
+            x1, y1 = min(out.shape[1], x + w + m), min(out.shape[0], y + h + m)
+            out = out[y0:y1, x0:x1]
+            transform = _compose(np.array([[1.0, 0.0, -x0], [0.0, 1.0, -y0]]), transform)
+
+    logger.info(
+        f"🧼 Preprocessed image: scale={scale:.2f}, skew={angle:.1f}°, "
+        f"{orig_w}x{orig_h} -> {out.shape[1]}x{out.shape[0]}"
+    )
+    return np.ascontiguousarray(out), transform
+
+
+def _compose(outer: np.ndarray, inner: np.ndarray) -> np.ndarray:
+    """Affine outer ∘ inner, both as 2x3 matrices"""
+    outer3 = np.vstack([outer, [0.0, 0.0, 1.0]])
+    inner3 = np.vstack([inner, [0.0, 0.0, 1.0]])
+    return (outer3 @ inner3)[:2]
+
+
+def map_points_back(points, transform: np.ndarray) -> list:
+    """Map box points from processed image coordinates back to the original image"""
+    inverse = cv2.invertAffineTransform(transform)
+    pts = np.asarray(points, dtype=np.float64)
+    mapped = pts @ inverse[:, :2].T + inverse[:, 2]
+    return [[float(x), float(y)] for x, y in mapped]
@@ -0,0 +1,209 @@
+"""
+Second OCR pass on the low-confidence blocks that carry key fields
+
+After the page pass, blocks read with a confidence below OCR_REFINE_CONFIDENCE
+that hold (or sit next to the label of) an amount, the invoice number or the
+PO number are cropped and read again at a higher scale: PDF pages re-render
+only the clip at up to OCR_REFINE_PDF_DPI, images upscale the crop from the
+original full-resolution pixels (the page pass ran on a downscaled copy).
+A block takes the new reading only when its confidence is higher.
+
+The cost is a few small crops per page instead of the whole page at high DPI.
+Disabled unless OCR_REFINE=true.
+"""
+import logging
+import os
+import re
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Off by default: turn on once benchmarks/bench_refine.py shows the field gain is worth
+# the extra recognition passes on real EasyOCR weights (OCR_REFINE=true)
+REFINE_ENABLED = os.getenv("OCR_REFINE", "false").lower() in ("1", "true", "yes")
+REFINE_CONFIDENCE = float(os.getenv("OCR_REFINE_CONFIDENCE", "0.6"))
+REFINE_MAX_BLOCKS = int(os.getenv("OCR_REFINE_MAX_BLOCKS", "12"))          # per page
+REFINE_TEXT_HEIGHT = int(os.getenv("OCR_REFINE_TEXT_HEIGHT", "48"))        # px, text height in the crops
+REFINE_MAX_SCALE = float(os.getenv("OCR_REFINE_MAX_SCALE", "4"))
+REFINE_PDF_DPI = int(os.getenv("OCR_REFINE_PDF_DPI", "600"))
+CROP_PADDING = 0.35  # of the block height, around the box
+CROP_BORDER = 12     # white px added around the crop: the detector misses text touching the edge
+
+# Labels of the fields worth a second look (same vocabulary as FactureFieldExtractor)
+KEY_LABEL = re.compile(
+    r"\b(?:total|ttc|ht|tva|montant|net\s+[àa]\s+payer|facture|invoice|num[ée]ro|no"
+    r"|bon\s+de\s+commande|commande|purchase\s+order|bc|po)\b|\bn[°º]",
+    re.I
+)
+HAS_DIGIT = re.compile(r"\d")
+NOT_DIGIT = re.compile(r"\D")
+
+# Key-field blocks re-read before a near-duplicate's OCR is reused (perceptual_hash.PHASH_REUSE_OCR)
+VERIFY_MAX_BLOCKS = int(os.getenv("PHASH_REUSE_VERIFY_BLOCKS", "8"))
+
+
+def _box(block: Dict) -> Tuple[float, float, float, float]:
+    xs = [p[0] for p in block["bbox"]]
+    ys = [p[1] for p in block["bbox"]]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _next_to_label(box, label) -> bool:
+    """box is right of label on the same line, or just below it"""
+    x0, y0, x1, y1 = box
+    lx0, ly0, lx1, ly1 = label
+    height = max(ly1 - ly0, 1.0)
+    vertical_overlap = min(y1, ly1) - max(y0, ly0)
+    if vertical_overlap >= 0.5 * min(y1 - y0, height) and x0 >= lx0:
+        return True
+    horizontal_overlap = min(x1, lx1) - max(x0, lx0)
+    return ly1 <= y0 <= ly1 + 1.5 * height and horizontal_overlap > 0
+
+
+def select_key_blocks(blocks: Sequence[Dict], threshold: float = REFINE_CONFIDENCE,
+                      max_blocks: int = REFINE_MAX_BLOCKS) -> List[int]:
+    """Indexes of the low-confidence OCR blocks holding key fields, least confident first"""
+    labels = [_box(block) for block in blocks if KEY_LABEL.search(block["text"])]
+    selected = []
+    for index, block in enumerate(blocks):
+        if block["confidence"] >= threshold or block.get("source") == "text_layer":
+            continue
+        if KEY_LABEL.search(block["text"]):
+            selected.append(index)
+        elif HAS_DIGIT.search(block["text"]) and any(_next_to_label(_box(block), label) for label in labels):
+            selected.append(index)
+    selected.sort(key=lambda i: blocks[i]["confidence"])
+    return sorted(selected[:max_blocks])
+
+
+def select_verify_blocks(blocks: Sequence[Dict], max_blocks: int = VERIFY_MAX_BLOCKS) -> List[int]:
+    """Indexes of the OCR blocks with digits in a key field (number, dates, amounts), most confident first"""
+    labels = [_box(block) for block in blocks if KEY_LABEL.search(block["text"])]
+    selected = [
+        index for index, block in enumerate(blocks)
+        if block.get("source") != "text_layer" and HAS_DIGIT.search(block["text"])
+        and (KEY_LABEL.search(block["text"]) or any(_next_to_label(_box(block), label) for label in labels))
+    ]
+    selected.sort(key=lambda i: -blocks[i]["confidence"])
+    return sorted(selected[:max_blocks])
+
+
+def _crop_scale(box_height: float, min_scale: float = 1.0) -> float:
+    return float(np.clip(REFINE_TEXT_HEIGHT / max(box_height, 1.0), min_scale, REFINE_MAX_SCALE))
+
+
+def _finish_crop(gray: np.ndarray) -> np.ndarray:
+    # Local contrast: faint print and stamps are where the page pass loses confidence
+    gray = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(4, 4)).apply(gray)
+    return cv2.copyMakeBorder(gray, CROP_BORDER, CROP_BORDER, CROP_BORDER, CROP_BORDER,
+                              cv2.BORDER_CONSTANT, value=255)
+
+
+def image_crop(image: np.ndarray, bbox) -> np.ndarray:
+    """Upscaled grayscale crop of a block from the full-resolution image"""
+    x0, y0, x1, y1 = _box({"bbox": bbox})
+    pad = CROP_PADDING * (y1 - y0)
+    h, w = image.shape[:2]
+    left, top = int(max(0, x0 - pad)), int(max(0, y0 - pad))
+    right, bottom = int(min(w, x1 + pad + 1)), int(min(h, y1 + pad + 1))
+    crop = image[top:bottom, left:right]
+    if crop.ndim == 3:
+        crop = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+    scale = _crop_scale(y1 - y0)
+    if scale > 1.0:
+        crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+    return _finish_crop(crop)
+
+
+def pdf_crop(page, bbox, page_dpi: int) -> np.ndarray:
+    """Grayscale re-render of only a block's clip, at a DPI giving ~REFINE_TEXT_HEIGHT px text"""
+    x0, y0, x1, y1 = (value * 72 / page_dpi for value in _box({"bbox": bbox}))
+    pad = CROP_PADDING * (y1 - y0)
+    clip = fitz.Rect(x0 - pad, y0 - pad, x1 + pad, y1 + pad) & page.rect
+    # Text height in points * zoom = target px, between the page DPI and REFINE_PDF_DPI
+    zoom = float(np.clip(REFINE_TEXT_HEIGHT / max(y1 - y0, 0.1), page_dpi / 72, REFINE_PDF_DPI / 72))
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, colorspace=fitz.csGRAY, alpha=False)
+    crop = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width).copy()
+    return _finish_crop(crop)
+
+
+def _merge_reading(results: list) -> Optional[Tuple[str, float]]:
+    """EasyOCR results of one crop -> (text in reading order, length-weighted confidence)"""
+    results = [(bbox, text.strip(), float(conf)) for bbox, text, conf in results if text.strip()]
+    if not results:
+        return None
+    results.sort(key=lambda r: (round(min(p[1] for p in r[0]) / 20), min(p[0] for p in r[0])))
+    text = " ".join(r[1] for r in results)
+    weight = sum(len(r[1]) for r in results)
+    return text, sum(r[2] * len(r[1]) for r in results) / weight
+
+
+def refine_blocks(blocks: List[Dict], crop: Callable[[list], np.ndarray],
+                  readtext: Callable[[np.ndarray], list]) -> Dict:
+    """
+    Re-OCR the selected blocks in place. crop(bbox) returns the grayscale image
+    to read, readtext(image) the EasyOCR results on it (recognition only in
+    FactureOCREasyOCR: the crop is one block, no detection needed).
+    Returns counters for the logs.
+    """
+    stats = {"selected": 0, "improved": 0, "seconds": 0.0}
+    if not REFINE_ENABLED or not blocks:
+        return stats
+    indexes = select_key_blocks(blocks)
+    stats["selected"] = len(indexes)
+    if not indexes:
+        return stats
+
+    start = time.perf_counter()
+    for index in indexes:
+        block = blocks[index]
+        try:
+            reading = _merge_reading(readtext(crop(block["bbox"])))
+        except Exception as e:
+            logger.debug(f"⚠️ Re-OCR skipped for block '{block['text']}': {e}")
+            continue
+        if reading is None or reading[1] <= block["confidence"]:
+            continue
+        block["refined_from"] = {"text": block["text"], "confidence": block["confidence"]}
+        block["text"], block["confidence"] = reading
+        stats["improved"] += 1
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    logger.info(
+        f"🔬 Re-OCR of {stats['selected']} low-confidence key block(s): "
+        f"{stats['improved']} improved in {stats['seconds']:.2f}s"
+    )
+    return stats
+
+
+def verify_blocks(blocks: List[Dict], crop: Callable[[Dict], np.ndarray],
+                  readtext: Callable[[np.ndarray], list]) -> Dict:
+    """
+    Re-read the key-field blocks of an earlier OCR at the same places on another
+    file: crop(block) returns the image to read there. A block matches when
+    both readings hold the same digits (letters are where OCR hesitates, the
+    number and amounts of another invoice differ in their digits).
+    Stops at the first mismatch. Reuse only if every compared block matched.
+    """
+    stats = {"compared": 0, "matched": 0, "mismatch": None, "seconds": 0.0}
+    start = time.perf_counter()
+    for index in select_verify_blocks(blocks):
+        block = blocks[index]
+        try:
+            reading = _merge_reading(readtext(crop(block)))
+        except Exception as e:
+            logger.debug(f"⚠️ Re-read failed for block '{block['text']}': {e}")
+            reading = None
+        stats["compared"] += 1
+        text = reading[0] if reading else ""
+        if NOT_DIGIT.sub("", text) == NOT_DIGIT.sub("", block["text"]):
+            stats["matched"] += 1
+        else:
+            stats["mismatch"] = {"stored": block["text"], "read": text}
+            break  # one differing field is enough to refuse the reuse
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return stats
@@ -0,0 +1,249 @@
+"""
+Near-duplicate invoice detection with a perceptual hash of page 1
+
+Suppliers resend the same invoice as a new scan or a re-exported PDF: the bytes
+(and so the SHA-256) differ, the picture does not. Page 1 is rendered small
+(PHASH_RENDER_SIDE px), trimmed to its content so margins and scan borders do
+not count, and reduced to a 64-bit dHash (sign of horizontal gradients on a
+9x8 grayscale grid).
+
+Lookup is multi-index hashing: the hash is split into 4 bands of 16 bits stored
+as "band:value" strings in ocr_data.phash_bands (one multikey index). Two
+hashes within distance d share at least one band within d // 4 bits, so the
+candidates are the documents holding one of the few band variants at that
+radius; their exact Hamming distance is checked afterwards.
+
+Usage (from backend/):
+    python perceptual_hash.py hash <file>...
+    python perceptual_hash.py backfill        # hash stored invoices that have none
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+from itertools import combinations
+from typing import Dict, List, Optional
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+PHASH_ENABLED = os.getenv("PHASH_ENABLED", "true").lower() in ("1", "true", "yes")
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "10"))       # near-duplicate flag (of 64 bits)
+# Off by default: two invoices of one supplier template can hash within 2 bits. When on,
+# the earlier OCR is only reused after its key fields re-read the same on the new file
+PHASH_REUSE_OCR = os.getenv("PHASH_REUSE_OCR", "false").lower() in ("1", "true", "yes")
+PHASH_REUSE_MAX_DISTANCE = int(os.getenv("PHASH_REUSE_MAX_DISTANCE", "2"))  # stricter: OCR of the earlier file reused
+PHASH_RENDER_SIDE = int(os.getenv("PHASH_RENDER_SIDE", "256"))
+PHASH_MAX_CANDIDATES = int(os.getenv("PHASH_MAX_CANDIDATES", "5000"))  # ~0.8% of random hashes share a band at radius 2
+
+HASH_BITS = 64
+BANDS = 4
+BAND_BITS = HASH_BITS // BANDS
+CONTENT_THRESHOLD = 200  # gray level below which a pixel is ink, for the content trim
+PDF_TEXT_MIN_CHARS = int(os.getenv("PDF_TEXT_MIN_CHARS", "20"))  # same rule as FactureOCREasyOCR
+
+
+def render_page1(file_path: str, side: int = PHASH_RENDER_SIDE) -> np.ndarray:
+    """Grayscale render of page 1 with its longest side about `side` px"""
+    with open(file_path, "rb") as f:
+        is_pdf = f.read(4) == b"%PDF"
+    if is_pdf:
+        with fitz.open(file_path) as document:
+            page = document[0]
+            zoom = side / max(page.rect.width, page.rect.height)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+            return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width).copy()
+
+    with Image.open(file_path) as image:
+        image.draft("L", (side, side))  # JPEG: decode at reduced scale directly
+        image = ImageOps.exif_transpose(image).convert("L")
+        image.thumbnail((side, side))
+        return np.array(image)
+
+
+def has_text_layer(file_path: str) -> bool:
+    """PDF with a usable text layer on some page: its extraction is already cheap, never reuse OCR for it"""
+    try:
+        with open(file_path, "rb") as f:
+            if f.read(4) != b"%PDF":
+                return False
+        with fitz.open(file_path) as document:
+            return any(
+                sum(1 for w in page.get_text("words") for c in w[4] if c.isalnum()) >= PDF_TEXT_MIN_CHARS
+                for page in document
+            )
+    except Exception as e:
+        logger.warning(f"⚠️ Text layer check failed for {os.path.basename(file_path)}: {e}")
+        return True  # unknown: do not reuse
+
+
+def trim_to_content(gray: np.ndarray) -> np.ndarray:
+    ink = gray < CONTENT_THRESHOLD
+    rows, cols = np.flatnonzero(ink.any(axis=1)), np.flatnonzero(ink.any(axis=0))
+    if len(rows) < 2 or len(cols) < 2:
+        return gray
+    return gray[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+
+
+def dhash(gray: np.ndarray) -> str:
+    """64-bit difference hash as 16 hex characters"""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return f"{int(''.join('1' if bit else '0' for bit in bits), 2):016x}"
+
+
+def compute_phash(file_path: str) -> Optional[str]:
+    """Perceptual hash of page 1, or None when the file cannot be rendered"""
+    try:
+        return dhash(trim_to_content(render_page1(file_path)))
+    except Exception as e:
+        logger.warning(f"⚠️ Perceptual hash failed for {os.path.basename(file_path)}: {e}")
+        return None
+
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def phash_bands(phash: str) -> List[str]:
+    value = int(phash, 16)
+    mask = (1 << BAND_BITS) - 1
+    return [f"{band}:{(value >> (band * BAND_BITS)) & mask:04x}" for band in range(BANDS)]
+
+
+def candidate_bands(phash: str, max_distance: int = PHASH_MAX_DISTANCE) -> List[str]:
+    """Every band value within max_distance // BANDS bits of the hash's own bands"""
+    radius = max_distance // BANDS
+    value = int(phash, 16)
+    mask = (1 << BAND_BITS) - 1
+    keys = []
+    for band in range(BANDS):
+        own = (value >> (band * BAND_BITS)) & mask
+        for r in range(radius + 1):
+            for flipped in combinations(range(BAND_BITS), r):
+                variant = own
+                for bit in flipped:
+                    variant ^= 1 << bit
+                keys.append(f"{band}:{variant:04x}")
+    return keys
+
+
+def find_near_duplicates(facture_collection, phash: str, max_distance: int = PHASH_MAX_DISTANCE,
+                         limit: int = 5) -> List[Dict]:
+    """Stored invoices whose page-1 hash is within max_distance bits, closest first"""
+    cursor = facture_collection.find(
+        {"ocr_data.phash_bands": {"$in": candidate_bands(phash, max_distance)}},
+        {"_id": 0, "facture_id": 1, "numero_facture": 1, "montant_ttc": 1, "date_facture": 1, "status": 1,
+         "ocr_data.phash": 1, "ocr_data.file_hash": 1}
+    ).limit(PHASH_MAX_CANDIDATES)
+
+    matches = []
+    for doc in cursor:
+        other = (doc.get("ocr_data") or {}).get("phash")
+        if not other:
+            continue
+        distance = hamming(phash, other)
+        if distance <= max_distance:
+            matches.append({
+                "facture_id": doc.get("facture_id"),
+                "distance": distance,
+                "numero_facture": doc.get("numero_facture"),
+                "montant_ttc": doc.get("montant_ttc"),
+                "date_facture": doc.get("date_facture"),
+                "status": doc.get("status"),
+                "file_hash": doc["ocr_data"].get("file_hash")
+            })
+    matches.sort(key=lambda match: match["distance"])
+    return matches[:limit]
+
+
+DATE_SEPARATORS = r"[\s/.\-]+"  # 29-11-2025 == 29/11/2025 == 29 11 2025
+
+
+def _normalized(value, separators: str = r"\s+") -> str:
+    """Upper case, runs of separators collapsed to one space (invoice numbers, dates)"""
+    return re.sub(separators, " ", str(value or "")).strip().upper()
+
+
+def flag_near_duplicates(validation: Dict, near_duplicates: List[Dict], ocr_result: Dict) -> Dict:
+    """
+    Add the near-duplicates to the validation result: an error (invoice held for
+    review) when the earlier invoice has the same number, or the same TTC amount
+    and the same invoice date; a warning otherwise. Recurring invoices of one
+    template (rent, subscriptions, maintenance) share layout and amount by design,
+    only their date or number differs.
+    """
+    numero = _normalized(ocr_result.get("numero_facture"))
+    date = _normalized(ocr_result.get("date_facture"), DATE_SEPARATORS)
+    montant = ocr_result.get("montant_ttc")
+    for match in near_duplicates:
+        same_numero = bool(numero) and _normalized(match.get("numero_facture")) == numero
+        same_montant = montant is not None and match.get("montant_ttc") is not None \
+            and abs(float(montant) - float(match["montant_ttc"])) < 0.01
+        same_date = bool(date) and _normalized(match.get("date_facture"), DATE_SEPARATORS) == date
+        label = f"{match['facture_id']} (distance {match['distance']}/{HASH_BITS})"
+        if same_numero or (same_montant and same_date):
+            validation["errors"].append(f"❌ Doublon probable de la facture {label}: même "
+                                        f"{'numéro' if same_numero else 'montant TTC et même date'}")
+            validation["is_valid"] = False
+        elif same_montant:
+            validation["warnings"].append(f"⚠️ Mise en page et montant TTC identiques à la facture {label} "
+                                          f"(facture récurrente ?)")
+        else:
+            validation["warnings"].append(f"⚠️ Mise en page identique à la facture {label}")
+    validation["near_duplicates"] = [
+        {"facture_id": m["facture_id"], "distance": m["distance"]} for m in near_duplicates
+    ]
+    return validation
+
+
+def backfill(facture_collection, limit: Optional[int] = None) -> Dict:
+    """Hash stored invoices that have a file on disk but no perceptual hash yet"""
+    query = {"ocr_data.phash": {"$exists": False}, "ocr_data.file_path": {"$exists": True}}
+    cursor = facture_collection.find(query, {"_id": 0, "facture_id": 1, "ocr_data.file_path": 1})
+    if limit:
+        cursor = cursor.limit(limit)
+    hashed = missing = 0
+    for doc in cursor:
+        path = doc["ocr_data"]["file_path"]
+        phash = compute_phash(path) if os.path.exists(path) else None
+        if phash is None:
+            missing += 1
+            continue
+        facture_collection.update_one(
+            {"facture_id": doc["facture_id"]},
+            {"$set": {"ocr_data.phash": phash, "ocr_data.phash_bands": phash_bands(phash)}}
+        )
+        hashed += 1
+    return {"hashed": hashed, "skipped": missing}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perceptual hash of invoice page 1")
+    sub = parser.add_subparsers(dest="command", required=True)
+    hash_parser = sub.add_parser("hash", help="Print the hash of files (and their pairwise distances)")
+    hash_parser.add_argument("files", nargs="+")
+    backfill_parser = sub.add_parser("backfill", help="Hash stored invoices that have none")
+    backfill_parser.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    if args.command == "hash":
+        hashes = {path: compute_phash(path) for path in args.files}
+        for path, phash in hashes.items():
+            print(f"{phash or '-':16}  {path}")
+        valid = [(path, phash) for path, phash in hashes.items() if phash]
+        for (a, ha), (b, hb) in combinations(valid, 2):
+            print(f"{hamming(ha, hb):>3}  {os.path.basename(a)} <-> {os.path.basename(b)}")
+    else:
+        from db import get_facture_collection
+        print(backfill(get_facture_collection(), args.limit))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
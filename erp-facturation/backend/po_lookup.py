@@ -0,0 +1,185 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Mapped PO cache: repeated and batch validations against the same PO skip the database
+PO_CACHE_TTL_SECONDS = float(os.getenv("PO_CACHE_TTL_SECONDS", "300"))
+PO_CACHE_MAX_ENTRIES = int(os.getenv("PO_CACHE_MAX_ENTRIES", "1000"))
+
+
+class MappedPOCache:
+    """
+    TTL cache of mapped POs (map_po_fields output) keyed by purchase_order_id.
+    One per process; entries are dropped on expiry, on eviction (oldest first
+    past max_entries) and by invalidate() when the PO changes.
+    """
+
+    def __init__(self, ttl_seconds: float = PO_CACHE_TTL_SECONDS, max_entries: int = PO_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, dict, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, po_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(po_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[po_id]
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, po_id: str, po: dict, object_id=None):
+        """object_id: the document _id, so change stream events (keyed by _id) can invalidate it"""
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[po_id] = (time.monotonic() + self.ttl_seconds, po, object_id)
+            self._entries.move_to_end(po_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, po_id: Optional[str] = None):
+        """Drop one PO (or everything when po_id is None)"""
+        with self._lock:
+            if po_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(po_id, None)
+
+    def invalidate_object_id(self, object_id):
+        with self._lock:
+            for po_id in [key for key, entry in self._entries.items() if entry[2] == object_id]:
+                del self._entries[po_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "ttl_seconds": self.ttl_seconds}
+
+
+po_cache = MappedPOCache()
+
+
+def get_mapped_po(po_collection, po_id: str) -> Optional[dict]:
+    """Mapped PO by exact purchase_order_id, from the cache when fresh"""
+    po = po_cache.get(po_id)
+    if po is None:
+        po_raw = po_collection.find_one({"purchase_order_id": po_id})
+        if po_raw is None:
+            return None
+        po = map_po_fields(po_raw)
+        po_cache.put(po_id, po, po_raw.get("_id"))
+    return po
+
+
+def find_mapped_po(po_collection, po_ref: Optional[str]) -> Tuple[Optional[str], Optional[dict]]:
+    """
+    Find a bon de commande from a user- or OCR-supplied reference.
+    Tries the reference as-is, then with the BC- prefix (users and invoices
+    often give just the number). Returns (purchase_order_id, mapped PO) or (None, None).
+    """
+    if not po_ref:
+        return None, None
+
+    po_ref = po_ref.strip()
+    candidates = [po_ref]
+    if not po_ref.upper().startswith("BC-"):
+        candidates.append(f"BC-{po_ref}")
+
+    for candidate in candidates:
+        po = get_mapped_po(po_collection, candidate)
+        if po:
+            if candidate != po_ref:
+                logger.info(f"🔍 PO {po_ref} found with BC- prefix: {candidate}")
+            return candidate, po
+    return None, None
+
+
+def watch_po_updates(po_collection, stop_event: threading.Event):
+    """
+    Invalidate cached POs as bons_commande changes (MongoDB change stream).
+    Standalone servers have no change streams: the TTL alone then bounds staleness.
+    """
+    retry_seconds = 5.0
+    while not stop_event.is_set():
+        try:
+            with po_collection.watch(
+                [{"$project": {"documentKey": 1, "operationType": 1}}],
+                max_await_time_ms=1000
+            ) as stream:
+                logger.info("👀 Watching bons_commande changes for the PO cache")
+                retry_seconds = 5.0
+                while not stop_event.is_set() and stream.alive:
+                    change = stream.try_next()
+                    if change is None:
+                        continue
+                    if change.get("operationType") in ("drop", "rename", "dropDatabase", "invalidate"):
+                        po_cache.invalidate()
+                        continue
+                    # documentKey only carries _id: drop the matching cached PO
+                    po_cache.invalidate_object_id(change["documentKey"]["_id"])
+        except OperationFailure as e:
+            logger.warning(f"⚠️ PO change stream unavailable ({e.code}): cache relies on its "
+                           f"{po_cache.ttl_seconds:.0f}s TTL")
+            return
+        except PyMongoError as e:
+            if stop_event.is_set():
+                return
+            logger.warning(f"⚠️ PO change stream interrupted: {e} - retrying in {retry_seconds:.0f}s")
+            po_cache.invalidate()
+            stop_event.wait(retry_seconds)
+            retry_seconds = min(retry_seconds * 2, 300.0)
+
+
+def start_po_cache_watcher(po_collection) -> threading.Event:
+    """Run watch_po_updates in a daemon thread; set the returned event to stop it"""
+    stop_event = threading.Event()
+    threading.Thread(
+        target=watch_po_updates, args=(po_collection, stop_event), name="po-cache-watch", daemon=True
+    ).start()
+    return stop_event
+
+
+def map_po_fields(po: dict) -> dict:
+    """
+    Map bons_commande structure to expected PO structure for validation
+    """
+    # Extract first ligne if exists
+    first_ligne = po.get("lignes", [{}])[0] if po.get("lignes") else {}
+    
+    # Calculate total quantity from all lines
+    total_quantite = sum(ligne.get("quantite", 0) for ligne in po.get("lignes", []))
+    
+    return {
+        "purchase_order_id": po.get("purchase_order_id"),
+        "linked_pr_id": po.get("linked_pr_id"),
+        "type_achat": po.get("type_achat"),
+        "quantite": total_quantite or first_ligne.get("quantite"),
+        "unite": first_ligne.get("unite"),
+        "prix_estime": po.get("montant_total_ttc"),
+        "montant_ht": po.get("montant_total_ht"),
+        "montant_tva": po.get("montant_tva"),
+        "montant_ttc": po.get("montant_total_ttc"),
+        "devise": po.get("devise", "TND"),
+        "centre_cout": po.get("centre_cout"),
+        "priorite": po.get("priorite"),
+        "delai_souhaite": po.get("delai_souhaite"),
+        "date_livraison_souhaitee": po.get("date_livraison_souhaitee"),
+        "specifications_techniques": first_ligne.get("specifications_techniques") or first_ligne.get("description"),
+        "fournisseur": po.get("fournisseur", {}),
+        "demandeur": po.get("demandeur", {}),
+        "details": po.get("details_demande"),
+        "items": po.get("lignes", [])
+    }
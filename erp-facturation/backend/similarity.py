@@ -0,0 +1,181 @@
+"""
+String similarity for OCR'd text fields and supplier names
+
+- bounded_similarity(): 2 * LCS / total length (what SequenceMatcher.ratio()
+  approximates), computed with the bit-parallel LCS of Allison-Dix/Hyyrö (one
+  pass over the second string, the first one packed into a Python int). Given
+  a cutoff it gives up as soon as the distance can no longer stay under the
+  allowed budget.
+- SupplierIndex: trigram inverted index over the supplier master, top-k lookup
+  (shared trigrams shortlist the candidates, bounded_similarity ranks them).
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SUPPLIER_INDEX_TTL_SECONDS = float(os.getenv("SUPPLIER_INDEX_TTL_SECONDS", "600"))
+SUPPLIER_SHORTLIST_FACTOR = 4  # candidates rescored per requested result
+
+_PUNCTUATION = re.compile(r'[.,;:!?\-_/\\()\[\]{}]')
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Lowercase, punctuation -> space, single spaces (same rules as FactureValidator)"""
+    if not text or not isinstance(text, str):
+        return ""
+    return ' '.join(_PUNCTUATION.sub(' ', text.lower()).split())
+
+
+def bounded_distance(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """
+    Indel distance between a and b: insertions + deletions needed, i.e.
+    len(a) + len(b) - 2 * LCS(a, b) (a substitution counts as two edits).
+    With max_distance, returns max_distance + 1 as soon as the distance is
+    known to exceed it (length gap, or too few characters left to catch up).
+    """
+    m, n = len(a), len(b)
+    if max_distance is not None and abs(m - n) > max_distance:
+        return max_distance + 1
+    if m == 0 or n == 0:
+        return m + n
+
+    # Bit i of peq[c] is set when a[i] == c
+    peq: Dict[str, int] = {}
+    for i, char in enumerate(a):
+        peq[char] = peq.get(char, 0) | (1 << i)
+
+    # Bit-parallel LCS (Allison-Dix / Hyyrö): zero bits of s count the LCS so far
+    mask = (1 << m) - 1
+    s = mask
+    for j, char in enumerate(b, start=1):
+        u = s & peq.get(char, 0)
+        s = ((s + u) | (s - u)) & mask
+        if max_distance is not None:
+            # Each remaining character of b adds at most one to the LCS
+            best_lcs = m - s.bit_count() + (n - j)
+            if m + n - 2 * min(best_lcs, m) > max_distance:
+                return max_distance + 1
+    return m + n - 2 * (m - s.bit_count())
+
+
+def bounded_similarity(a: str, b: str, cutoff: float = 0.0) -> float:
+    """
+    2 * LCS / (len(a) + len(b)), in [0, 1]: the measure difflib.SequenceMatcher.ratio()
+    approximates (its matching blocks are one common subsequence), so thresholds
+    tuned on ratio() keep their meaning, short strings included.
+    Below cutoff the exact value is not computed: the result is then an
+    upper bound that is itself below cutoff.
+    """
+    total = len(a) + len(b)
+    if total == 0:
+        return 1.0
+    max_distance = int((1.0 - cutoff) * total + 1e-9)
+    distance = bounded_distance(a, b, max_distance if cutoff > 0 else None)
+    return 1.0 - distance / total
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SupplierIndex:
+    """Trigram index over supplier names for top-k fuzzy lookup"""
+
+    def __init__(self, suppliers: List[Tuple[str, str]]):
+        """suppliers: (supplier_id, name) pairs"""
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.normalized: List[str] = []
+        self.trigram_counts: List[int] = []
+        self.postings: Dict[str, List[int]] = {}
+        for supplier_id, name in suppliers:
+            normalized = normalize_text(name)
+            if not normalized:
+                continue
+            position = len(self.ids)
+            self.ids.append(supplier_id)
+            self.names.append(name)
+            self.normalized.append(normalized)
+            grams = _trigrams(normalized)
+            self.trigram_counts.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(position)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def top_k(self, query: str, k: int = 5, cutoff: float = 0.0) -> List[Dict]:
+        """
+        Best k suppliers for query with similarity >= cutoff, best first.
+        Candidates sharing the most trigrams (Dice coefficient) are shortlisted,
+        then ranked by bounded_similarity.
+        """
+        normalized = normalize_text(query)
+        if not normalized or not self.ids:
+            return []
+
+        grams = _trigrams(normalized)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        if not shared:
+            return []
+
+        query_count = len(grams)
+        shortlist = sorted(
+            shared,
+            key=lambda position: 2 * shared[position] / (query_count + self.trigram_counts[position]),
+            reverse=True
+        )[:max(k * SUPPLIER_SHORTLIST_FACTOR, k)]
+
+        matches = []
+        for position in shortlist:
+            score = bounded_similarity(normalized, self.normalized[position], cutoff)
+            if score >= cutoff:
+                matches.append({
+                    "supplier_id": self.ids[position],
+                    "name": self.names[position],
+                    "similarity": round(score, 4)
+                })
+        matches.sort(key=lambda match: match["similarity"], reverse=True)
+        return matches[:k]
+
+
+def load_supplier_index(supplier_collection) -> SupplierIndex:
+    suppliers = [
+        (str(doc.get("supplier_id") or doc["_id"]), doc.get("name"))
+        for doc in supplier_collection.find({}, {"supplier_id": 1, "name": 1})
+    ]
+    return SupplierIndex(suppliers)
+
+
+_supplier_index: Optional[SupplierIndex] = None
+_supplier_index_built_at = 0.0
+_supplier_index_lock = threading.Lock()
+
+
+def get_supplier_index(supplier_collection) -> Optional[SupplierIndex]:
+    """
+    Process-wide supplier index, rebuilt every SUPPLIER_INDEX_TTL_SECONDS.
+    None when the supplier master cannot be read.
+    """
+    global _supplier_index, _supplier_index_built_at
+    with _supplier_index_lock:
+        if not _supplier_index_built_at or time.monotonic() - _supplier_index_built_at > SUPPLIER_INDEX_TTL_SECONDS:
+            try:
+                start = time.perf_counter()
+                _supplier_index = load_supplier_index(supplier_collection)
+                _supplier_index_built_at = time.monotonic()
+                logger.info(f"🏭 Supplier index built: {len(_supplier_index)} suppliers "
+                            f"in {time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                logger.warning(f"⚠️ Supplier index unavailable: {e}")
+                _supplier_index_built_at = time.monotonic()
+        return _supplier_index
@@ -0,0 +1,104 @@
+"""
+Upload spooling: copy uploaded files to disk in chunks, hashing as they go
+
+Nothing holds a whole upload in memory: each chunk is written to the spool
+file and fed to the SHA-256 (OCR cache key / duplicate detection) before
+the next one is read. Oversized uploads are refused early: by Content-Length
+before the body is read (UploadSizeLimit middleware), and while spooling
+for requests that do not announce their size.
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import BinaryIO, Dict, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+SPOOL_CHUNK_SIZE = 1024 * 1024  # copy 1 MB at a time
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "25"))              # one invoice (PDF / image)
+MAX_BATCH_UPLOAD_MB = float(os.getenv("MAX_BATCH_UPLOAD_MB", "500"))  # one ZIP archive
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_MB * 1024 * 1024)
+MAX_BATCH_UPLOAD_BYTES = int(MAX_BATCH_UPLOAD_MB * 1024 * 1024)
+MULTIPART_OVERHEAD_BYTES = 64 * 1024  # boundaries + the other form fields
+
+
+class UploadTooLarge(Exception):
+    """The upload exceeds its size limit (HTTP 413)"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        super().__init__(f"File exceeds the maximum upload size of {max_bytes / (1024 * 1024):.0f} MB")
+
+
+def _open_spool(dst_path: str):
+    os.makedirs(os.path.dirname(dst_path) or ".", exist_ok=True)
+    return open(dst_path, "wb")
+
+
+def copy_hashed(src: BinaryIO, dst_path: str, max_bytes: int = None) -> Tuple[int, str]:
+    """Copy a binary stream to dst_path in chunks; returns (size, sha256 hex)"""
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with _open_spool(dst_path) as dst:
+            while chunk := src.read(SPOOL_CHUNK_SIZE):
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                digest.update(chunk)
+                dst.write(chunk)
+    except BaseException:
+        if os.path.exists(dst_path):
+            os.remove(dst_path)
+        raise
+    return size, digest.hexdigest()
+
+
+def _copy_upload(src: BinaryIO, dst_path: str, max_bytes: int) -> Tuple[int, str]:
+    src.seek(0)
+    return copy_hashed(src, dst_path, max_bytes)
+
+
+async def spool_upload(upload, dst_path: str, max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[int, str]:
+    """
+    Copy a FastAPI UploadFile to dst_path; returns (size, sha256 hex).
+    Starlette has already buffered the body in upload.file (SpooledTemporaryFile,
+    unnamed and deleted with the request): the job needs a named file that
+    outlives the request, so it is copied from there, in a worker thread so the
+    disk writes and the hashing never block the event loop.
+    """
+    return await run_in_threadpool(_copy_upload, upload.file, dst_path, max_bytes)
+
+
+class UploadSizeLimit:
+    """
+    ASGI middleware: answers 413 before reading the body when a POST to one
+    of the upload paths announces a Content-Length above its limit.
+    limits: {path: max file bytes}; multipart overhead is allowed on top.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST":
+            max_bytes = self.limits.get(scope["path"].rstrip("/"))
+            if max_bytes is not None:
+                length = dict(scope["headers"]).get(b"content-length")
+                if length and length.isdigit() and int(length) > max_bytes + MULTIPART_OVERHEAD_BYTES:
+                    logger.warning(f"🚫 Upload refused on {scope['path']}: {int(length)} bytes announced")
+                    body = json.dumps({"detail": str(UploadTooLarge(max_bytes))}).encode()
+                    await send({
+                        "type": "http.response.start",
+                        "status": 413,
+                        "headers": [(b"content-type", b"application/json"),
+                                    (b"content-length", str(len(body)).encode()),
+                                    (b"connection", b"close")]
+                    })
+                    await send({"type": "http.response.body", "body": body})
+                    return
+        await self.app(scope, receive, send)
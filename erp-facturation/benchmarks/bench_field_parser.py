@@ -0,0 +1,93 @@
+"""
+Golden check + micro-benchmark of the invoice field parser
+
+1. Golden: FactureFieldExtractor must reproduce, field for field, the outputs
+   recorded in parser_golden.json (the former _extract_* methods over the
+   sample invoice texts). Any difference exits with status 1.
+2. Benchmark: legacy per-field methods (legacy_fields.py) vs. the compiled
+   extractor over the same texts.
+
+Usage (from erp-facturation/):
+    python benchmarks/bench_field_parser.py
+    python benchmarks/bench_field_parser.py --check-only
+    python benchmarks/bench_field_parser.py --repeat 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "backend"))
+sys.path.insert(0, BENCH_DIR)
+
+from facture_fields import FactureFieldExtractor  # noqa: E402
+from legacy_fields import LegacyFieldParser  # noqa: E402
+
+GOLDEN_PATH = os.path.join(BENCH_DIR, "parser_golden.json")
+
+
+def check_golden(extractor: FactureFieldExtractor, corpus: list) -> int:
+    failures = 0
+    for doc in corpus:
+        extracted = extractor.extract(doc["text"])
+        diffs = {
+            field: (expected, extracted.get(field))
+            for field, expected in doc["expected"].items()
+            if extracted.get(field) != expected
+        }
+        if list(extracted) != list(doc["expected"]):
+            diffs["<field order>"] = (list(doc["expected"]), list(extracted))
+        if diffs:
+            failures += 1
+            print(f"❌ {doc['name']}")
+            for field, (expected, actual) in diffs.items():
+                print(f"     {field}: expected {expected!r}, got {actual!r}")
+        else:
+            print(f"✅ {doc['name']}")
+    return failures
+
+
+def time_parser(parse, texts: list, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            parse(text)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=500, help="Passes over the corpus")
+    parser.add_argument("--check-only", action="store_true", help="Golden check without timing")
+    args = parser.parse_args()
+
+    with open(GOLDEN_PATH, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    extractor = FactureFieldExtractor()
+    failures = check_golden(extractor, corpus)
+    print(f"\nGolden: {len(corpus) - failures}/{len(corpus)} documents identical")
+    if failures:
+        sys.exit(1)
+    if args.check_only:
+        return
+
+    texts = [doc["text"] for doc in corpus]
+    legacy = LegacyFieldParser()
+    # Warm-up: the legacy methods also hit re's internal pattern cache after the first call
+    time_parser(legacy.parse, texts, 5)
+    time_parser(extractor.extract, texts, 5)
+
+    legacy_s = time_parser(legacy.parse, texts, args.repeat)
+    compiled_s = time_parser(extractor.extract, texts, args.repeat)
+    docs = len(texts) * args.repeat
+    print(f"\n{docs} documents parsed")
+    print(f"  legacy   : {legacy_s:.3f}s  ({legacy_s / docs * 1e6:.1f} µs/doc)")
+    print(f"  compiled : {compiled_s:.3f}s  ({compiled_s / docs * 1e6:.1f} µs/doc)")
+    print(f"  speedup  : {legacy_s / compiled_s:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
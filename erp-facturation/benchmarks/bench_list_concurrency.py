@@ -0,0 +1,96 @@
+"""
+Concurrency benchmark: N parallel clients on GET /factures/
+
+Every client loops on the listing endpoint for --duration seconds; reports
+throughput and latency percentiles. Run it once against a server on the old
+code (pymongo on the event loop) and once on the current one (bounded DB
+thread pool), same database, same uvicorn settings, and compare.
+
+No before/after numbers have been recorded yet (no MongoDB instance was
+available when run_db was introduced): the DB thread pool is a correctness
+change (pymongo no longer blocks the event loop), its throughput effect is
+unmeasured until this benchmark is run against a real database.
+
+Usage (from erp-facturation/, API running on :8000):
+    python benchmarks/bench_list_concurrency.py --clients 50 --duration 20 --label after
+    python benchmarks/bench_list_concurrency.py --path "/factures/?status=Validée" --json out.json
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+
+async def client_loop(client: httpx.AsyncClient, url: str, deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            resp = await client.get(url)
+            if resp.status_code != 200:
+                errors.append(resp.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(args) -> dict:
+    url = args.base_url.rstrip("/") + args.path
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        # Warm-up request (connection, first query plan)
+        await client.get(url)
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(
+            client_loop(client, url, deadline, latencies, errors) for _ in range(args.clients)
+        ))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1) if latencies else None
+
+    return {
+        "label": args.label,
+        "url": url,
+        "clients": args.clients,
+        "duration_seconds": round(elapsed, 2),
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 1) if latencies else None,
+            "p50": pct(0.50),
+            "p95": pct(0.95),
+            "p99": pct(0.99),
+            "max": round(latencies[-1] * 1000, 1) if latencies else None
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--path", default="/factures/")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--json", default=None, help="Append the result to this JSON lines file")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.json:
+        with open(args.json, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Benchmark: perceptual-hash near-duplicate detection
+
+1. Robustness: every sample of inputs/ is "resent" as a new scan (slight
+   rotation, noise, JPEG recompression, rescale, extra margins) and as a PDF
+   re-export of the image; the variants must stay within PHASH_MAX_DISTANCE of
+   the original while the distinct samples stay above it.
+2. Same template, different invoice: the text-layer PDF sample with its invoice
+   number, dates and amounts changed (same layout, as a supplier's next invoice)
+   is hashed as a PDF and as a 150 dpi scan. It lands within
+   PHASH_REUSE_MAX_DISTANCE, so the OCR reuse must refuse it: PDFs with a text
+   layer are never reused, and the key-field re-read (ocr_refine.verify_blocks)
+   must reject the other invoice's scan while accepting a re-export of the same
+   one. The re-read uses the PDF text layer as a perfect reader, or the real
+   EasyOCR engine with --easyocr (models needed).
+3. Cost: time to hash page 1 per file type (what an upload pays before OCR).
+4. Lookup: multi-index hashing over --stored random hashes (in-memory band
+   index standing in for the ocr_data.phash_bands index) must return exactly
+   what a full Hamming scan returns, while touching far fewer hashes.
+
+Usage (from erp-facturation/):
+    python benchmarks/bench_near_duplicates.py --stored 200000
+    python benchmarks/bench_near_duplicates.py --easyocr
+"""
+import argparse
+import glob
+import io
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from itertools import combinations
+
+import cv2
+import fitz
+import numpy as np
+from PIL import Image
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "backend"))
+
+from perceptual_hash import (  # noqa: E402
+    PHASH_MAX_DISTANCE, PHASH_REUSE_MAX_DISTANCE, candidate_bands, compute_phash, hamming,
+    has_text_layer, phash_bands
+)
+from ocr_refine import CROP_PADDING, verify_blocks  # noqa: E402
+
+SCAN_DPI = 150
+# Fields that change from one invoice to the next on a supplier's template
+INVOICE_FIELDS = re.compile(r"^(?:[A-Z]+-\d{4}-\d{3,}|\d{1,2}/\d{1,2}/\d{4}|\d+[.,]\d{2,3})$")
+
+
+def rescan(image: np.ndarray, rng: random.Random) -> np.ndarray:
+    h, w = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), rng.uniform(-1.5, 1.5), 1.0)
+    out = cv2.warpAffine(image, matrix, (w, h), borderValue=(255, 255, 255))
+    out = cv2.resize(out, None, fx=rng.uniform(0.7, 1.3), fy=rng.uniform(0.7, 1.3), interpolation=cv2.INTER_AREA)
+    pad = [rng.randint(10, 80) for _ in range(4)]
+    out = cv2.copyMakeBorder(out, *pad, cv2.BORDER_CONSTANT, value=(255, 255, 255))
+    noise = np.random.default_rng(rng.randint(0, 1 << 30)).normal(0, 6, out.shape)
+    out = np.clip(out.astype(np.float64) * rng.uniform(0.9, 1.05) + noise, 0, 255).astype(np.uint8)
+    return out
+
+
+def write_jpeg(image: np.ndarray, path: str, quality: int):
+    Image.fromarray(image).save(path, format="JPEG", quality=quality)
+
+
+def write_pdf(image: np.ndarray, path: str):
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, format="PNG")
+    with fitz.open() as document:
+        page = document.new_page(width=595, height=842)  # A4 re-export with its own margins
+        page.insert_image(fitz.Rect(40, 40, 555, 802), stream=buffer.getvalue(), keep_proportion=True)
+        document.save(path)
+
+
+def render_first_page(path: str, dpi: int = 150) -> np.ndarray:
+    with fitz.open(path) as document:
+        pix = document[0].get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)
+        return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3).copy()
+
+
+def other_invoice(path: str, out: str) -> int:
+    """Copy of a text-layer PDF with every number, date and amount changed in place; count of fields changed"""
+    changed = 0
+    with fitz.open(path) as document:
+        for page in document:
+            for x0, y0, x1, y1, word, *_ in page.get_text("words"):
+                if INVOICE_FIELDS.match(word):
+                    new = "".join(str((int(c) + 3) % 10) if c.isdigit() else c for c in word)
+                    page.add_redact_annot(fitz.Rect(x0, y0, x1, y1), text=new, fontsize=(y1 - y0) * 0.72)
+                    changed += 1
+            page.apply_redactions()
+        document.save(out)
+    return changed
+
+
+def scan_page1(path: str, out: str):
+    """Page 1 rendered as a scan without text layer (PNG, or JPEG re-export)"""
+    Image.fromarray(render_first_page(path, SCAN_DPI)).save(out)
+
+
+def text_layer_raw(path: str) -> dict:
+    """Raw OCR of a scan of page 1 as a perfect reader would give it: text lines, boxes in scan pixels"""
+    scale = SCAN_DPI / 72
+    lines = {}
+    with fitz.open(path) as document:
+        for x0, y0, x1, y1, word, block_no, line_no, _ in document[0].get_text("words"):
+            lines.setdefault((block_no, line_no), []).append((x0, y0, x1, y1, word))
+    blocks = []
+    for words in lines.values():
+        x0, y0 = min(w[0] for w in words) * scale, min(w[1] for w in words) * scale
+        x1, y1 = max(w[2] for w in words) * scale, max(w[3] for w in words) * scale
+        blocks.append({"text": " ".join(w[4] for w in words), "confidence": 0.9, "page": 0,
+                       "bbox": [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]})
+    return {"pages": 1, "blocks": blocks}
+
+
+def text_layer_check(raw: dict, path: str) -> dict:
+    """verify_blocks with the PDF behind a scan as the reader: crop = clip rect, reading = its words"""
+    with fitz.open(path) as document:
+        words = document[0].get_text("words")
+
+    def crop(block):
+        xs = [p[0] * 72 / SCAN_DPI for p in block["bbox"]]
+        ys = [p[1] * 72 / SCAN_DPI for p in block["bbox"]]
+        pad = CROP_PADDING * (max(ys) - min(ys))
+        return fitz.Rect(min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad)
+
+    def readtext(rect):
+        return [([[w[0], w[1]], [w[2], w[1]], [w[2], w[3]], [w[0], w[3]]], w[4], 1.0)
+                for w in words if fitz.Point((w[0] + w[2]) / 2, (w[1] + w[3]) / 2) in rect]
+
+    return verify_blocks(raw["blocks"], crop, readtext)
+
+
+def same_template_pair(samples, work: str, easyocr: bool) -> bool:
+    pdfs = [p for p in samples if p.lower().endswith(".pdf") and has_text_layer(p)]
+    if not pdfs:
+        print("\n🧾 same template, different invoice: no text-layer PDF in inputs/, skipped")
+        return True
+    original = pdfs[0]
+    other = os.path.join(work, "other-invoice.pdf")
+    changed = other_invoice(original, other)
+    scans = {name: os.path.join(work, f"{name}") for name in ("original.png", "reexport.jpg", "other.png")}
+    scan_page1(original, scans["original.png"])
+    scan_page1(original, scans["reexport.jpg"])
+    scan_page1(other, scans["other.png"])
+
+    pdf_distance = hamming(compute_phash(original), compute_phash(other))
+    scan_distance = hamming(compute_phash(scans["original.png"]), compute_phash(scans["other.png"]))
+    print(f"\n🧾 same template, different invoice ({changed} fields changed): distance {pdf_distance} as PDF, "
+          f"{scan_distance} as scan (reuse distance {PHASH_REUSE_MAX_DISTANCE}, flag {PHASH_MAX_DISTANCE})")
+    text_layer = has_text_layer(other)
+    print(f"   PDF pair: text layer {'present, OCR reuse never attempted' if text_layer else 'missing'}")
+
+    if easyocr:
+        from facture_ocr import get_ocr_engine
+        engine = get_ocr_engine(('fr', 'en'))
+        raw = engine.ocr_image(scans["original.png"])
+        same = engine.verify_reuse(scans["reexport.jpg"], raw)
+        different = engine.verify_reuse(scans["other.png"], raw)
+        reader = "EasyOCR"
+    else:
+        raw = text_layer_raw(original)
+        same = text_layer_check(raw, original)
+        different = text_layer_check(raw, other)
+        reader = "text layer as reader"
+    print(f"   key-field re-read ({reader}): same invoice re-exported {same['matched']}/{same['compared']} "
+          f"matched in {same['seconds'] * 1000:.0f} ms, other invoice {different['matched']}/{different['compared']} "
+          f"(first mismatch {different['mismatch']})")
+    accepted = same["compared"] > 0 and same["matched"] == same["compared"]
+    refused = different["compared"] == 0 or different["matched"] < different["compared"]
+    return text_layer and accepted and refused
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inputs", default=os.path.join(BASE_DIR, "inputs"))
+    parser.add_argument("--variants", type=int, default=4, help="rescans per sample")
+    parser.add_argument("--stored", type=int, default=200000, help="hashes in the simulated collection")
+    parser.add_argument("--easyocr", action="store_true", help="re-read key fields with the real OCR engine")
+    args = parser.parse_args()
+    rng = random.Random(11)
+    ok = True
+
+    samples = sorted(p for p in glob.glob(os.path.join(args.inputs, "*"))
+                     if p.lower().endswith((".pdf", ".png", ".jpg", ".jpeg")))
+    work = tempfile.mkdtemp(prefix="phash-")
+    try:
+        # 1) Robustness
+        originals = {os.path.basename(p): compute_phash(p) for p in samples}
+        worst_variant = 0
+        print(f"{'sample':28} {'variant':10} {'distance':>8}")
+        for path in samples:
+            name = os.path.basename(path)
+            image = render_first_page(path) if path.lower().endswith(".pdf") else \
+                np.array(Image.open(path).convert("RGB"))
+            for i in range(args.variants):
+                variant = os.path.join(work, f"{i}-{name}.jpg")
+                write_jpeg(rescan(image, rng), variant, quality=rng.randint(55, 90))
+                distance = hamming(originals[name], compute_phash(variant))
+                worst_variant = max(worst_variant, distance)
+                print(f"{name[:28]:28} {'rescan':10} {distance:>8}")
+            exported = os.path.join(work, f"{name}.pdf")
+            write_pdf(image, exported)
+            distance = hamming(originals[name], compute_phash(exported))
+            worst_variant = max(worst_variant, distance)
+            print(f"{name[:28]:28} {'pdf':10} {distance:>8}")
+
+        closest_distinct = min(hamming(a, b) for a, b in combinations(originals.values(), 2))
+        print(f"\n🔁 worst resend distance {worst_variant}, closest distinct pair {closest_distinct} "
+              f"(threshold {PHASH_MAX_DISTANCE})")
+        ok &= worst_variant <= PHASH_MAX_DISTANCE < closest_distinct
+
+        # 2) Same template, different invoice
+        ok &= same_template_pair(samples, work, args.easyocr)
+
+        # 3) Cost per file
+        for path in samples:
+            start = time.perf_counter()
+            for _ in range(10):
+                compute_phash(path)
+            print(f"⏱️ {os.path.basename(path)[:28]:28} {(time.perf_counter() - start) / 10 * 1000:6.1f} ms")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    # 4) Multi-index lookup vs full scan
+    stored = [f"{rng.getrandbits(64):016x}" for _ in range(args.stored)]
+    queries = []
+    for _ in range(200):
+        base = rng.choice(stored)
+        value = int(base, 16)
+        for bit in rng.sample(range(64), rng.randint(0, PHASH_MAX_DISTANCE)):
+            value ^= 1 << bit
+        queries.append(f"{value:016x}")
+    index = defaultdict(list)
+    for position, stored_hash in enumerate(stored):
+        for key in phash_bands(stored_hash):
+            index[key].append(position)
+
+    start = time.perf_counter()
+    scan_hits = [{i for i, h in enumerate(stored) if hamming(q, h) <= PHASH_MAX_DISTANCE} for q in queries[:20]]
+    scan_ms = (time.perf_counter() - start) / 20 * 1000
+
+    start = time.perf_counter()
+    touched = 0
+    mih_hits = []
+    for query in queries:
+        candidates = {i for key in candidate_bands(query) for i in index.get(key, ())}
+        touched += len(candidates)
+        mih_hits.append({i for i in candidates if hamming(query, stored[i]) <= PHASH_MAX_DISTANCE})
+    mih_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+    same = all(a == b for a, b in zip(scan_hits, mih_hits))
+    print(f"\n🔎 {args.stored} stored hashes: full scan {scan_ms:.1f} ms/query, multi-index "
+          f"{mih_ms:.3f} ms/query, {touched / len(queries):.1f} candidates checked per query, "
+          f"{len(candidate_bands(queries[0]))} band keys per query")
+    ok &= same and all(mih_hits)
+    print("✅ near-duplicate checks passed" if ok else "❌ near-duplicate check failed")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Raw OCR artifact store: size, round trip and parallel reparse throughput
+
+Builds --count synthetic raw OCR results from the golden invoice texts
+(parser_golden.json, one block per line with EasyOCR-like boxes and
+confidences) in a temporary store, then:
+1. size of the compressed columnar artifacts vs. the JSON raw layer of the OCR cache
+2. round trip: texts and pages exact, boxes within 0.5 px, confidences within 1e-4
+3. `reparse` over the whole store: fields must equal a direct extraction of the
+   original text; reports artifacts/second per worker count
+
+Usage (from erp-facturation/):
+    python benchmarks/bench_ocr_artifacts.py --count 3000 --workers 1 4
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "backend"))
+
+from facture_fields import FactureFieldExtractor  # noqa: E402
+from ocr_artifacts import OCRArtifactStore, reparse, summarize_raw  # noqa: E402
+from ocr_cache import hash_file_bytes  # noqa: E402
+
+GOLDEN_PATH = os.path.join(BENCH_DIR, "parser_golden.json")
+
+
+def synthetic_raw(text: str, rng: random.Random) -> dict:
+    blocks = []
+    y = 40.0
+    for index, line in enumerate(text.splitlines()):
+        x0, height = rng.uniform(30, 200), rng.uniform(18, 30)
+        x1 = x0 + 9.5 * max(len(line), 1)
+        page = index // 40
+        blocks.append({
+            "text": line,
+            "bbox": [[x0, y], [x1, y], [x1, y + height], [x0, y + height]],
+            "confidence": rng.uniform(0.35, 0.99),
+            "page": page
+        })
+        y = y + height + rng.uniform(4, 12) if index % 40 != 39 else 40.0
+    return {"pages": (len(blocks) - 1) // 40 + 1, "blocks": blocks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=3000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        texts = [case["text"] for case in json.load(f)]
+    rng = random.Random(3)
+    extractor = FactureFieldExtractor()
+    store_dir = tempfile.mkdtemp(prefix="ocr-artifacts-")
+    ok = True
+    try:
+        store = OCRArtifactStore(store_dir)
+        expected = {}
+        json_bytes = 0
+        max_box_error = max_confidence_error = 0.0
+        start = time.perf_counter()
+        for i in range(args.count):
+            # Vary the text a little so every artifact is a distinct invoice
+            text = texts[i % len(texts)] + f"\nRéf. interne {i:06d}"
+            raw = synthetic_raw(text, rng)
+            file_hash = hash_file_bytes(text.encode("utf-8"))
+            store.put(file_hash, raw)
+            json_bytes += len(json.dumps(raw, ensure_ascii=False).encode("utf-8"))
+            expected[file_hash] = extractor.extract(summarize_raw(raw)[0])
+
+            if i < 200:
+                decoded = store.get(file_hash)
+                same_text = [b["text"] for b in decoded["blocks"]] == [b["text"] for b in raw["blocks"]]
+                same_pages = [b["page"] for b in decoded["blocks"]] == [b["page"] for b in raw["blocks"]]
+                ok &= same_text and same_pages and decoded["pages"] == raw["pages"]
+                for original, restored in zip(raw["blocks"], decoded["blocks"]):
+                    max_box_error = max(max_box_error, *(abs(a - b) for p, q in zip(original["bbox"], restored["bbox"])
+                                                         for a, b in zip(p, q)))
+                    max_confidence_error = max(max_confidence_error, abs(original["confidence"] - restored["confidence"]))
+        write_seconds = time.perf_counter() - start
+
+        stats = store.stats()
+        ok &= max_box_error <= 0.5 and max_confidence_error <= 1e-4
+        report = {
+            "artifacts": stats["artifacts"],
+            "size": {
+                "json_raw_mb": round(json_bytes / 1024 / 1024, 2),
+                "artifacts_mb": stats["size_mb"],
+                "ratio": round(json_bytes / 1024 / 1024 / stats["size_mb"], 1) if stats["size_mb"] else None
+            },
+            "write_ms_per_artifact": round(write_seconds / args.count * 1000, 3),
+            "round_trip": {"max_box_error_px": round(max_box_error, 3),
+                           "max_confidence_error": round(max_confidence_error, 6)},
+            "reparse": []
+        }
+
+        for workers in args.workers:
+            output = os.path.join(store_dir, f"reparsed-{workers}.jsonl")
+            result = reparse(store, workers, output)
+            mismatches = 0
+            with open(output, encoding="utf-8") as f:
+                for line in f:
+                    row = json.loads(line)
+                    fields = {k: row[k] for k in expected[row["file_hash"]]}
+                    mismatches += fields != expected[row["file_hash"]]
+            ok &= mismatches == 0 and result["failed"] == 0
+            report["reparse"].append({
+                "workers": workers,
+                "seconds": result["seconds"],
+                "artifacts_per_second": result["artifacts_per_second"],
+                "field_mismatches": mismatches
+            })
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    print("✅ artifacts round-trip and reparse identical" if ok else "❌ artifact check failed")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
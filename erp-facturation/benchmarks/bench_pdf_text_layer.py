@@ -0,0 +1,107 @@
+"""
+Benchmark: PDF text-layer fast path vs. full rasterization + OCR
+
+Compares, for every PDF of inputs/:
+- legacy: render each page at 300 DPI, PNG encode/decode through PIL, EasyOCR
+- fast:   PyMuPDF text layer per page, OCR only for pages without text
+          (rendered straight from pixmap samples to NumPy)
+
+Usage (from erp-facturation/):
+    python benchmarks/bench_pdf_text_layer.py
+    python benchmarks/bench_pdf_text_layer.py --skip-ocr   # rasterization cost only
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+
+import fitz
+import numpy as np
+from PIL import Image
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "backend"))
+
+os.environ.setdefault("OCR_CACHE_ENABLED", "false")  # measure real work, not cache hits
+
+from facture_ocr import FactureOCREasyOCR, get_ocr_engine  # noqa: E402
+
+
+def legacy_pages(pdf_bytes: bytes):
+    """Old _pdf_to_images: 300 DPI render + PNG round trip"""
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    images = []
+    for page in doc:
+        pix = page.get_pixmap(matrix=fitz.Matrix(300 / 72, 300 / 72))
+        images.append(np.array(Image.open(io.BytesIO(pix.tobytes("png")))))
+    doc.close()
+    return images
+
+
+def run_legacy(pdf_bytes: bytes, engine) -> int:
+    blocks = 0
+    for img in legacy_pages(pdf_bytes):
+        if engine is not None:
+            blocks += len(engine.reader.readtext(img))
+    return blocks
+
+
+def run_fast(pdf_bytes: bytes, ocr: FactureOCREasyOCR, skip_ocr: bool) -> int:
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    blocks = 0
+    for idx, page in enumerate(doc):
+        page_blocks = ocr._page_text_blocks(page, idx)
+        if not page_blocks:
+            img = ocr._render_page(page)
+            if not skip_ocr:
+                page_blocks = ocr._readtext_blocks(img, idx)
+        blocks += len(page_blocks)
+    doc.close()
+    return blocks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inputs", default=os.path.join(BASE_DIR, "inputs"))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-ocr", action="store_true", help="only measure rendering / text extraction")
+    args = parser.parse_args()
+
+    if args.skip_ocr:
+        # Text-layer helpers don't need the EasyOCR models
+        ocr = FactureOCREasyOCR.__new__(FactureOCREasyOCR)
+        engine = None
+    else:
+        ocr = get_ocr_engine(('fr', 'en'))
+        engine = ocr
+
+    pdfs = sorted(glob.glob(os.path.join(args.inputs, "*.pdf")))
+    if not pdfs:
+        print(f"No PDF found in {args.inputs}")
+        return
+
+    print(f"{'file':40} {'pages':>5} {'legacy (s)':>11} {'fast (s)':>9} {'speedup':>8}")
+    for path in pdfs:
+        with open(path, "rb") as f:
+            pdf_bytes = f.read()
+        pages = len(fitz.open(stream=pdf_bytes, filetype="pdf"))
+
+        legacy_times, fast_times = [], []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            run_legacy(pdf_bytes, engine)
+            legacy_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            run_fast(pdf_bytes, ocr, args.skip_ocr)
+            fast_times.append(time.perf_counter() - start)
+
+        legacy_t, fast_t = min(legacy_times), min(fast_times)
+        print(f"{os.path.basename(path)[:40]:40} {pages:>5} {legacy_t:>11.3f} {fast_t:>9.3f} "
+              f"{legacy_t / fast_t if fast_t else float('inf'):>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""
+Benchmark: the whole invoice pipeline over inputs/, stage by stage
+
+Every sample (PDF / PNG / JPG) goes through the same steps as a real upload:
+    decode      read the file, open the PDF / decode the image to RGB
+    text_layer  PDF only: look for a usable text layer on each page
+    rasterize   PDF only: render the pages without text layer
+    preprocess  downscale / grayscale / deskew (ocr_preprocess)
+    detect      EasyOCR text detection (CRAFT)
+    recognize   EasyOCR text recognition
+    refine      second pass on low-confidence key-field blocks (ocr_refine)
+    parse       field extraction (FactureFieldExtractor, no LLM)
+    validate    comparison with a PO built from the golden values (no LLM, no DB)
+and each stage reports wall time, CPU time (all threads of the process) and
+peak RSS. Extracted fields are scored against golden.json.
+
+Peak RSS is per stage on Linux (the high-water mark is reset through
+/proc/self/clear_refs before each stage); elsewhere it is the process peak so far.
+
+Results can be written as JSON (--output) and compared with a previous run
+(--compare) to see what an OCR change did to each stage.
+
+Usage (from erp-facturation/):
+    python benchmarks/bench_pipeline.py --repeat 3 --output before.json
+    python benchmarks/bench_pipeline.py --repeat 3 --output after.json --compare before.json
+"""
+import argparse
+import glob
+import io
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+from PIL import Image
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "backend"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["OCR_CACHE_ENABLED"] = "false"      # measure real OCR, not cache hits
+os.environ["OCR_ARTIFACTS_ENABLED"] = "false"
+os.environ["RAPIDAPI_KEY"] = ""                # regex parsing only (kept empty so .env does not refill it)
+
+import fitz  # noqa: E402
+from easyocr.utils import reformat_input  # noqa: E402
+from facture_ocr import get_ocr_engine  # noqa: E402
+from facture_validator import FactureValidator  # noqa: E402
+from ocr_preprocess import map_points_back, preprocess_image  # noqa: E402
+from ocr_refine import image_crop, pdf_crop, refine_blocks  # noqa: E402
+from golden import GOLDEN_PATH, load_golden, score_fields  # noqa: E402
+
+STAGES = ["decode", "text_layer", "rasterize", "preprocess", "detect", "recognize", "refine", "parse", "validate"]
+SAMPLE_PATTERNS = ("*.pdf", "*.png", "*.jpg", "*.jpeg")
+
+
+# ==================== MEASUREMENT ====================
+
+def _proc_status_mb(key: str):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(key + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    """Reset VmHWM to the current RSS (Linux >= 4.0); False when not possible"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb() -> float:
+    peak = _proc_status_mb("VmHWM")
+    if peak is not None:
+        return peak
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+class StageMeter:
+    """Accumulates wall / CPU time and peak RSS per stage for one document run"""
+
+    per_stage_peak = _reset_peak_rss()
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        if self.per_stage_peak:
+            _reset_peak_rss()
+        rss_before = _proc_status_mb("VmRSS")
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            peak = _peak_rss_mb()
+            entry = self.stages.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "peak_rss_mb": 0.0,
+                                                  "rss_growth_mb": 0.0, "calls": 0})
+            entry["wall_s"] += wall
+            entry["cpu_s"] += cpu
+            entry["peak_rss_mb"] = max(entry["peak_rss_mb"], peak)
+            if rss_before is not None:
+                entry["rss_growth_mb"] = max(entry["rss_growth_mb"], peak - rss_before)
+            entry["calls"] += 1
+
+
+# ==================== PIPELINE ====================
+
+def golden_po(expected: dict) -> dict:
+    """A PO that agrees with the golden values (same shape as po_lookup.map_po_fields)"""
+    return {
+        "purchase_order_id": expected.get("numero_po") or "BENCH-PO",
+        "type_achat": expected.get("type_achat"),
+        "quantite": expected.get("quantite"),
+        "unite": expected.get("unite"),
+        "prix_estime": expected.get("montant_ttc"),
+        "montant_ht": expected.get("montant_ht"),
+        "montant_tva": expected.get("montant_tva"),
+        "montant_ttc": expected.get("montant_ttc"),
+        "devise": expected.get("devise", "TND"),
+        "fournisseur": {"nom": expected.get("fournisseur_nom") or ""},
+        "items": []
+    }
+
+
+def ocr_blocks(engine, meter: StageMeter, image: np.ndarray, page: int, crop=None) -> list:
+    """Same as FactureOCREasyOCR._readtext_blocks, with detection and recognition timed apart"""
+    with meter.stage("preprocess"):
+        processed, transform = preprocess_image(image, engine.preprocess_config)
+    with meter.stage("detect"):
+        img, img_cv_grey = reformat_input(processed)
+        horizontal_list, free_list = engine.reader.detect(img, reformat=False)
+    with meter.stage("recognize"):
+        result = engine.reader.recognize(img_cv_grey, horizontal_list[0], free_list[0], reformat=False)
+    blocks = [
+        {"text": text, "bbox": map_points_back(bbox, transform), "confidence": float(confidence), "page": page}
+        for (bbox, text, confidence) in result
+    ]
+    with meter.stage("refine"):
+        refine_blocks(blocks, crop or (lambda bbox: image_crop(image, bbox)), engine._recognize_crop)
+    return blocks
+
+
+def run_document(engine, validator: FactureValidator, path: str, expected: dict) -> dict:
+    meter = StageMeter()
+    name = os.path.basename(path)
+
+    with meter.stage("decode"):
+        with open(path, "rb") as f:
+            data = f.read()
+        if engine._is_pdf(data):
+            document = fitz.open(stream=data, filetype="pdf")
+            image = None
+        else:
+            document = None
+            image = np.array(Image.open(io.BytesIO(data)).convert("RGB"))
+
+    blocks, pages = [], 1
+    if document is not None:
+        pages = len(document)
+        try:
+            for index, page in enumerate(document):
+                with meter.stage("text_layer"):
+                    page_blocks = engine._page_text_blocks(page, index)
+                if not page_blocks:
+                    with meter.stage("rasterize"):
+                        rendered = engine._render_page(page)
+                    page_blocks = ocr_blocks(engine, meter, rendered, index,
+                                             crop=lambda bbox, page=page: pdf_crop(page, bbox, engine.PDF_OCR_DPI))
+                blocks.extend(page_blocks)
+        finally:
+            document.close()
+    else:
+        blocks = ocr_blocks(engine, meter, image, 0)
+
+    with meter.stage("parse"):
+        fields = engine.parse_raw({"pages": pages, "blocks": blocks}, file_hash=name)
+    with meter.stage("validate"):
+        po = golden_po(expected)
+        validation = validator.validate_against_po(fields, po["purchase_order_id"], po=po)
+
+    return {
+        "stages": meter.stages,
+        "pages": pages,
+        "blocks": len(blocks),
+        "fields": {k: fields.get(k) for k in expected},
+        "score": score_fields(expected, fields),
+        "validation_confidence": validation.get("confidence_score")
+    }
+
+
+# ==================== REPORT ====================
+
+def summarize_runs(runs: list) -> dict:
+    """Median wall / CPU time over the repeats, max peak RSS"""
+    stages = {}
+    for stage in STAGES:
+        measured = [run["stages"][stage] for run in runs if stage in run["stages"]]
+        if not measured:
+            continue
+        stages[stage] = {
+            "wall_s": round(statistics.median(m["wall_s"] for m in measured), 4),
+            "cpu_s": round(statistics.median(m["cpu_s"] for m in measured), 4),
+            "peak_rss_mb": round(max(m["peak_rss_mb"] for m in measured), 1),
+            "rss_growth_mb": round(max(m["rss_growth_mb"] for m in measured), 1),
+            "calls": measured[0]["calls"]
+        }
+    last = runs[-1]
+    return {
+        "pages": last["pages"],
+        "blocks": last["blocks"],
+        "stages": stages,
+        "wall_s": round(sum(s["wall_s"] for s in stages.values()), 4),
+        "cpu_s": round(sum(s["cpu_s"] for s in stages.values()), 4),
+        "accuracy": {"matched": last["score"]["matched"], "total": last["score"]["total"],
+                     "fields": last["score"]["fields"]},
+        "extracted": last["fields"],
+        "validation_confidence": last["validation_confidence"]
+    }
+
+
+def totals(documents: dict) -> dict:
+    stages = {}
+    for document in documents.values():
+        for stage, values in document["stages"].items():
+            total = stages.setdefault(stage, {"wall_s": 0.0, "cpu_s": 0.0, "peak_rss_mb": 0.0})
+            total["wall_s"] = round(total["wall_s"] + values["wall_s"], 4)
+            total["cpu_s"] = round(total["cpu_s"] + values["cpu_s"], 4)
+            total["peak_rss_mb"] = max(total["peak_rss_mb"], values["peak_rss_mb"])
+
+    per_field = {}
+    for document in documents.values():
+        for field, ok in document["accuracy"]["fields"].items():
+            counts = per_field.setdefault(field, [0, 0])
+            counts[0] += ok
+            counts[1] += 1
+    matched = sum(d["accuracy"]["matched"] for d in documents.values())
+    total = sum(d["accuracy"]["total"] for d in documents.values())
+    return {
+        "stages": {stage: stages[stage] for stage in STAGES if stage in stages},
+        "wall_s": round(sum(d["wall_s"] for d in documents.values()), 4),
+        "cpu_s": round(sum(d["cpu_s"] for d in documents.values()), 4),
+        "accuracy": {
+            "matched": matched,
+            "total": total,
+            "rate": round(matched / total, 4) if total else None,
+            "per_field": {field: f"{ok}/{n}" for field, (ok, n) in sorted(per_field.items())}
+        }
+    }
+
+
+def environment(engine, repeat: int) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    import easyocr
+    import torch
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "easyocr": easyocr.__version__,
+        "torch": torch.__version__,
+        "pdf_ocr_dpi": engine.PDF_OCR_DPI,
+        "preprocess": engine.preprocess_config.as_dict(),
+        "repeat": repeat,
+        "per_stage_peak_rss": StageMeter.per_stage_peak
+    }
+
+
+def print_report(report: dict, previous: dict = None):
+    print(f"\n{'file':26} {'stage':11} {'wall (s)':>9} {'cpu (s)':>9} {'peak MB':>8} {'fields':>7}")
+    for name, document in report["documents"].items():
+        accuracy = document["accuracy"]
+        for i, (stage, values) in enumerate(document["stages"].items()):
+            label = name[:26] if i == 0 else ""
+            score = f"{accuracy['matched']}/{accuracy['total']}" if i == 0 else ""
+            print(f"{label:26} {stage:11} {values['wall_s']:>9.3f} {values['cpu_s']:>9.3f} "
+                  f"{values['peak_rss_mb']:>8.0f} {score:>7}")
+
+    summary = report["totals"]
+    print(f"\n{'TOTAL':26} {'stage':11} {'wall (s)':>9} {'cpu (s)':>9} {'peak MB':>8} {'Δ wall':>9}")
+    before = (previous or {}).get("totals", {}).get("stages", {})
+    for stage, values in summary["stages"].items():
+        delta = ""
+        if stage in before and before[stage]["wall_s"]:
+            delta = f"{(values['wall_s'] / before[stage]['wall_s'] - 1) * 100:+.0f}%"
+        print(f"{'':26} {stage:11} {values['wall_s']:>9.3f} {values['cpu_s']:>9.3f} "
+              f"{values['peak_rss_mb']:>8.0f} {delta:>9}")
+    print(f"{'':26} {'all':11} {summary['wall_s']:>9.3f} {summary['cpu_s']:>9.3f}")
+    accuracy = summary["accuracy"]
+    line = f"\n🎯 Golden fields: {accuracy['matched']}/{accuracy['total']}"
+    if previous:
+        old = previous["totals"]["accuracy"]
+        line += f" (before: {old['matched']}/{old['total']})"
+    print(line)
+    print(f"⏱️ Model load: {report['setup']['model_load_s']:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inputs", default=os.path.join(BASE_DIR, "inputs"))
+    parser.add_argument("--golden", default=GOLDEN_PATH)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per file (medians are reported)")
+    parser.add_argument("--warmup", action="store_true", help="one untimed run of the first file before measuring")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--compare", help="previous JSON results to compare with")
+    parser.add_argument("--verbose", action="store_true", help="keep the pipeline's own logs")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    golden = load_golden(args.golden)
+    paths = sorted({p for pattern in SAMPLE_PATTERNS for p in glob.glob(os.path.join(args.inputs, pattern))})
+    if not paths:
+        sys.exit(f"❌ No samples in {args.inputs}")
+
+    start = time.perf_counter()
+    engine = get_ocr_engine(('fr', 'en'))
+    model_load_s = time.perf_counter() - start
+    validator = FactureValidator(po_collection=None)
+
+    if args.warmup:
+        run_document(engine, validator, paths[0], golden.get(os.path.basename(paths[0]), {}))
+
+    documents = {}
+    for path in paths:
+        name = os.path.basename(path)
+        expected = golden.get(name, {})
+        runs = [run_document(engine, validator, path, expected) for _ in range(max(1, args.repeat))]
+        documents[name] = summarize_runs(runs)
+
+    report = {
+        "environment": environment(engine, args.repeat),
+        "setup": {"model_load_s": round(model_load_s, 3)},
+        "documents": documents,
+        "totals": totals(documents)
+    }
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+    print_report(report, previous)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
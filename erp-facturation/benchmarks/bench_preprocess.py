@@ -0,0 +1,86 @@
+"""
+Benchmark: image preprocessing ahead of EasyOCR, time vs. field accuracy
+
+Runs every image of inputs/ through OCR + parsing with several preprocessing
+settings and reports OCR time and the number of golden fields (golden.json)
+extracted correctly, so speed can be traded against accuracy knowingly.
+
+Usage (from erp-facturation/):
+    python benchmarks/bench_preprocess.py
+    python benchmarks/bench_preprocess.py --camera   # upscale samples to ~4000px like phone photos
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "backend"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["OCR_CACHE_ENABLED"] = "false"  # measure real OCR, not cache hits
+os.environ.pop("RAPIDAPI_KEY", None)       # regex parsing only: the LLM would mask accuracy changes
+
+from facture_ocr import get_ocr_engine  # noqa: E402
+from ocr_preprocess import PreprocessConfig  # noqa: E402
+from golden import load_golden, score_fields  # noqa: E402
+
+VARIANTS = {
+    "off": dict(enabled=False),
+    "gray": dict(enabled=True, deskew=False, crop_to_text=False, target_text_height=10_000, max_side=100_000),
+    "default": dict(enabled=True),
+    "default+crop": dict(enabled=True, crop_to_text=True),
+    "aggressive": dict(enabled=True, crop_to_text=True, target_text_height=20, max_side=1600),
+}
+
+
+def load_image_bytes(path: str, camera: bool) -> bytes:
+    with open(path, "rb") as f:
+        data = f.read()
+    if not camera:
+        return data
+    image = np.array(Image.open(io.BytesIO(data)).convert("RGB"))
+    scale = 4000 / max(image.shape[:2])
+    image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inputs", default=os.path.join(BASE_DIR, "inputs"))
+    parser.add_argument("--camera", action="store_true", help="simulate 4000px phone photos")
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="comma-separated variant names")
+    args = parser.parse_args()
+
+    golden = load_golden()
+    engine = get_ocr_engine(('fr', 'en'))
+    paths = sorted(glob.glob(os.path.join(args.inputs, "*.png")) + glob.glob(os.path.join(args.inputs, "*.jpg")))
+    images = {os.path.basename(p): load_image_bytes(p, args.camera) for p in paths}
+
+    print(f"{'variant':14} {'file':16} {'ocr (s)':>8} {'fields':>7}")
+    for name in args.variants.split(","):
+        engine.preprocess_config = PreprocessConfig(**VARIANTS[name])
+        total_time, matched, total = 0.0, 0, 0
+        for filename, data in images.items():
+            start = time.perf_counter()
+            raw = engine.ocr_image(data)
+            elapsed = time.perf_counter() - start
+            fields = engine.parse_raw(raw, file_hash=filename)
+            score = score_fields(golden.get(filename, {}), fields)
+            total_time += elapsed
+            matched += score["matched"]
+            total += score["total"]
+            print(f"{name:14} {filename[:16]:16} {elapsed:>8.2f} {score['matched']:>3}/{score['total']:<3}")
+        print(f"{name:14} {'TOTAL':16} {total_time:>8.2f} {matched:>3}/{total:<3}\n")
+
+
+if __name__ == "__main__":
+    main()
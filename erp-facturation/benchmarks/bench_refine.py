@@ -0,0 +1,99 @@
+"""
+Benchmark: selective re-OCR of low-confidence key fields vs. full-page high resolution
+
+Runs every sample of inputs/ through OCR + parsing three ways:
+    base      page pass only (OCR_REFINE off)
+    refine    page pass + second pass on the low-confidence key-field blocks
+    full-hd   page pass only, whole page at high resolution (PDF at
+              OCR_REFINE_PDF_DPI, images without downscaling)
+and reports OCR time, blocks re-read / improved and the golden fields
+(golden.json) extracted correctly.
+
+Usage (from erp-facturation/):
+    python benchmarks/bench_refine.py
+    python benchmarks/bench_refine.py --degrade   # half-resolution JPEG q40 copies: more doubtful blocks
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "backend"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["OCR_CACHE_ENABLED"] = "false"      # measure real OCR, not cache hits
+os.environ["OCR_ARTIFACTS_ENABLED"] = "false"
+os.environ["RAPIDAPI_KEY"] = ""                # regex parsing only
+
+import ocr_refine  # noqa: E402
+from facture_ocr import get_ocr_engine  # noqa: E402
+from ocr_preprocess import PreprocessConfig  # noqa: E402
+from golden import load_golden, score_fields  # noqa: E402
+
+
+def degrade(path: str, directory: str) -> str:
+    if path.lower().endswith(".pdf"):
+        return path
+    image = Image.open(path).convert("RGB")
+    image = image.resize((image.width // 2, image.height // 2), Image.BILINEAR)
+    target = os.path.join(directory, os.path.basename(path))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=40)
+    with open(target, "wb") as f:
+        f.write(buffer.getvalue())
+    return target
+
+
+def run(engine, paths, golden, mode: str):
+    ocr_refine.REFINE_ENABLED = mode == "refine"
+    if mode == "full-hd":
+        engine.preprocess_config = PreprocessConfig(target_text_height=10_000, max_side=100_000)
+        engine.PDF_OCR_DPI = ocr_refine.REFINE_PDF_DPI
+    else:
+        engine.preprocess_config = PreprocessConfig()
+        engine.PDF_OCR_DPI = type(engine).PDF_OCR_DPI
+
+    total_time, matched, total, refined = 0.0, 0, 0, 0
+    for name, path in paths.items():
+        start = time.perf_counter()
+        raw = engine._run_ocr_file(path)
+        elapsed = time.perf_counter() - start
+        fields = engine.parse_raw(raw, file_hash=name)
+        score = score_fields(golden.get(name, {}), fields)
+        improved = sum(1 for block in raw["blocks"] if "refined_from" in block)
+        total_time += elapsed
+        matched += score["matched"]
+        total += score["total"]
+        refined += improved
+        print(f"{mode:8} {name[:26]:26} {elapsed:>8.2f} {improved:>8} {score['matched']:>3}/{score['total']:<3}")
+    print(f"{mode:8} {'TOTAL':26} {total_time:>8.2f} {refined:>8} {matched:>3}/{total:<3}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inputs", default=os.path.join(BASE_DIR, "inputs"))
+    parser.add_argument("--degrade", action="store_true")
+    parser.add_argument("--modes", default="base,refine,full-hd")
+    args = parser.parse_args()
+
+    golden = load_golden()
+    engine = get_ocr_engine(('fr', 'en'))
+    work = tempfile.mkdtemp(prefix="refine-")
+    paths = {}
+    for path in sorted(glob.glob(os.path.join(args.inputs, "*"))):
+        if path.lower().endswith((".pdf", ".png", ".jpg", ".jpeg")):
+            paths[os.path.basename(path)] = degrade(path, work) if args.degrade else path
+
+    print(f"{'mode':8} {'file':26} {'ocr (s)':>8} {'refined':>8} {'fields':>7}")
+    for mode in args.modes.split(","):
+        run(engine, paths, golden, mode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Fuzzy matching benchmark: similarity.py vs difflib.SequenceMatcher on noisy OCR names
+
+Synthetic supplier master (--suppliers names), each queried through an OCR-like
+corruption (0/O, 1/l, 5/S, dropped or doubled characters, split words, accents lost).
+
+- pairwise:  noisy name vs its true name and vs a random other name, timing and
+             decision at the 0.85 threshold (true pairs should pass, others fail)
+- short:     regression on short field values (units, purchase types, cost
+             centres, "abc"/"abcd"): the decision at 0.85 must be the same as
+             SequenceMatcher's for every pair (exit 1 otherwise)
+- lookup:    resolve every noisy name against the whole master; SequenceMatcher
+             scans every supplier, SupplierIndex shortlists by trigrams then
+             ranks with bounded_similarity. Top-1 accuracy and time/query.
+
+Usage (from erp-facturation/):
+    python benchmarks/bench_similarity.py --suppliers 5000 --queries 500
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from difflib import SequenceMatcher
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "backend"))
+
+from similarity import SupplierIndex, bounded_similarity, normalize_text  # noqa: E402
+
+THRESHOLD = 0.85
+WORDS = ["societe", "alpha", "beta", "gamma", "tunisie", "industrie", "informatique", "services", "medical",
+         "equipements", "bureautique", "distribution", "generale", "nord", "sud", "sahel", "technologies",
+         "materiaux", "construction", "import", "export", "electricite", "papeterie", "mobilier", "securite"]
+FORMS = ["SARL", "SA", "SUARL", "& Cie", "Group", ""]
+OCR_SWAPS = {"o": "0", "l": "1", "s": "5", "e": "é", "i": "l", "b": "8", "g": "q", "m": "rn"}
+
+
+def make_suppliers(count: int, rng: random.Random):
+    names = set()
+    while len(names) < count:
+        words = rng.sample(WORDS, rng.randint(2, 4))
+        names.add(" ".join(w.capitalize() for w in words) + (" " + rng.choice(FORMS)).rstrip())
+    return [(f"SUP-{i:05d}", name) for i, name in enumerate(sorted(names))]
+
+
+def ocr_noise(name: str, rng: random.Random) -> str:
+    chars = list(name)
+    for _ in range(max(1, len(chars) // 15)):
+        position = rng.randrange(len(chars))
+        roll = rng.random()
+        if roll < 0.5 and chars[position].lower() in OCR_SWAPS:
+            chars[position] = OCR_SWAPS[chars[position].lower()]
+        elif roll < 0.7:
+            del chars[position]
+        elif roll < 0.85:
+            chars.insert(position, chars[position])
+        else:
+            chars.insert(position, " ")
+    return "".join(chars)
+
+
+def seq_ratio(a: str, b: str) -> float:
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def bench_pairwise(suppliers, queries, rng):
+    pairs = []
+    for supplier_id, noisy in queries:
+        true_name = suppliers[supplier_id]
+        other = rng.choice(list(suppliers.values()))
+        pairs.append((normalize_text(noisy), normalize_text(true_name), True))
+        if other != true_name:
+            pairs.append((normalize_text(noisy), normalize_text(other), False))
+
+    agreement = sum((seq_ratio(a, b) >= THRESHOLD) == (bounded_similarity(a, b, THRESHOLD) >= THRESHOLD)
+                    for a, b, _ in pairs)
+    result = {"same_decision_as_sequence_matcher": round(agreement / len(pairs), 4)}
+    for label, fn in (("sequence_matcher", seq_ratio),
+                      ("bounded_lcs", lambda a, b: bounded_similarity(a, b, THRESHOLD))):
+        start = time.perf_counter()
+        decisions = [(fn(a, b) >= THRESHOLD) == expected for a, b, expected in pairs]
+        elapsed = time.perf_counter() - start
+        result[label] = {
+            "pairs": len(pairs),
+            "us_per_pair": round(elapsed / len(pairs) * 1e6, 2),
+            "correct_decisions": round(sum(decisions) / len(pairs), 4)
+        }
+    return result
+
+
+SHORT_VALUES = ["kg", "kgs", "g", "t", "piece", "pieces", "pce", "unite", "u", "litre", "l", "metre", "m", "m2",
+                "m3", "boite", "carton", "lot", "cc-100", "cc-101", "cc-210", "informatique", "fournitures",
+                "services", "service", "materiel", "consommable", "travaux", "achat direct", "ton", "tonne"]
+SHORT_PAIRS = [("abc", "abcd"), ("abcd", "abxd"), ("kg", "kgs"), ("piece", "pieces"), ("cc 100", "cc 10o")]
+
+
+def bench_short(rng):
+    pairs = list(SHORT_PAIRS)
+    for value in SHORT_VALUES:
+        pairs += [(value, normalize_text(ocr_noise(value, rng))) for _ in range(20)]
+        pairs += [(value, other) for other in SHORT_VALUES if other != value]
+    disagreements = [
+        {"a": a, "b": b, "sequence_matcher": round(seq_ratio(a, b), 4), "bounded": round(bounded_similarity(a, b), 4)}
+        for a, b in pairs
+        if (seq_ratio(a, b) >= THRESHOLD) != (bounded_similarity(a, b, THRESHOLD) >= THRESHOLD)
+    ]
+    return {"pairs": len(pairs), "disagreements": len(disagreements), "examples": disagreements[:10]}
+
+
+def bench_lookup(supplier_list, queries, limit):
+    queries = queries[:limit]
+    normalized_master = [(supplier_id, normalize_text(name)) for supplier_id, name in supplier_list]
+
+    start = time.perf_counter()
+    correct = 0
+    for supplier_id, noisy in queries:
+        query = normalize_text(noisy)
+        best = max(normalized_master, key=lambda item: seq_ratio(query, item[1]))
+        correct += best[0] == supplier_id
+    scan_elapsed = time.perf_counter() - start
+    scan = {"us_per_query": round(scan_elapsed / len(queries) * 1e6, 1), "top1_accuracy": round(correct / len(queries), 4)}
+
+    start = time.perf_counter()
+    index = SupplierIndex(supplier_list)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    correct = resolved = 0
+    for supplier_id, noisy in queries:
+        matches = index.top_k(noisy, k=3, cutoff=THRESHOLD)
+        resolved += bool(matches)
+        correct += bool(matches) and matches[0]["supplier_id"] == supplier_id
+    index_elapsed = time.perf_counter() - start
+    indexed = {
+        "us_per_query": round(index_elapsed / len(queries) * 1e6, 1),
+        "top1_accuracy": round(correct / len(queries), 4),
+        "resolved_above_threshold": round(resolved / len(queries), 4),
+        "build_seconds": round(build_seconds, 3)
+    }
+    return {"queries": len(queries), "sequence_matcher_scan": scan, "trigram_index": indexed,
+            "speedup": round(scan["us_per_query"] / indexed["us_per_query"], 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suppliers", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--scan-queries", type=int, default=20, help="Queries for the (slow) full SequenceMatcher scan")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    supplier_list = make_suppliers(args.suppliers, rng)
+    suppliers = dict(supplier_list)
+    queries = [(supplier_id, ocr_noise(suppliers[supplier_id], rng))
+               for supplier_id in rng.sample(list(suppliers), min(args.queries, len(suppliers)))]
+
+    report = {
+        "suppliers": len(supplier_list),
+        "pairwise": bench_pairwise(suppliers, queries, rng),
+        "short": bench_short(rng),
+        "lookup": bench_lookup(supplier_list, queries, args.scan_queries)
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["short"]["disagreements"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark: OCR worker startup and memory, spawn vs forkserver with preloaded models
+
+For each start method, starts a FactureJobManager pool of --workers processes
+and reports:
+- time from pool start until every worker has its EasyOCR engine
+- per worker: process startup time, whether the models came preloaded, and
+  RSS / PSS / USS (USS = pages no other process shares: what one more worker costs)
+- total PSS of the workers + forkserver (the real memory footprint of the pool)
+then, with --ocr, runs one OCR per worker on a sample from inputs/ (forked
+workers must run inference normally) and reports USS again afterwards.
+
+Usage (from erp-facturation/):
+    python benchmarks/bench_worker_startup.py --workers 2
+    python benchmarks/bench_worker_startup.py --workers 4 --methods forkserver --ocr
+"""
+import argparse
+import glob
+import logging
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "backend"))
+
+os.environ["OCR_CACHE_ENABLED"] = "false"
+os.environ["OCR_ARTIFACTS_ENABLED"] = "false"
+os.environ["RAPIDAPI_KEY"] = ""
+
+from facture_jobs import FactureJobManager, _ocr_image_file, process_memory  # noqa: E402
+
+
+def children(pid: int):
+    """Direct children of a process, from /proc"""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def wait_ready(manager: FactureJobManager, count: int, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        workers = manager.workers()
+        if len(workers) == count and all(w["startup_seconds"] is not None for w in workers):
+            return workers
+        time.sleep(0.05)
+    raise TimeoutError(f"{count} OCR worker(s) not ready after {timeout}s")
+
+
+def run(method: str, args, sample: str):
+    manager = FactureJobManager(pool_size=args.workers, start_method=method)
+    start = time.perf_counter()
+    manager.start()
+    try:
+        workers = wait_ready(manager, args.workers, args.timeout)
+        ready_seconds = time.perf_counter() - start
+
+        print(f"\n🏭 {manager.start_method}: {args.workers} worker(s) ready in {ready_seconds:.2f}s")
+        print(f"{'pid':>8} {'preloaded':>9} {'startup s':>9} {'RSS MB':>8} {'PSS MB':>8} {'USS MB':>8}")
+        for w in workers:
+            print(f"{w['pid']:>8} {str(w['preloaded']):>9} {w['startup_seconds']:>9} "
+                  f"{w['rss_mb']:>8} {w['pss_mb']:>8} {w['uss_mb']:>8}")
+
+        # Pool footprint: workers + the forkserver they were forked from (if any)
+        worker_pids = {w["pid"] for w in workers}
+        pool_pids = set(worker_pids)
+        for pid in children(os.getpid()):
+            if pid not in worker_pids and set(children(pid)) & worker_pids:
+                pool_pids.add(pid)
+        total_pss = sum(process_memory(pid)["pss_mb"] or 0 for pid in pool_pids)
+        print(f"📦 pool PSS {total_pss:.0f} MB over {len(pool_pids)} process(es), "
+              f"mean worker USS {sum(w['uss_mb'] for w in workers) / len(workers):.0f} MB")
+
+        result = {"method": manager.start_method, "ready_seconds": ready_seconds, "pool_pss_mb": total_pss,
+                  "worker_startup": [w["startup_seconds"] for w in workers],
+                  "worker_uss": [w["uss_mb"] for w in workers]}
+        if args.ocr and sample:
+            started = time.perf_counter()
+            futures = [manager._pool.submit(_ocr_image_file, sample) for _ in range(args.workers)]
+            blocks = [len(f.result(timeout=args.timeout)["blocks"]) for f in futures]
+            after = manager.workers()
+            print(f"🔍 {args.workers} OCR run(s) of {os.path.basename(sample)} in "
+                  f"{time.perf_counter() - started:.2f}s ({blocks} blocks), USS after: "
+                  f"{[w['uss_mb'] for w in after]} MB")
+            result["worker_uss_after_ocr"] = [w["uss_mb"] for w in after]
+        return result
+    finally:
+        manager.shutdown()
+        time.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--methods", default="spawn,forkserver")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--ocr", action="store_true", help="run one OCR per worker after startup")
+    parser.add_argument("--inputs", default=os.path.join(BASE_DIR, "inputs"))
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    images = sorted(p for p in glob.glob(os.path.join(args.inputs, "*")) if p.lower().endswith((".png", ".jpg", ".jpeg")))
+    sample = images[0] if images else None
+
+    results = [run(method, args, sample) for method in args.methods.split(",")]
+    if len(results) == 2:
+        a, b = results
+        print(f"\n⚖️ {b['method']} vs {a['method']}: pool ready {a['ready_seconds']:.2f}s -> {b['ready_seconds']:.2f}s, "
+              f"pool PSS {a['pool_pss_mb']:.0f} -> {b['pool_pss_mb']:.0f} MB, "
+              f"worker USS {max(a['worker_uss']):.0f} -> {max(b['worker_uss']):.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
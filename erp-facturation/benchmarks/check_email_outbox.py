@@ -0,0 +1,158 @@
+"""
+Check: background email outbox (connection reuse, retry, dead letters)
+
+Runs the outbox against a fake SMTP server with realistic latencies
+(--connect-ms for connect + STARTTLS + login, --send-ms per message) and checks:
+1. enqueue returns at once; the caller never waits for SMTP
+2. N messages are delivered over a single reused connection
+3. a dropped connection is reopened without losing the message
+4. transient 4xx failures are retried, then delivered
+5. 5xx failures and exhausted retries land in the dead letters with their MIME body
+6. shutdown with a full queue and a hung SMTP server returns within its timeout
+and compares the total time with one SMTP session per email (the previous behavior).
+
+Usage (from erp-facturation/):
+    python benchmarks/check_email_outbox.py --emails 50
+"""
+import argparse
+import os
+import smtplib
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from email_outbox import EmailOutbox  # noqa: E402
+from email_service import build_notification_message  # noqa: E402
+
+
+class FakeSMTP:
+    """Scripted SMTP session: failures keyed by subject"""
+
+    def __init__(self, server: "FakeServer"):
+        self.server = server
+        time.sleep(server.connect_ms / 1000)
+
+    def send_message(self, msg):
+        subject = msg["Subject"]
+        time.sleep(self.server.send_ms / 1000)
+        failure = self.server.failures.get(subject)
+        if failure:
+            self.server.failures[subject] = failure[1:]
+            if failure[0] == "disconnect":
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            raise smtplib.SMTPResponseException(failure[0], b"scripted failure")
+        self.server.delivered.append(subject)
+
+    def quit(self):
+        pass
+
+
+class FakeServer:
+    def __init__(self, connect_ms: float, send_ms: float):
+        self.connect_ms = connect_ms
+        self.send_ms = send_ms
+        self.connections = 0
+        self.delivered = []
+        self.failures = {}
+
+    def connect(self):
+        self.connections += 1
+        return FakeSMTP(self)
+
+
+def wait_idle(outbox: EmailOutbox, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = outbox.stats()
+        if stats["pending"] == 0 and stats["waiting_retry"] == 0 and \
+                stats["sent"] + stats["dead_lettered"] >= stats["queued"]:
+            return
+        time.sleep(0.01)
+
+
+def message(i: int):
+    subject = f"Facture FACT-{i:04d}"
+    return subject, (lambda: build_notification_message("ap@example.com", subject, "<p>" + "x" * 20000 + "</p>", f"FACT-{i:04d}"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=50)
+    parser.add_argument("--connect-ms", type=float, default=150)
+    parser.add_argument("--send-ms", type=float, default=20)
+    args = parser.parse_args()
+    ok = True
+
+    # 1-2) Throughput and connection reuse
+    server = FakeServer(args.connect_ms, args.send_ms)
+    dead = []
+    outbox = EmailOutbox(connect=server.connect, dead_letter=dead.append, configured=lambda: True,
+                         retry_base_seconds=0.05, idle_seconds=5)
+    start = time.perf_counter()
+    enqueue_times = []
+    for i in range(args.emails):
+        subject, build = message(i)
+        t = time.perf_counter()
+        outbox.enqueue("ap@example.com", subject, build)
+        enqueue_times.append(time.perf_counter() - t)
+    wait_idle(outbox)
+    outbox_seconds = time.perf_counter() - start
+    per_session_seconds = args.emails * (args.connect_ms + args.send_ms) / 1000
+    max_enqueue_ms = max(enqueue_times) * 1000
+    print(f"📤 {args.emails} emails: outbox {outbox_seconds:.2f}s over {server.connections} connection(s), "
+          f"one session per email ~{per_session_seconds:.2f}s")
+    print(f"⚡ enqueue: max {max_enqueue_ms:.2f} ms per email")
+    ok &= len(server.delivered) == args.emails and server.connections == 1 and max_enqueue_ms < 10
+
+    # 3-5) Disconnect, transient and permanent failures
+    server.failures = {
+        "Facture FACT-9001": ["disconnect"],
+        "Facture FACT-9002": [421, 451],
+        "Facture FACT-9003": [550],
+        "Facture FACT-9004": [421, 421, 421, 421],
+    }
+    for i in (9001, 9002, 9003, 9004):
+        outbox.enqueue("ap@example.com", *message(i))
+    wait_idle(outbox)
+    outbox.shutdown()
+
+    delivered = set(server.delivered)
+    dead_subjects = {record["subject"]: record for record in dead}
+    checks = {
+        "reconnected after disconnect": "Facture FACT-9001" in delivered,
+        "retried after 4xx": "Facture FACT-9002" in delivered,
+        "5xx dead-lettered at once": dead_subjects.get("Facture FACT-9003", {}).get("attempts") == 1,
+        "retries exhausted": dead_subjects.get("Facture FACT-9004", {}).get("attempts") == outbox.max_attempts,
+        "MIME kept in dead letters": all(record["mime"] for record in dead),
+    }
+    for name, passed in checks.items():
+        print(f"{'✅' if passed else '❌'} {name}")
+        ok &= passed
+    print(f"📊 {outbox.stats()}")
+
+    # 6) Shutdown with a full queue behind a hung SMTP server
+    hung = threading.Event()  # never set: the sender thread (daemon) stays blocked in connect
+
+    def hung_connect():
+        hung.wait()
+        return server.connect()
+
+    stuck = EmailOutbox(connect=hung_connect, dead_letter=dead.append,
+                        configured=lambda: True, max_queue=3)
+    for i in range(4):  # one taken by the sender (blocked in connect), three fill the queue
+        stuck.enqueue("ap@example.com", *message(9100 + i))
+        time.sleep(0.05)
+    start = time.perf_counter()
+    stuck.shutdown(timeout=0.5)
+    shutdown_seconds = time.perf_counter() - start
+    print(f"⏹️ shutdown with a full queue and a hung server: {shutdown_seconds:.2f}s (timeout 0.5s)")
+    ok &= shutdown_seconds < 1.0
+
+    print("✅ email outbox checks passed" if ok else "❌ email outbox check failed")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Check: a job whose pipeline raises still reaches the user
+
+The upload returns 202 right away, so a failed job must still end with the
+"Erreur de traitement" email. A FactureJobManager runs with a stand-in for the
+OCR process pool whose tasks can be made to raise, and facture_api's
+fail_facture_job as the failure callback (emails captured instead of queued):
+1. the worker crashes while parsing  -> job failed, one error email, on_complete not called
+2. the validation task raises        -> same
+3. the worker crashes during OCR     -> on_complete gets the failed OCR result (its own email)
+4. on_complete itself raises         -> job failed, on_failure not called (on_complete reports it)
+5. a failing on_failure callback     -> job still marked failed
+
+Usage (from erp-facturation/):
+    python benchmarks/check_job_failure.py
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "backend"))
+
+os.environ["OCR_CACHE_ENABLED"] = "false"
+os.environ["OCR_ARTIFACTS_ENABLED"] = "false"
+os.environ["PHASH_ENABLED"] = "false"
+os.environ["RAPIDAPI_KEY"] = ""
+
+import facture_api  # noqa: E402
+from facture_jobs import FactureJobManager  # noqa: E402
+
+
+class FakePool:
+    """Runs worker tasks inline; tasks named in `fail` raise like a crashed or failing worker"""
+
+    def __init__(self, fail):
+        self.fail = fail
+
+    def submit(self, fn, *args):
+        future = Future()
+        if fn.__name__ in self.fail:
+            future.set_exception(self.fail[fn.__name__])
+        elif fn.__name__ == "_ocr_image_file":
+            future.set_result({"pages": 1, "blocks": [{"text": "FACTURE", "bbox": [[0, 0], [1, 0], [1, 1], [0, 1]],
+                                                       "confidence": 0.9, "page": 0}]})
+        elif fn.__name__ == "_parse":
+            future.set_result({"success": True, "raw_text": "FACTURE", "confidence": 0.9})
+        else:
+            future.set_result({"ocr_result": {"success": True}, "validation": None, "po_id": None, "po": None})
+        return future
+
+    def shutdown(self, *args, **kwargs):
+        pass
+
+
+def run_job(file_path, fail, on_complete, on_failure):
+    manager = FactureJobManager(pool_size=1)
+    manager._pool = FakePool(fail)
+    manager._runner = ThreadPoolExecutor(1)
+    job_id = manager.submit(file_path, None, {"facture_id": "FACT-CHECK", "filename": "facture.png",
+                                              "user_email": "ap@example.com"},
+                            on_complete=on_complete, on_failure=on_failure)
+    deadline = time.monotonic() + 10
+    while manager._jobs[job_id]["status"] in ("queued", "running") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    manager._runner.shutdown(wait=True)
+    return manager._jobs[job_id]
+
+
+def main():
+    emails = []
+    facture_api.queue_notification_email = lambda **kwargs: emails.append(kwargs)
+    completed = []
+
+    def on_complete(job, outcome):
+        completed.append(job["job_id"])
+        return {"success": True}
+
+    def failing_on_complete(job, outcome):
+        raise RuntimeError("database down")
+
+    def failing_on_failure(job, error):
+        raise RuntimeError("SMTP down")
+
+    handle, file_path = tempfile.mkstemp(suffix=".png")
+    os.close(handle)
+    checks = {}
+    try:
+        for name, fail in [("worker crash", {"_parse": RuntimeError("A process in the pool was terminated")}),
+                           ("validation error", {"_validate": KeyError("montant_ttc")})]:
+            emails.clear()
+            completed.clear()
+            job = run_job(file_path, fail, on_complete, facture_api.fail_facture_job)
+            checks[f"{name}: job failed"] = job["status"] == "failed" and bool(job["error"])
+            checks[f"{name}: one error email"] = len(emails) == 1 \
+                and emails[0]["subject"] == "❌ Erreur de traitement - Facture FACT-CHECK" \
+                and emails[0]["to_email"] == "ap@example.com"
+            checks[f"{name}: on_complete not called"] = not completed
+
+        failures = []
+        outcomes = []
+        job = run_job(file_path, {"_ocr_image_file": RuntimeError("A process in the pool was terminated")},
+                      lambda job, outcome: outcomes.append(outcome) or {"success": False},
+                      lambda job, error: failures.append(error))
+        checks["OCR crash: on_complete gets the failed OCR result"] = job["status"] == "done" and not failures \
+            and len(outcomes) == 1 and outcomes[0]["ocr_result"]["success"] is False
+
+        job = run_job(file_path, {}, failing_on_complete, lambda job, error: failures.append(error))
+        checks["on_complete error: job failed, on_failure not called"] = job["status"] == "failed" and not failures
+
+        job = run_job(file_path, {"_parse": ValueError("bad raw")}, on_complete, failing_on_failure)
+        checks["failing on_failure: job still failed"] = job["status"] == "failed" and job["error"] == "bad raw"
+    finally:
+        os.remove(file_path)
+
+    ok = True
+    for name, passed in checks.items():
+        print(f"{'✅' if passed else '❌'} {name}")
+        ok &= passed
+    print("✅ job failure checks passed" if ok else "❌ job failure check failed")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Checks the LLM client against a local stub of the RapidAPI endpoint
+
+No network and no OCR models needed. Scenarios:
+- ok:       answer merged into the parsed fields, repeat upload served from cache
+- overlap:  a 0.4 s LLM answer overlaps the regex parsing instead of adding to it
+- slow:     a hung endpoint costs at most the deadline (LLM_TIMEOUT_SECONDS)
+- breaker:  after LLM_BREAKER_FAILURES errors the endpoint is no longer called
+- compare:  FactureValidator._call_llm_compare goes through the same client
+
+Usage (from erp-facturation/):
+    python benchmarks/check_llm_client.py
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "backend"))
+
+os.environ["LLM_TIMEOUT_SECONDS"] = "1"
+os.environ["LLM_BREAKER_FAILURES"] = "3"
+os.environ["LLM_BREAKER_RESET_SECONDS"] = "60"
+os.environ["RAPIDAPI_KEY"] = "stub"
+
+
+class StubState:
+    mode = "ok"          # ok | slow | error
+    delay = 0.0
+    requests = 0
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        StubState.requests += 1
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length))
+        prompt = body["messages"][1]["content"]
+
+        if StubState.mode == "error":
+            self.send_response(502)
+            self.end_headers()
+            self.wfile.write(b"bad gateway")
+            return
+        time.sleep(5 if StubState.mode == "slow" else StubState.delay)
+
+        if prompt.startswith("Compare"):
+            answer = {"discrepancies": [], "action_suggérée": "accepter", "confidence": 90}
+        else:
+            answer = {"numero_facture": "STUB-001", "montant_ttc": "42.5"}
+        payload = {"choices": [{"message": {"content": json.dumps(answer)}}]}
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def check(name: str, condition: bool, detail: str = "") -> bool:
+    print(f"{'✅' if condition else '❌'} {name} {detail}")
+    return condition
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["RAPIDAPI_URL"] = f"http://127.0.0.1:{server.server_port}/chat"
+
+    import llm_client
+    from facture_ocr import FactureOCREasyOCR
+    from facture_validator import FactureValidator
+
+    engine = object.__new__(FactureOCREasyOCR)  # parsing only: no EasyOCR reader needed
+    text = "SOCIETE ALPHA SARL\nFacture N° 34567890\nDate: 12/03/2024\nTotal TTC 893,500 DT"
+    results = []
+
+    # ok + cache
+    StubState.mode, StubState.delay = "ok", 0.0
+    parsed = engine.parse_ocr_result(text, 0.9)
+    results.append(check("ok: LLM mapping merged", parsed["numero_facture"] == "STUB-001" and parsed["montant_ttc"] == 42.5))
+    before = StubState.requests
+    engine.parse_ocr_result(text, 0.9)
+    results.append(check("ok: repeat text served from cache", StubState.requests == before))
+
+    # overlap: regex parsing does not wait behind the LLM call
+    StubState.delay = 0.4
+    start = time.perf_counter()
+    engine.parse_ocr_result(text + "\nQté: 3", 0.9)
+    elapsed = time.perf_counter() - start
+    results.append(check("overlap: parse time ~ LLM latency", elapsed < 0.6, f"({elapsed:.2f}s)"))
+
+    # slow endpoint: bounded by the deadline
+    StubState.mode = "slow"
+    start = time.perf_counter()
+    parsed = engine.parse_ocr_result(text + "\nslow", 0.9)
+    elapsed = time.perf_counter() - start
+    results.append(check("slow: returns within the deadline", elapsed < 1.5 and parsed["numero_facture"] != "STUB-001",
+                         f"({elapsed:.2f}s)"))
+
+    # circuit breaker
+    StubState.mode = "error"
+    for i in range(3):
+        engine.parse_ocr_result(text + f"\nerror {i}", 0.9)
+    client = llm_client.get_llm_client()
+    before = StubState.requests
+    start = time.perf_counter()
+    engine.parse_ocr_result(text + "\nafter breaker", 0.9)
+    results.append(check("breaker: circuit open, endpoint not called",
+                         client.breaker.state == "open" and StubState.requests == before,
+                         f"({time.perf_counter() - start:.3f}s)"))
+
+    # validator compare through the same client (circuit reset)
+    client.breaker.record_success()
+    StubState.mode, StubState.delay = "ok", 0.0
+    validator = FactureValidator(po_collection=None)
+    llm = client.wait(validator._call_llm_compare({"numero_facture": "X"}, {"purchase_order_id": "BC-1"}))
+    results.append(check("compare: validator answer", llm.get("action_suggérée") == "accepter"))
+
+    print(f"\n{json.dumps(client.get_stats())}")
+    server.shutdown()
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
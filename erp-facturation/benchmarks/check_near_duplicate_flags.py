@@ -0,0 +1,58 @@
+"""
+Check: what a near-duplicate invoice does to the validation result
+
+flag_near_duplicates holds an invoice (error, is_valid=False) only when the
+visually near-identical earlier invoice has the same number, or the same TTC
+amount and the same invoice date. Cases:
+- recurring: same template, same fixed amount, next month (rent, subscription)
+  -> warning only, invoice stays valid
+- same number (resend)                          -> error
+- same amount and same date, number misread     -> error (date separators ignored)
+- same layout, other amount                     -> warning only
+
+Usage (from erp-facturation/):
+    python benchmarks/check_near_duplicate_flags.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from perceptual_hash import flag_near_duplicates  # noqa: E402
+
+
+def validation():
+    return {"is_valid": True, "errors": [], "warnings": []}
+
+
+def earlier(**fields):
+    return {"facture_id": "FAC-2025-0101", "distance": 1, "numero_facture": "LOY-2025-01",
+            "montant_ttc": 1190.0, "date_facture": "01/01/2025", **fields}
+
+
+def main():
+    cases = [
+        ("recurring: same amount, next month -> warning",
+         {"numero_facture": "LOY-2025-02", "montant_ttc": 1190.0, "date_facture": "01/02/2025"}, [earlier()], True),
+        ("same number -> error",
+         {"numero_facture": "loy-2025-01 ", "montant_ttc": 1190.0, "date_facture": "01/02/2025"}, [earlier()], False),
+        ("same amount and same date -> error",
+         {"numero_facture": None, "montant_ttc": 1190.004, "date_facture": "01-01-2025"}, [earlier()], False),
+        ("same layout, other amount -> warning",
+         {"numero_facture": "LOY-2025-03", "montant_ttc": 1250.0, "date_facture": "01/01/2025"}, [earlier()], True),
+        ("recurring, amount but no date read -> warning",
+         {"numero_facture": None, "montant_ttc": 1190.0, "date_facture": None}, [earlier()], True),
+    ]
+    ok = True
+    for name, ocr_result, near, expected_valid in cases:
+        result = flag_near_duplicates(validation(), near, ocr_result)
+        passed = result["is_valid"] == expected_valid and bool(result["errors"]) != expected_valid \
+            and len(result["errors"]) + len(result["warnings"]) == len(near)
+        print(f"{'✅' if passed else '❌'} {name}: {(result['errors'] or result['warnings'])[0]}")
+        ok &= passed
+    print("✅ near-duplicate flag checks passed" if ok else "❌ near-duplicate flag check failed")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
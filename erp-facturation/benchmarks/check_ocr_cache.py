@@ -0,0 +1,99 @@
+"""
+Check: OCR cache writes under concurrent eviction
+
+Several writers (one OCRResultCache each, like the OCR worker processes) fill
+a small shared cache directory while evicting each other's entries, and a
+reader keeps refreshing entries. Checks that no put_raw / put_parsed raises,
+that the directory stays near max_bytes, and that a write costs about the same
+with --entries already in the cache (no full scan on every write).
+
+Usage (from erp-facturation/):
+    python benchmarks/check_ocr_cache.py --entries 5000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from ocr_cache import OCRResultCache  # noqa: E402
+
+RAW = {"pages": 1, "blocks": [{"text": "Total TTC 1 234,500", "confidence": 0.9, "bbox": [[0, 0], [1, 0], [1, 1], [0, 1]]}] * 20}
+
+
+def write_time(cache: OCRResultCache, count: int, offset: int) -> float:
+    start = time.perf_counter()
+    for i in range(count):
+        cache.put_raw(f"{offset + i:064x}", RAW)
+    return (time.perf_counter() - start) / count * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=5000)
+    parser.add_argument("--writers", type=int, default=4)
+    args = parser.parse_args()
+    ok = True
+    work = tempfile.mkdtemp(prefix="ocr-cache-")
+    try:
+        # 1) Concurrent writers + eviction + reads
+        max_bytes = 300 * 1024
+        errors = []
+
+        def writer(n):
+            cache = OCRResultCache(work, max_bytes)
+            for i in range(400):
+                try:
+                    key = f"{n:02x}{i:062x}"
+                    cache.put_raw(key, RAW)
+                    cache.put_parsed(key, "1", {"numero_facture": str(i)})
+                    cache._evict()  # force scans racing the other writers' deletions
+                except Exception as e:
+                    errors.append(repr(e))
+
+        def reader(stop):
+            cache = OCRResultCache(work, max_bytes)
+            while not stop.is_set():
+                for n in range(args.writers):
+                    cache.get_raw(f"{n:02x}{0:062x}")
+
+        stop = threading.Event()
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(args.writers)]
+        read_thread = threading.Thread(target=reader, args=(stop,))
+        read_thread.start()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stop.set()
+        read_thread.join()
+        final = OCRResultCache(work, max_bytes)
+        final._evict()
+        size = final.stats()["size_mb"] * 1024 * 1024
+        print(f"✍️ {args.writers} writers x 400 entries: {len(errors)} error(s), cache {size / 1024:.0f} KB "
+              f"(max {max_bytes / 1024:.0f} KB)")
+        ok &= not errors and size <= max_bytes
+        for error in errors[:5]:
+            print(f"   {error}")
+
+        # 2) Write cost does not grow with the number of entries
+        shutil.rmtree(work)
+        cache = OCRResultCache(work, 10 * 1024 ** 3)
+        small = write_time(cache, 200, 0)
+        write_time(cache, args.entries, 10 ** 6)
+        large = write_time(cache, 200, 10 ** 7)
+        print(f"⏱️ put_raw: {small:.2f} ms/write with 200 entries, {large:.2f} ms/write with {args.entries + 400}")
+        ok &= large < small * 3
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    print("✅ OCR cache checks passed" if ok else "❌ OCR cache check failed")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Checks the mapped PO cache used by the upload endpoint, the workers and the validator
+
+No MongoDB needed: a counting in-memory collection stands in for bons_commande.
+Scenarios:
+- batch:       50 validations against the same PO read it from the database once
+- preloaded:   validate_against_po(..., po=...) does not touch the database
+- prefix:      "1042" resolves to BC-1042 and is cached under BC-1042
+- invalidate:  invalidate() / invalidate_object_id() force a fresh read
+- ttl:         an expired entry is read again
+
+Usage (from erp-facturation/):
+    python benchmarks/check_po_cache.py
+"""
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "backend"))
+
+os.environ["RAPIDAPI_KEY"] = ""  # rules only: no LLM call
+
+
+class CountingCollection:
+    def __init__(self, documents):
+        self.documents = {doc["purchase_order_id"]: doc for doc in documents}
+        self.find_one_calls = 0
+
+    def find_one(self, query):
+        self.find_one_calls += 1
+        return self.documents.get(query["purchase_order_id"])
+
+
+def check(name: str, condition: bool, detail: str = "") -> bool:
+    print(f"{'✅' if condition else '❌'} {name} {detail}")
+    return condition
+
+
+def main():
+    import po_lookup
+    from facture_validator import FactureValidator
+
+    po_doc = {
+        "_id": "oid-1042", "purchase_order_id": "BC-1042", "type_achat": "Matériel",
+        "montant_total_ht": 750.0, "montant_total_tva": 142.5, "montant_total_ttc": 892.5,
+        "fournisseur": {"nom": "SOCIETE ALPHA SARL"},
+        "lignes": [{"quantite": 3, "unite": "pièce", "specifications_techniques": "Écran 24 pouces"}]
+    }
+    collection = CountingCollection([po_doc])
+    facture = {"numero_facture": "34567890", "montant_ttc": 892.5, "montant_ht": 750.0,
+               "quantite": 3, "fournisseur": "SOCIETE ALPHA SARL", "type_achat": "Matériel"}
+    validator = FactureValidator(collection)
+    results = []
+
+    start = time.perf_counter()
+    for _ in range(50):
+        validator.validate_against_po(facture, "BC-1042")
+    elapsed = time.perf_counter() - start
+    results.append(check("batch: one database read for 50 validations", collection.find_one_calls == 1,
+                         f"({collection.find_one_calls} reads, {elapsed * 1000 / 50:.2f} ms/validation)"))
+
+    collection.find_one_calls = 0
+    po = po_lookup.map_po_fields(po_doc)
+    validation = validator.validate_against_po(facture, "BC-1042", po)
+    results.append(check("preloaded: no database read", collection.find_one_calls == 0
+                         and validation["confidence_score"] > 0, f"(score {validation['confidence_score']}%)"))
+
+    po_lookup.po_cache.invalidate()
+    collection.find_one_calls = 0
+    po_id, po = po_lookup.find_mapped_po(collection, "1042")
+    po_lookup.find_mapped_po(collection, "BC-1042")
+    results.append(check("prefix: 1042 -> BC-1042, cached", po_id == "BC-1042" and po is not None
+                         and collection.find_one_calls == 2, f"({collection.find_one_calls} reads)"))
+
+    collection.find_one_calls = 0
+    po_lookup.po_cache.invalidate("BC-1042")
+    po_lookup.get_mapped_po(collection, "BC-1042")
+    po_lookup.po_cache.invalidate_object_id("oid-1042")
+    po_lookup.get_mapped_po(collection, "BC-1042")
+    results.append(check("invalidate: by id and by _id", collection.find_one_calls == 2,
+                         f"({collection.find_one_calls} reads)"))
+
+    collection.find_one_calls = 0
+    po_lookup.po_cache.ttl_seconds = 0.05
+    po_lookup.po_cache.invalidate()
+    po_lookup.get_mapped_po(collection, "BC-1042")
+    time.sleep(0.1)
+    po_lookup.get_mapped_po(collection, "BC-1042")
+    results.append(check("ttl: expired entry read again", collection.find_one_calls == 2,
+                         f"({collection.find_one_calls} reads)"))
+
+    print(f"\n{po_lookup.po_cache.stats()}")
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
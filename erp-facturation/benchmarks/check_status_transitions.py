@@ -0,0 +1,208 @@
+"""
+Check: atomic invoice status transitions and the bulk transition
+
+Runs facture_status against an in-memory collection (single-document updates
+are atomic, like MongoDB's) with a per-call latency standing in for the
+network round trip, and checks:
+1. --threads concurrent approvals of one invoice: exactly one wins, one history
+   entry; the previous find_one + update_one pattern is replayed for comparison
+2. approve after payment / mark_paid before approval are refused, unknown IDs 404
+3. a bulk approve of --invoices IDs (mixed statuses, unknown and duplicated IDs)
+   gives the right per-ID outcomes in 2 round trips instead of 2 per invoice
+
+Usage (from erp-facturation/):
+    python benchmarks/check_status_transitions.py --invoices 300 --latency-ms 2
+"""
+import argparse
+import copy
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from facture_status import (  # noqa: E402
+    FactureNotFound, TransitionNotAllowed, apply_transition, bulk_transition
+)
+
+
+class FakeCollection:
+    """The subset of pymongo used by facture_status, keyed by facture_id"""
+
+    def __init__(self, latency_ms: float):
+        self.docs = {}
+        self.latency = latency_ms / 1000
+        self.lock = threading.Lock()
+        self.round_trips = 0
+
+    def _call(self):
+        self.round_trips += 1
+        time.sleep(self.latency)
+
+    @staticmethod
+    def _matches(doc, query):
+        if doc["facture_id"] != query["facture_id"]:
+            return False
+        return "status" not in query or doc["status"] in query["status"]["$in"]
+
+    @staticmethod
+    def _apply(doc, update):
+        doc.update(update.get("$set", {}))
+        for field, value in update.get("$push", {}).items():
+            doc.setdefault(field, []).append(copy.deepcopy(value))
+
+    def find_one(self, query, projection=None):
+        self._call()
+        doc = self.docs.get(query["facture_id"])
+        return {"status": doc["status"]} if doc else None
+
+    def update_one(self, query, update):
+        self._call()
+        with self.lock:
+            doc = self.docs.get(query["facture_id"])
+            if doc and self._matches(doc, query):
+                self._apply(doc, update)
+
+    def find_one_and_update(self, query, update, projection=None, return_document=None):
+        self._call()
+        with self.lock:
+            doc = self.docs.get(query["facture_id"])
+            if not doc or not self._matches(doc, query):
+                return None
+            self._apply(doc, update)
+            return {"facture_id": doc["facture_id"], "status": doc["status"]}
+
+    def bulk_write(self, requests, ordered=True):
+        self._call()
+        modified = 0
+        for request in requests:
+            query, update = request._filter, request._doc
+            with self.lock:
+                doc = self.docs.get(query["facture_id"])
+                if doc and self._matches(doc, query):
+                    self._apply(doc, update)
+                    modified += 1
+        return type("BulkWriteResult", (), {"modified_count": modified})()
+
+    def find(self, query, projection):
+        self._call()
+        wanted = projection["history"]["$elemMatch"]["transition_id"]
+        out = []
+        for facture_id in query["facture_id"]["$in"]:
+            doc = self.docs.get(facture_id)
+            if doc:
+                entry = [h for h in doc.get("history", []) if h.get("transition_id") == wanted][:1]
+                out.append({"facture_id": facture_id, "status": doc["status"], **({"history": entry} if entry else {})})
+        return out
+
+
+def old_approve(coll, facture_id, user):
+    """find_one, check in Python, update_one: the pattern being replaced"""
+    facture = coll.find_one({"facture_id": facture_id})
+    if not facture or facture["status"] not in ["Validée", "En attente correction"]:
+        return False
+    coll.update_one({"facture_id": facture_id}, {
+        "$set": {"status": "Approuvée"},
+        "$push": {"history": {"action": "Approbation", "user": user, "status": "Approuvée"}}
+    })
+    return True
+
+
+def race(coll, approve, threads: int):
+    coll.docs = {"F-1": {"facture_id": "F-1", "status": "Validée", "history": []}}
+    wins = []
+    barrier = threading.Barrier(threads)
+
+    def worker(i):
+        barrier.wait()
+        if approve(coll, "F-1", f"user{i}"):
+            wins.append(i)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return len(wins), len(coll.docs["F-1"]["history"])
+
+
+def new_approve(coll, facture_id, user):
+    try:
+        apply_transition(coll, facture_id, "approve", user)
+        return True
+    except TransitionNotAllowed:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--invoices", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=2)
+    args = parser.parse_args()
+    coll = FakeCollection(args.latency_ms)
+    checks = {}
+
+    # 1) Concurrent approvals
+    old_wins, old_entries = race(coll, old_approve, args.threads)
+    new_wins, new_entries = race(coll, new_approve, args.threads)
+    print(f"🏁 {args.threads} concurrent approvals: find+update {old_wins} win(s) / {old_entries} history "
+          f"entries, find_one_and_update {new_wins} / {new_entries}")
+    checks["one concurrent approval wins"] = new_wins == 1 and new_entries == 1
+
+    # 2) Refused transitions
+    coll.docs = {"P": {"facture_id": "P", "status": "Payée"}, "V": {"facture_id": "V", "status": "Validée"}}
+    for name, call, expected in [
+        ("approve of a paid invoice refused", lambda: apply_transition(coll, "P", "approve", "u"), TransitionNotAllowed),
+        ("mark_paid before approval refused", lambda: apply_transition(coll, "V", "mark_paid", "u"), TransitionNotAllowed),
+        ("reject of a paid invoice refused", lambda: apply_transition(coll, "P", "reject", "u", "x"), TransitionNotAllowed),
+        ("unknown invoice not found", lambda: apply_transition(coll, "X", "approve", "u"), FactureNotFound),
+    ]:
+        try:
+            call()
+            checks[name] = False
+        except expected:
+            checks[name] = True
+    checks["paid invoice untouched"] = coll.docs["P"]["status"] == "Payée" and "history" not in coll.docs["P"]
+
+    # 3) Bulk approve
+    statuses = ["Validée", "En attente correction", "Approuvée", "Payée", "Rejetée"]
+    coll.docs = {f"F-{i}": {"facture_id": f"F-{i}", "status": statuses[i % 5], "history": []}
+                 for i in range(args.invoices)}
+    ids = list(coll.docs) + ["F-missing", "F-0"]
+    coll.round_trips = 0
+    start = time.perf_counter()
+    result = bulk_transition(coll, ids, "approve", "ap-team")
+    bulk_seconds, bulk_trips = time.perf_counter() - start, coll.round_trips
+
+    expected = {f"F-{i}": "updated" if i % 5 < 2 else "not_allowed" for i in range(args.invoices)}
+    expected["F-missing"] = "not_found"
+    outcomes = {r["facture_id"]: r["outcome"] for r in result["results"]}
+    checks["bulk outcomes per ID"] = outcomes == expected and len(result["results"]) == args.invoices + 1
+    checks["bulk statuses applied"] = all(
+        (doc["status"] == "Approuvée") == (int(fid[2:]) % 5 in (0, 1, 2)) for fid, doc in coll.docs.items()
+    )
+    checks["bulk single history entry"] = all(len(coll.docs[f"F-{i}"]["history"]) == (i % 5 < 2)
+                                              for i in range(args.invoices))
+
+    coll.docs = {f"F-{i}": {"facture_id": f"F-{i}", "status": "Validée", "history": []} for i in range(args.invoices)}
+    coll.round_trips = 0
+    start = time.perf_counter()
+    for facture_id in coll.docs:
+        new_approve(coll, facture_id, "ap-team")
+    loop_seconds, loop_trips = time.perf_counter() - start, coll.round_trips
+    print(f"📦 bulk approve of {len(ids)} IDs: {bulk_trips} round trips, {bulk_seconds * 1000:.0f} ms; "
+          f"one request per invoice: {loop_trips} round trips, {loop_seconds * 1000:.0f} ms")
+    checks["bulk in 2 round trips"] = bulk_trips == 2
+
+    ok = True
+    for name, passed in checks.items():
+        print(f"{'✅' if passed else '❌'} {name}")
+        ok &= passed
+    print("✅ status transition checks passed" if ok else "❌ status transition check failed")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
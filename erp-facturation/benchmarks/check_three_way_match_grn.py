@@ -0,0 +1,161 @@
+"""
+Check: three-way match against GRN documents as erp-GRN writes them
+
+erp-GRN (services/grn_service.py) inserts into the same `grns` collection:
+    {po_id: str(bons_commande._id), po_reference, reference, status,
+     lines: [{po_line_id: str(numero_ligne), received_qty, accepted_qty, ...}]}
+The matching stages (load_*, compute_line_matches, summarize_invoices) run on
+in-memory collections holding such documents. The GRN aggregate goes through a
+small evaluator of $match / $unwind / $group (dotted paths resolved like
+MongoDB), so a pipeline reading fields erp-GRN does not write finds nothing
+and the check fails:
+1. two GRNs on one PO line are summed and match the invoice
+2. a PO line without GRN is "not_received"
+3. an invoice above the received quantity is "over_received"
+
+Usage (from erp-facturation/):
+    python benchmarks/check_three_way_match_grn.py
+"""
+import os
+import sys
+from datetime import datetime
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from facture_matching import (  # noqa: E402
+    compute_line_matches, load_invoice_lines, load_po_lines, load_received_quantities, summarize_invoices
+)
+
+
+def _get(doc, path: str):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return None
+        doc = doc[part]
+    return doc
+
+
+def _value(doc, expression):
+    if isinstance(expression, str) and expression.startswith("$"):
+        return _get(doc, expression[1:])
+    if isinstance(expression, dict):
+        return {key: _value(doc, sub) for key, sub in expression.items()}
+    return expression
+
+
+def _matches(doc, query) -> bool:
+    for field, condition in query.items():
+        value = _get(doc, field)
+        if isinstance(condition, dict):
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$nin" in condition and value in condition["$nin"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """find / aggregate ($match, $unwind, $group with $sum) over a list of documents"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        return [doc for doc in self.docs if _matches(doc, query)]
+
+    def aggregate(self, pipeline, allowDiskUse=False):
+        docs = self.docs
+        for stage in pipeline:
+            (operator, spec), = stage.items()
+            if operator == "$match":
+                docs = [doc for doc in docs if _matches(doc, spec)]
+            elif operator == "$unwind":
+                field = spec[1:]
+                docs = [{**doc, field: item} for doc in docs for item in (_get(doc, field) or [])]
+            elif operator == "$group":
+                groups = {}
+                for doc in docs:
+                    key = _value(doc, spec["_id"])
+                    group = groups.setdefault(repr(key), {"_id": key})
+                    for name, accumulator in spec.items():
+                        if name != "_id":
+                            value = _value(doc, accumulator["$sum"])
+                            group[name] = group.get(name, 0) + (value if isinstance(value, (int, float)) else 0)
+                docs = list(groups.values())
+            else:
+                raise NotImplementedError(operator)
+        return docs
+
+
+def grn(po_oid, po_reference, reference, lines):
+    """A GRN document shaped like erp-GRN's grn_service insert"""
+    return {
+        "_id": ObjectId(),
+        "po_id": str(po_oid),
+        "po_reference": po_reference,
+        "reference": reference,
+        "lines": [
+            {"po_line_id": line_id, "item_name": "Article", "delivery_expected_qty": qty, "received_qty": qty,
+             "accepted_qty": qty, "quality_status": "pass", "comments": None}
+            for line_id, qty in lines
+        ],
+        "status": "registered",
+        "created_at": datetime.utcnow(),
+    }
+
+
+def main():
+    po_a, po_b = ObjectId(), ObjectId()
+    pos = [
+        {"_id": po_a, "purchase_order_id": "PO-A", "lignes": [
+            {"numero_ligne": 1, "description": "Article 1", "quantite": 10, "prix_unitaire": 5.0},
+            {"numero_ligne": 2, "description": "Article 2", "quantite": 4, "prix_unitaire": 20.0},
+        ]},
+        {"_id": po_b, "purchase_order_id": "PO-B", "lignes": [
+            {"numero_ligne": 1, "description": "Article 3", "quantite": 8, "prix_unitaire": 2.5},
+        ]},
+    ]
+    grns = [
+        grn(po_a, "PO-A", "GRN-1", [("1", 6)]),
+        grn(po_a, "PO-A", "GRN-2", [("1", 4)]),      # second delivery of PO-A line 1
+        grn(po_b, "PO-B", "GRN-3", [("1", 3)]),
+    ]
+    factures = [
+        {"facture_id": "F-1", "status": "Validée", "linked_po_id": "PO-A",
+         "lignes": [{"ligne_po": 1, "quantite": 10, "prix_unitaire": 5.0}]},
+        {"facture_id": "F-2", "status": "En analyse", "linked_po_id": "PO-A",
+         "lignes": [{"ligne_po": 2, "quantite": 4, "prix_unitaire": 20.0}]},
+        {"facture_id": "F-3", "status": "Validée", "linked_po_id": "PO-B",
+         "lignes": [{"ligne_po": 1, "quantite": 8, "prix_unitaire": 2.5}]},
+    ]
+    invoices = load_invoice_lines(FakeCollection(factures))
+    po_lines, po_object_ids = load_po_lines(FakeCollection(pos), invoices["po_id"].unique().tolist())
+    received = load_received_quantities(FakeCollection(grns), po_object_ids)
+    lines = compute_line_matches(invoices, po_lines, received)
+    summary = summarize_invoices(lines)
+    status = dict(zip(summary["facture_id"], summary["status"]))
+    qty_received = dict(zip(lines["facture_id"], lines["qty_received"]))
+    print(received.to_string(index=False))
+
+    checks = {
+        "GRN quantities keyed by PO number and line": sorted(received.itertuples(index=False, name=None))
+        == [("PO-A", 1, 10), ("PO-B", 1, 3)],
+        "two GRNs summed, invoice matched": status["F-1"] == "matched" and qty_received["F-1"] == 10,
+        "PO line without GRN not received": status["F-2"] == "not_received",
+        "invoice above received quantity over received": status["F-3"] == "over_received"
+        and qty_received["F-3"] == 3,
+    }
+    ok = True
+    for name, passed in checks.items():
+        print(f"{'✅' if passed else '❌'} {name}")
+        ok &= passed
+    print("✅ three-way match GRN checks passed" if ok else "❌ three-way match GRN check failed")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
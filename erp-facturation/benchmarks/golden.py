@@ -0,0 +1,28 @@
+"""Golden field values for the sample invoices of inputs/ and field-level scoring"""
+import json
+import os
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden.json")
+NUMERIC_FIELDS = {"montant_ht", "montant_tva", "montant_ttc", "quantite"}
+
+
+def load_golden(path: str = GOLDEN_PATH) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def field_matches(field: str, expected, actual) -> bool:
+    if actual is None:
+        return False
+    if field in NUMERIC_FIELDS:
+        try:
+            return abs(float(expected) - float(actual)) <= max(0.01, abs(float(expected)) * 0.001)
+        except (TypeError, ValueError):
+            return False
+    return " ".join(str(expected).lower().split()) == " ".join(str(actual).lower().split())
+
+
+def score_fields(expected: dict, extracted: dict) -> dict:
+    """Per-field match flags plus matched/total counts for one document"""
+    fields = {field: field_matches(field, value, extracted.get(field)) for field, value in expected.items()}
+    return {"fields": fields, "matched": sum(fields.values()), "total": len(fields)}
@@ -1,10 +1,22 @@
 import streamlit as st
+import json
 import requests
+import pandas as pd
+import time
 from datetime import datetime
 
 # Configuration
 API_URL = "http://127.0.0.1:8000"
 
+# Liste des factures: taille de page et champs affichés (le reste n'est pas téléchargé)
+LIST_PAGE_SIZE = 25
+LIST_FIELDS = [
+    "numero_facture", "fournisseur_nom", "fournisseur_matricule", "linked_po_id", "status", "type_achat",
+    "montant_ht", "montant_tva", "montant_ttc", "devise", "quantite", "unite", "date_facture",
+    "validation_result.is_valid", "validation_result.confidence_score", "validation_result.matched_fields",
+    "validation_result.errors", "validation_result.warnings"
+]
+
 st.set_page_config(
     page_title="Gestion Factures",
     layout="wide",
@@ -149,6 +161,69 @@ st.sidebar.markdown("**ERP Factures v1.0**")
 st.sidebar.markdown("OCR • Validation • Paiement")
 
 
+# Suivi des jobs OCR
+JOB_STAGE_LABELS = {
+    "queued": "⏳ En file d'attente",
+    "lookup": "🔎 Recherche dans le cache OCR",
+    "ocr": "🔍 Lecture OCR",
+    "parse": "🧩 Extraction des champs",
+    "validate": "✅ Validation contre le PO",
+    "save": "💾 Enregistrement de la facture",
+}
+JOB_EVENTS_READ_TIMEOUT = 60  # s sans événement (le serveur envoie un keepalive toutes les 15 s)
+
+
+def stage_label(job):
+    """Libellé de l'étape en cours, avec la page OCR n/N pour les PDF"""
+    label = JOB_STAGE_LABELS.get(job.get("stage"), "🔄 Traitement")
+    if job.get("stage") == "ocr" and job.get("pages_total"):
+        page = min(job["pages_done"] + 1, job["pages_total"])
+        label += f" - page {page}/{job['pages_total']}"
+    return label
+
+
+def _poll_job(job_id, on_progress):
+    """Repli si le flux SSE est coupé: une requête par seconde sur /factures/jobs/{job_id}"""
+    while True:
+        resp = requests.get(f"{API_URL}/factures/jobs/{job_id}", timeout=30)
+        if resp.status_code != 200:
+            return {"status": "failed", "error": resp.json().get("detail", resp.text)}
+        job = resp.json()
+        if job["status"] in ("done", "failed"):
+            return job
+        on_progress(job)
+        time.sleep(1)
+
+
+def follow_job(job_id, on_progress):
+    """
+    Suivre un job OCR jusqu'à la fin via /factures/jobs/{job_id}/events:
+    on_progress(job) à chaque changement d'étape ou de page, retourne le job final
+    """
+    try:
+        with requests.get(
+            f"{API_URL}/factures/jobs/{job_id}/events",
+            stream=True,
+            timeout=(10, JOB_EVENTS_READ_TIMEOUT)
+        ) as resp:
+            if resp.status_code == 200:
+                event, data = None, []
+                for line in resp.iter_lines(decode_unicode=True):
+                    if line.startswith("event:"):
+                        event = line[6:].strip()
+                    elif line.startswith("data:"):
+                        data.append(line[5:].strip())
+                    elif not line and data:
+                        job = json.loads("\n".join(data))
+                        if event in ("done", "failed"):
+                            return job
+                        on_progress(job)
+                        event, data = None, []
+    except requests.exceptions.RequestException:
+        pass
+    return _poll_job(job_id, on_progress)
+
+
 def status_badge(status):
     """Génère un badge de statut coloré"""
     colors = {
@@ -211,13 +286,24 @@ if page == "📋 Liste des Factures":
 
     st.markdown("---")
 
-    # Liste des factures
+    # Liste des factures (paginée côté serveur: une page à la fois, champs utiles seulement)
     try:
-        params = {}
+        params = {"limit": LIST_PAGE_SIZE, "fields": ",".join(LIST_FIELDS)}
         if filter_status != "Tous":
             params["status"] = filter_status
         if search_po:
             params["po_id"] = search_po
+        if search_facture:
+            params["search"] = search_facture
+
+        # Pile des curseurs des pages visitées, remise à zéro quand les filtres changent
+        filters_key = (filter_status, search_po, search_facture)
+        if st.session_state.get("list_filters") != filters_key:
+            st.session_state["list_filters"] = filters_key
+            st.session_state["list_cursors"] = [None]
+        cursors = st.session_state["list_cursors"]
+        if cursors[-1]:
+            params["cursor"] = cursors[-1]
         
         response = requests.get(f"{API_URL}/factures/", params=params, timeout=30)
         
@@ -225,14 +311,20 @@ if page == "📋 Liste des Factures":
             data = response.json()
             factures = data.get("factures", [])
             
-            # Filtrer par numéro de facture si recherche
-            if search_facture:
-                factures = [f for f in factures if search_facture.lower() in f.get('facture_id', '').lower()]
-            
             if not factures:
                 st.info("🔭 Aucune facture trouvée")
             else:
-                st.write(f"**{len(factures)} facture(s) trouvée(s)**")
+                col1, col2, col3 = st.columns([4, 1, 1])
+                with col1:
+                    st.write(f"**Page {len(cursors)} - {len(factures)} facture(s) sur {data.get('total', len(factures))}**")
+                with col2:
+                    if st.button("◀ Précédent", disabled=len(cursors) == 1, use_container_width=True):
+                        cursors.pop()
+                        st.rerun()
+                with col3:
+                    if st.button("Suivant ▶", disabled=not data.get("next_cursor"), use_container_width=True):
+                        cursors.append(data["next_cursor"])
+                        st.rerun()
                 
                 # Affichage en table compacte
                 for idx, facture in enumerate(factures):
@@ -459,9 +551,10 @@ elif page == "📤 Upload Nouvelle Facture":
                 status_text.info("📤 Préparation du fichier...")
                 progress_bar.progress(10)
                 
-                # Préparer le fichier
+                # Préparer le fichier: l'objet fichier est transmis tel quel (pas de copie getvalue())
+                uploaded_file.seek(0)
                 files = {
-                    "file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)
+                    "file": (uploaded_file.name, uploaded_file, uploaded_file.type)
                 }
                 
                 form_data = {
@@ -469,38 +562,46 @@ elif page == "📤 Upload Nouvelle Facture":
                     "user_email": user_email
                 }
                 
-                status_text.info("🔄 Envoi au serveur et traitement OCR en cours...")
+                status_text.info("🔄 Envoi au serveur...")
                 progress_bar.progress(20)
                 
-                # Start a timer thread to show elapsed time
-                processing = True
-                def update_timer():
-                    while processing:
-                        elapsed = time.time() - start_time
-                        timer_placeholder.info(f"⏱️ Temps écoulé: {elapsed:.1f}s")
-                        time.sleep(0.5)
-                
-                import threading
-                timer_thread = threading.Thread(target=update_timer, daemon=True)
-                timer_thread.start()
-                
-                # Appel API avec timeout augmenté
+                # L'API met la facture en file d'attente et renvoie un job ID
                 response = requests.post(
                     f"{API_URL}/factures/upload-and-validate",
                     data=form_data,
                     files=files,
-                    timeout=300  # ✅ INCREASED TO 5 MINUTES (300 seconds)
+                    timeout=60
                 )
                 
-                processing = False
+                if response.status_code == 202:
+                    job_id = response.json()["job_id"]
+                    duplicate_of = response.json().get("duplicate_of")
+                    if duplicate_of:
+                        st.warning(f"♻️ Ce fichier a déjà été reçu: {', '.join(duplicate_of)}")
+                    status_text.info(f"🔄 Traitement OCR en cours (job {job_id})...")
+                    
+                    def show_progress(job):
+                        progress_bar.progress(max(20, job.get("progress") or 0))
+                        status_text.info(f"{stage_label(job)} (job {job_id})")
+                        timer_placeholder.info(f"⏱️ Temps écoulé: {time.time() - start_time:.1f}s")
+                    
+                    # Suivi du job par server-sent events (étape, page OCR n/N) jusqu'à la fin du traitement
+                    job = follow_job(job_id, show_progress)
+                    
+                    if job["status"] == "done":
+                        result = job["result"]
+                    else:
+                        error = job.get("error") or "Erreur inconnue"
+                        progress_bar.progress(100)
+                        status_text.error(f"❌ Traitement échoué: {error}")
+                        st.stop()
+                
                 progress_bar.progress(100)
                 
                 elapsed_time = time.time() - start_time
                 timer_placeholder.success(f"✅ Traitement terminé en {elapsed_time:.1f} secondes")
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    
+                if response.status_code == 202:
                     # Animation de succès
                     st.balloons()
                     
@@ -632,7 +733,6 @@ elif page == "📤 Upload Nouvelle Facture":
                             st.success("🎉 Aucun problème détecté! La facture peut être approuvée.")
                 
                 else:
-                    processing = False
                     status_text.error(f"❌ Erreur API: {response.status_code}")
                     try:
                         error_detail = response.json()
@@ -641,11 +741,8 @@ elif page == "📤 Upload Nouvelle Facture":
                         st.error(response.text)
             
             except requests.exceptions.Timeout:
-                processing = False
-                status_text.error("⏱️ Le traitement a pris trop de temps (> 5 minutes). Le fichier est peut-être trop volumineux ou complexe.")
-                st.error("💡 Suggestions: Essayez avec une image de meilleure qualité ou un PDF avec moins de pages.")
+                status_text.error("⏱️ Le serveur ne répond pas. Veuillez réessayer dans un instant.")
             except Exception as e:
-                processing = False
                 status_text.error(f"❌ Erreur de connexion: {str(e)}")
 
 
@@ -659,7 +756,11 @@ elif page == "📊 Statistiques":
     """, unsafe_allow_html=True)
 
     try:
-        stats_response = requests.get(f"{API_URL}/factures/stats/summary", timeout=30)
+        stats_response = requests.get(
+            f"{API_URL}/factures/stats/summary",
+            params={"by_month": "true", "months": 12},
+            timeout=30
+        )
         
         if stats_response.status_code == 200:
             stats = stats_response.json()
@@ -690,13 +791,33 @@ elif page == "📊 Statistiques":
                     st.metric("", count)
             
             st.markdown("---")
+
+            # Tendance mensuelle (12 derniers mois)
+            if stats.get('by_month'):
+                st.subheader("📈 Tendance Mensuelle")
+                trend = pd.DataFrame(stats['by_month']).set_index('month')
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.caption("Nombre de factures")
+                    st.bar_chart(trend['count'])
+                with col2:
+                    st.caption("Montant TTC (TND)")
+                    st.line_chart(trend['amount'])
+                st.markdown("---")
             
             # Factures récentes
             st.subheader("🕐 Factures Récentes")
-            response = requests.get(f"{API_URL}/factures/", timeout=30)
+            response = requests.get(
+                f"{API_URL}/factures/",
+                params={
+                    "limit": 5,
+                    "sort": "desc",
+                    "fields": "fournisseur_nom,status,montant_ttc,devise"
+                },
+                timeout=30
+            )
             if response.status_code == 200:
-                factures = response.json().get('factures', [])
-                recent = sorted(factures, key=lambda x: x['date_reception'], reverse=True)[:5]
+                recent = response.json().get('factures', [])
                 
                 for facture in recent:
                     col1, col2, col3, col4 = st.columns([2, 2, 2, 2])